@@ -1,7 +1,12 @@
 import os
 
+from shared import currencies
+
 class Config:
     MOCK_PAYMENTS_CALLBACK_SECRET: str = os.getenv("SHARED_CALLBACK_SECRET")
+    # Still accepted while the mock service moves to a new SHARED_CALLBACK_SECRET (comma-separated).
+    PREVIOUS_CALLBACK_SECRETS = [s for s in os.getenv("PREVIOUS_CALLBACK_SECRETS", "").split(",") if s]
+    MOCK_PAYMENTS_CALLBACK_SECRETS = [MOCK_PAYMENTS_CALLBACK_SECRET, *PREVIOUS_CALLBACK_SECRETS]
     MOCK_PAYMENTS_URL: str = os.getenv("MOCK_PAYMENTS_URL")
     RETRY_ATTEMPTS = 3
     MAX_WEBHOOK_AGE = 300
@@ -10,30 +15,96 @@ class Config:
     REDIRECT_URI = os.getenv("GOOGLE_AUTH_REDIRECT_URI")
     GOOGLE_AUTH_BASE_URL = "https://oauth2.googleapis.com"
     GOOGLE_ACCOUNTS_BASE_URL = "https://accounts.google.com/o/oauth2/v2/auth?"
+    GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v3/userinfo")
+    ACCESS_TOKEN_MAX_AGE = 3600
+    # Signs Starlette's session cookie, which only carries the OAuth state during login.
+    SESSION_SECRET_KEY = os.getenv("SESSION_SECRET_KEY")
+    # Signs the session tokens issued at login; PREVIOUS_SESSION_TOKEN_SECRETS (comma-separated) still verify.
+    # Required, and must differ from SESSION_SECRET_KEY so each can be rotated on its own.
+    SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET")
+    PREVIOUS_SESSION_TOKEN_SECRETS = [s for s in os.getenv("PREVIOUS_SESSION_TOKEN_SECRETS", "").split(",") if s]
+    SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", 3600))
+    # A token older than this is replaced on the next request, so active sessions slide forward...
+    SESSION_TOKEN_REFRESH_AFTER = int(os.getenv("SESSION_TOKEN_REFRESH_AFTER", 1800))
+    # ...but never past this long after the Google login.
+    SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 43200))
+    TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", 10000))
+    TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))
     CODE_CHALLENGE = os.getenv("CODE_CHALLENGE", "S256")
     FRONTEND_SUCCESS_URL = "http://localhost/login/success"
     FRONTEND_ERROR_URL = "http://localhost/login/failure"
     MAX_TIMESTAMP_RETRIES = 3
-    VALID_CURRENCIES = [
-        "AED", "AFN", "ALL", "AMD", "ANG", "AOA", "ARS", "AUD", "AWG", "AZN",
-        "BAM", "BBD", "BDT", "BGN", "BHD", "BIF", "BMD", "BND", "BOB", "BOV",
-        "BRL", "BSD", "BTN", "BWP", "BYN", "BZD", "CAD", "CDF", "CHE", "CHF",
-        "CHW", "CLF", "CLP", "CNY", "COP", "COU", "CRC", "CUC", "CUP", "CVE",
-        "CZK", "DJF", "DKK", "DOP", "DZD", "EGP", "ERN", "ETB", "EUR", "FJD",
-        "FKP", "GBP", "GEL", "GHS", "GIP", "GMD", "GNF", "GTQ", "GYD", "HKD",
-        "HNL", "HRK", "HTG", "HUF", "IDR", "ILS", "INR", "IQD", "IRR", "ISK",
-        "JMD", "JOD", "JPY", "KES", "KGS", "KHR", "KMF", "KPW", "KRW", "KWD",
-        "KYD", "KZT", "LAK", "LBP", "LKR", "LRD", "LSL", "LYD", "MAD", "MDL",
-        "MGA", "MKD", "MMK", "MNT", "MOP", "MRU", "MUR", "MVR", "MWK", "MXN",
-        "MXV", "MYR", "MZN", "NAD", "NGN", "NIO", "NOK", "NPR", "NZD", "OMR",
-        "PAB", "PEN", "PGK", "PHP", "PKR", "PLN", "PYG", "QAR", "RON", "RSD",
-        "CNY", "RUB", "RWF", "SAR", "SBD", "SCR", "SDG", "SEK", "SGD", "SHP",
-        "SLL", "SOS", "SRD", "SSP", "STN", "SVC", "SYP", "SZL", "THB", "TJS",
-        "TMT", "TND", "TOP", "TRY", "TTD", "TWD", "TZS", "UAH", "UGX", "USD",
-        "USN", "UYI", "UYU", "UYW", "UZS", "VED", "VES", "VND", "VUV", "WST",
-        "XAF", "XAG", "XAU", "XBA", "XBB", "XBC", "XBD", "XCD", "XDR", "XOF",
-        "XPD", "XPF", "XPT", "XSU", "XTS", "XUA", "XXX", "YER", "ZAR", "ZMW",
-        "ZWL"
-    ]
+    RETRY_STORE_BACKEND = os.getenv("RETRY_STORE_BACKEND", "memory")
+    RETRY_STORE_MAX_SIZE = int(os.getenv("RETRY_STORE_MAX_SIZE", 100000))
+    RETRY_STORE_TTL = int(os.getenv("RETRY_STORE_TTL", 3600))
+    RETRY_STORE_REDIS_URL = os.getenv("RETRY_STORE_REDIS_URL", "redis://localhost:6379/0")
+    RESEND_QUEUE_MAX_SIZE = int(os.getenv("RESEND_QUEUE_MAX_SIZE", 10000))
+    RESEND_CONCURRENCY = int(os.getenv("RESEND_CONCURRENCY", 4))
+    # A payout asked for this recently is not asked for again; its resent webhook is on the way.
+    RESEND_COALESCE_WINDOW = float(os.getenv("RESEND_COALESCE_WINDOW", 10))
+    RESEND_MAX_ATTEMPTS = int(os.getenv("RESEND_MAX_ATTEMPTS", 5))
+    RESEND_RETRY_BASE_DELAY = float(os.getenv("RESEND_RETRY_BASE_DELAY", 0.5))
+    RESEND_RETRY_MAX_DELAY = float(os.getenv("RESEND_RETRY_MAX_DELAY", 30))
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # Token buckets per route class, "<class>=<requests per second>:<burst>" (classes: reads,
+    # payout_writes, webhooks, auth). A class left out is not limited that way.
+    RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "reads=20:60,payout_writes=5:20")
+    RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "reads=50:150,payout_writes=20:60,auth=5:20")
+    # Requests in flight per route class and worker; more are shed with 503.
+    RATE_LIMIT_CONCURRENCY = os.getenv("RATE_LIMIT_CONCURRENCY", "reads=64,payout_writes=16,webhooks=32,auth=16")
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    # Kept short: the lookup is on every request's path, and a slow Redis lets requests through.
+    RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", 0.05))
+    MAX_PAYOUT_BATCH_SIZE = int(os.getenv("MAX_PAYOUT_BATCH_SIZE", 1000))
+    MAX_WEBHOOK_BATCH_SIZE = int(os.getenv("MAX_WEBHOOK_BATCH_SIZE", 1000))
+    WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", 100000))
+    WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", 3600))
+    # Recently used payout idempotency keys kept in memory, so retries skip the database.
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 100000))
+    IDEMPOTENCY_CACHE_TTL = int(os.getenv("IDEMPOTENCY_CACHE_TTL", 3600))
+    OUTBOX_DISPATCHER_ENABLED = os.getenv("OUTBOX_DISPATCHER_ENABLED", "true").lower() == "true"
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+    OUTBOX_PROVIDER_BATCH_SIZE = int(os.getenv("OUTBOX_PROVIDER_BATCH_SIZE", 50))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+    OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", 1))
+    OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", 300))
+    PAYOUT_EVENTS_BACKEND = os.getenv("PAYOUT_EVENTS_BACKEND", "memory")
+    PAYOUT_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("PAYOUT_EVENTS_HEARTBEAT_SECONDS", 15))
+    PAYOUT_EVENTS_MAX_QUEUED = int(os.getenv("PAYOUT_EVENTS_MAX_QUEUED", 100))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 2))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", 5))
+    GOOGLE_HTTP_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_MAX_CONNECTIONS", 50))
+    MOCK_PAYMENTS_HTTP_TIMEOUT = float(os.getenv("MOCK_PAYMENTS_HTTP_TIMEOUT", 5))
+    MOCK_PAYMENTS_HTTP_MAX_CONNECTIONS = int(os.getenv("MOCK_PAYMENTS_HTTP_MAX_CONNECTIONS", 100))
+    # Circuit breaker in front of the payments provider: opens after this many failed requests in a row...
+    PROVIDER_BREAKER_FAILURES = int(os.getenv("PROVIDER_BREAKER_FAILURES", 5))
+    # ...for this long, doubling after each failed probe up to the max.
+    PROVIDER_BREAKER_OPEN_SECONDS = float(os.getenv("PROVIDER_BREAKER_OPEN_SECONDS", 5))
+    PROVIDER_BREAKER_MAX_OPEN_SECONDS = float(os.getenv("PROVIDER_BREAKER_MAX_OPEN_SECONDS", 30))
+    # Concurrent provider requests per worker, adjusted between min and max by observed latency.
+    # OUTBOX_CONCURRENCY is the old name of the starting value.
+    PROVIDER_CONCURRENCY_INITIAL = int(os.getenv("PROVIDER_CONCURRENCY_INITIAL", os.getenv("OUTBOX_CONCURRENCY", 10)))
+    PROVIDER_CONCURRENCY_MIN = int(os.getenv("PROVIDER_CONCURRENCY_MIN", 1))
+    PROVIDER_CONCURRENCY_MAX = int(os.getenv("PROVIDER_CONCURRENCY_MAX", 50))
+    # A request this many times slower than usual for its endpoint counts as congestion.
+    PROVIDER_LATENCY_TOLERANCE = float(os.getenv("PROVIDER_LATENCY_TOLERANCE", 2))
+    PROVIDER_LIMIT_BACKOFF = float(os.getenv("PROVIDER_LIMIT_BACKOFF", 0.7))
+    # Each attempt gets PROVIDER_ATTEMPT_TIMEOUT, all of a call's attempts together PROVIDER_CALL_DEADLINE.
+    PROVIDER_ATTEMPT_TIMEOUT = float(os.getenv("PROVIDER_ATTEMPT_TIMEOUT", 2))
+    PROVIDER_CALL_DEADLINE = float(os.getenv("PROVIDER_CALL_DEADLINE", 5))
+    PROVIDER_MAX_ATTEMPTS = int(os.getenv("PROVIDER_MAX_ATTEMPTS", 2))
+    VALID_CURRENCIES = currencies.CODES
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # "json" (one object per line) or "text"
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    # Fraction of INFO lines kept per logger, e.g. "httpx=0.01,uvicorn.access=0.1"; warnings are always kept.
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
 
 config = Config()
\ No newline at end of file
@@ -1,19 +1,181 @@
 import os
+from typing import Callable, List, Optional, Union
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-load_dotenv()
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
+# Read once at import; the entrypoint (app.main, app.manage, alembic) loads .env before importing this.
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+# crud relies on INSERT ... ON CONFLICT and RETURNING, which only these are used with.
+SUPPORTED_BACKENDS = ("postgresql", "sqlite")
+
+
+def _check_backend(url: str) -> None:
+    backend = make_url(url).get_backend_name()
+    if backend not in SUPPORTED_BACKENDS:
+        raise RuntimeError(f"DATABASE_URL must be a {' or '.join(SUPPORTED_BACKENDS)} database, not {backend}")
+
+
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=_ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+def _pool_options(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+DbSession = Union[Session, AsyncSession]
+
+# Engines are created on first use rather than at import, so importing the app (the CLI, alembic,
+# each uvicorn worker before it forks its event loop) opens no pool and needs no database.
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+_engine_callbacks: List[Callable[[Engine], None]] = []
+
+
+def on_engine_created(callback: Callable[[Engine], None]) -> None:
+    """Call callback with every (sync) engine this module creates, including ones that already exist."""
+    _engine_callbacks.append(callback)
+    for engine in (_engine, _async_engine.sync_engine if _async_engine is not None else None):
+        if engine is not None:
+            callback(engine)
+
+
+def get_engine() -> Engine:
+    global _engine, _session_factory
+    if _engine is None:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL is not set")
+        _check_backend(DATABASE_URL)
+        _engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL))
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+        for callback in _engine_callbacks:
+            callback(_engine)
+    return _engine
+
+
+def get_async_engine() -> Optional[AsyncEngine]:
+    """The async engine when DB_ASYNC is set, otherwise None."""
+    global _async_engine, _async_session_factory
+    if _async_engine is None and DB_ASYNC:
+        async_url = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+        _check_backend(async_url)
+        _async_engine = create_async_engine(async_url, **_pool_options(async_url))
+        _async_session_factory = async_sessionmaker(_async_engine, autoflush=False)
+        for callback in _engine_callbacks:
+            callback(_async_engine.sync_engine)
+    return _async_engine
+
+
+def SessionLocal() -> Session:
+    if _session_factory is None:
+        get_engine()
+    return _session_factory()
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    if _async_session_factory is None and get_async_engine() is None:
+        raise RuntimeError("DB_ASYNC is not enabled")
+    return _async_session_factory()
+
+
+async def dispose() -> None:
+    """Close every pooled connection; engines are recreated on next use."""
+    global _engine, _session_factory, _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        await run_in_threadpool(_engine.dispose)
+    _engine = _session_factory = _async_engine = _async_session_factory = None
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_session():
+    """Request-scoped session: an AsyncSession when DB_ASYNC is set, otherwise a sync Session."""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync crud function against either session type without blocking the event loop.
+
+    With an AsyncSession the function runs through run_sync on the async driver; with a
+    sync Session it runs in the threadpool. The session is always passed as the first argument.
+
+    A sync session is closed in the same worker thread once the function returns, so its
+    connection goes back to the pool straight away. Otherwise every threadpool worker can end
+    up waiting for a connection held by a session whose cleanup is queued behind them.
+    Returned objects stay loaded (close() expunges, it does not expire), and the session
+    can still be used for the next call.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+
+    def _run():
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(_run)
+
+
+async def release(db) -> None:
+    """Give the session's connection back to the pool, e.g. before a long-lived streaming response."""
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Run a sync crud function in a short-lived session of its own, for work outside a request."""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn, *args, **kwargs)
+
+    def _run():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(_run)
@@ -0,0 +1,50 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
+from app.db import database
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+# The revision matching the schema create_all used to build at startup: users and payouts only.
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Leave the caller's logging alone when run from the app or a benchmark.
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def head_revision() -> Optional[str]:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(connection) -> Optional[str]:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def upgrade(revision: str = "head") -> Optional[str]:
+    """Bring the database to revision and return the revision it ends up at.
+
+    A database whose tables were made by create_all, before there were migrations, has no
+    alembic_version table; it is stamped at the baseline first, so 0001 is not re-applied and
+    the later revisions add what that schema lacks.
+    """
+    with database.get_engine().begin() as connection:
+        config = alembic_config(connection)
+        if current_revision(connection) is None and inspect(connection).has_table("payouts"):
+            logger.info("Adopting existing schema at revision %s", BASELINE_REVISION)
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+        return current_revision(connection)
@@ -1,20 +1,76 @@
+from contextlib import asynccontextmanager
+import logging
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
-import os
-from app.db import database
 
 load_dotenv()
-from app.routes import auth, users, webhooks, payouts, currency
+from sqlalchemy import text
+
+from shared import logs
+
+from app.config.config import config
+
+logs.configure("backend", config.LOG_LEVEL, config.LOG_FORMAT, logs.parse_sample_rates(config.LOG_SAMPLE_RATES))
+
+from app.db import database
+from app.routes import auth, users, webhooks, payouts, currency, stats, metrics as metrics_route
+from app.services import http_client, metrics, rate_limit, retry_store, session_tokens
+from app.services.outbox_dispatcher import dispatcher
+from app.services.payout_events import hub
+from app.services.resend_queue import resend_queue
+
+logger = logging.getLogger(__name__)
+
+
+def _open_first_connection() -> None:
+    # Pays for the first connect during startup instead of in the first request.
+    with database.get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refuse to start rather than fail every login.
+    session_tokens.check_config()
+    # The schema is managed by migrations (python -m app.manage migrate), not created here.
+    database.get_async_engine()
+    try:
+        await run_in_threadpool(_open_first_connection)
+    except Exception as e:
+        logger.warning("Database not reachable at startup: %s", e)
+    if config.OUTBOX_DISPATCHER_ENABLED:
+        dispatcher.start()
+    hub.start()
+    resend_queue.start()
+    yield
+    await hub.stop()
+    await resend_queue.stop()
+    await dispatcher.stop()
+    await http_client.close_clients()
+    await retry_store.resend_attempts.close()
+    await rate_limit.rate_limiter.close()
+    await database.dispose()
+
 
-app = FastAPI(title="Diana's Fullstack Fintech App")
+app = FastAPI(title="Diana's Fullstack Fintech App", lifespan=lifespan)
 
 routers = [currency.router, payouts.router, users.router, webhooks.router, auth.router]
 for router in routers:
     app.include_router(router, prefix="/api")
+app.include_router(metrics_route.router)
+app.include_router(stats.router)
 
-app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET_KEY"))
-database.Base.metadata.create_all(bind=database.engine)
+app.add_middleware(SessionMiddleware, secret_key=config.SESSION_SECRET_KEY)
+app.add_middleware(session_tokens.SessionCookieMiddleware)
+# Outside the session and auth, so shed requests cost nothing more; inside metrics, so they are counted.
+if config.RATE_LIMIT_ENABLED:
+    app.add_middleware(rate_limit.RateLimitMiddleware)
+metrics.install(app)
+# Outermost, so every line logged while handling a request carries its id.
+app.add_middleware(logs.CorrelationIdMiddleware)
 
 @app.get("/")
 def root():
@@ -0,0 +1,61 @@
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db import database, migrations
+from app.services import crud
+
+
+def migrate(args) -> int:
+    revision = migrations.upgrade(args.revision)
+    print(f"Database is at revision {revision}")
+    return 0
+
+
+def summaries_check(args) -> int:
+    db = database.SessionLocal()
+    try:
+        mismatches = crud.check_payout_summaries(db)
+    finally:
+        db.close()
+
+    for mismatch in mismatches:
+        print(json.dumps(mismatch, default=str))
+    print(f"{len(mismatches)} mismatched payout summary bucket(s)")
+    return 1 if mismatches else 0
+
+
+def summaries_rebuild(args) -> int:
+    db = database.SessionLocal()
+    try:
+        buckets = crud.rebuild_payout_summaries(db)
+    finally:
+        db.close()
+
+    print(f"Rebuilt {buckets} payout summary bucket(s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_command = commands.add_parser("migrate", help="Apply schema migrations (run once per deploy, before the app)")
+    migrate_command.add_argument("revision", nargs="?", default="head")
+    migrate_command.set_defaults(func=migrate)
+
+    summaries = commands.add_parser("summaries", help="Payout summary aggregates")
+    summaries_commands = summaries.add_subparsers(dest="action", required=True)
+    summaries_commands.add_parser("check", help="Verify aggregates against the payouts table").set_defaults(func=summaries_check)
+    summaries_commands.add_parser("rebuild", help="Recompute aggregates from the payouts table").set_defaults(func=summaries_rebuild)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
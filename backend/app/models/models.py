@@ -1,12 +1,17 @@
 import enum
-from datetime import datetime
-from sqlalchemy import Numeric, Enum as SqlAlchemyEnum, ForeignKey
-from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime, timezone
+from sqlalchemy import Numeric, Enum as SqlAlchemyEnum, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from app.db.database import Base
 
+def utcnow() -> datetime:
+    # Naive UTC, so comparisons behave the same on Postgres and SQLite.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -34,6 +39,43 @@ class PayoutStatus(str, enum.Enum):
     BLOCKED = "BLOCKED"
     CANCELLED = "CANCELLED"
 
+# Where a payout may go from each status. Steps may be skipped (a provider can report PAID
+# straight after PENDING), but never go backwards, and PAID, BOUNCED, BLOCKED and CANCELLED
+# are final.
+PAYOUT_TRANSITIONS = {
+    PayoutStatus.INITIATED: frozenset({
+        PayoutStatus.PENDING, PayoutStatus.BLOCKED, PayoutStatus.CANCELLED,
+    }),
+    PayoutStatus.PENDING: frozenset({
+        PayoutStatus.AUTHORIZED, PayoutStatus.IN_TRANSIT, PayoutStatus.EXECUTED, PayoutStatus.PAID,
+        PayoutStatus.BOUNCED, PayoutStatus.BLOCKED, PayoutStatus.CANCELLED,
+    }),
+    PayoutStatus.AUTHORIZED: frozenset({
+        PayoutStatus.IN_TRANSIT, PayoutStatus.EXECUTED, PayoutStatus.PAID,
+        PayoutStatus.BOUNCED, PayoutStatus.BLOCKED, PayoutStatus.CANCELLED,
+    }),
+    PayoutStatus.IN_TRANSIT: frozenset({
+        PayoutStatus.EXECUTED, PayoutStatus.PAID, PayoutStatus.BOUNCED,
+    }),
+    PayoutStatus.EXECUTED: frozenset({
+        PayoutStatus.PAID, PayoutStatus.BOUNCED,
+    }),
+    PayoutStatus.PAID: frozenset(),
+    PayoutStatus.BOUNCED: frozenset(),
+    PayoutStatus.BLOCKED: frozenset(),
+    PayoutStatus.CANCELLED: frozenset(),
+}
+
+# The inverse: which statuses a payout may be in to move to a given status.
+PAYOUT_TRANSITION_SOURCES = {
+    target: frozenset(source for source, targets in PAYOUT_TRANSITIONS.items() if target in targets)
+    for target in PayoutStatus
+}
+
+
+def can_transition(old_status: PayoutStatus, new_status: PayoutStatus) -> bool:
+    return new_status in PAYOUT_TRANSITIONS[old_status]
+
 class Payout(Base):
     __tablename__ = "payouts"
 
@@ -44,4 +86,47 @@ class Payout(Base):
     status = Column(SqlAlchemyEnum(PayoutStatus, native_enum=True), nullable=False, default=PayoutStatus.INITIATED)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     owner = relationship("User", back_populates="payouts")
-    idempotency_key = Column(String, nullable=False, unique=True)
\ No newline at end of file
+    idempotency_key = Column(String, nullable=False, unique=True)
+
+Index('ix_payouts_user_id_id', Payout.user_id, Payout.id)
+
+
+class PayoutSummary(Base):
+    __tablename__ = "payout_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    currency = Column(String, nullable=False)
+    status = Column(SqlAlchemyEnum(PayoutStatus, native_enum=True), nullable=False)
+    payout_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric(18, 2), nullable=False, default=0)
+
+    __table_args__ = (PrimaryKeyConstraint("user_id", "currency", "status"),)
+
+
+class OutboxStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    FAILED = "FAILED"
+
+class PayoutOutbox(Base):
+    __tablename__ = "payout_outbox"
+
+    id = Column(Integer, primary_key=True)
+    payout_id = Column(Integer, ForeignKey("payouts.id"), nullable=False, unique=True)
+    payload = Column(JSON, nullable=False)
+    status = Column(SqlAlchemyEnum(OutboxStatus, native_enum=True), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=utcnow)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+Index('ix_payout_outbox_status_next_attempt_at', PayoutOutbox.status, PayoutOutbox.next_attempt_at)
+
+
+class WebhookResendAttempt(Base):
+    __tablename__ = "webhook_resend_attempts"
+
+    key = Column(String, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime, nullable=False)
+
+Index('ix_webhook_resend_attempts_expires_at', WebhookResendAttempt.expires_at)
@@ -2,12 +2,11 @@ import logging
 
 from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
 
 from app.db import database
 from app.models import models
 from app.schemas import schemas
-from app.services import auth_service
+from app.services import auth_service, session_tokens
 from app.config.config import config
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -22,31 +21,25 @@ def login_user(request: Request):
             return RedirectResponse(url="http://localhost/login/failure")
         return redirect_response
     except Exception as e:
-        logger.exception(f"Failed to initiate Google login: {e}")
+        logger.exception("Failed to initiate Google login: %s", e)
         return RedirectResponse(url="http://localhost/login/failure")
 
 @router.get("/callback")
-async def callback_user(request: Request, code: str, state: str, db: Session = Depends(database.get_db)):
+async def callback_user(request: Request, code: str, state: str, db: database.DbSession = Depends(database.get_session)):
     try:
         data = await auth_service.google_callback(request, code, state, db)
         access_token = data["access_token"]
 
         response = RedirectResponse(url=config.FRONTEND_SUCCESS_URL)
-        response.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            secure=True,
-            max_age=3600,
-        )
-        logger.info(f"Google login successful")
+        session_tokens.set_cookie(response, access_token)
+        logger.info("Google login successful")
         return response
 
     except HTTPException as e:
-        logger.warning(f"Google login HTTP error: {e.detail}")
+        logger.warning("Google login HTTP error: %s", e.detail)
         return RedirectResponse(url=config.FRONTEND_ERROR_URL)
 
     except Exception as e:
-        logger.exception(f"Google login unexpected error: {e}")
+        logger.exception("Google login unexpected error: %s", e)
         return RedirectResponse(url="http://localhost/login/failure")
 
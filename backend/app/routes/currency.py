@@ -1,8 +1,10 @@
+import hashlib
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from shared import currencies
 
-from app.config.config import config
 from app.schemas import schemas
 from app.services import user_service
 
@@ -10,20 +12,31 @@ router = APIRouter(prefix="/currency", tags=["currency"])
 
 logger = logging.getLogger(__name__)
 
-@router.get("/", response_model=schemas.CurrenciesResponse)
-def get_currencies(current_user=Depends(user_service.get_current_user)):
-    try:
-        if current_user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated"
-            )
-        return {"currencies": config.VALID_CURRENCIES}
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.exception(f"Failed to get currencies for user: {e}")
+# The list only changes with a deploy, so it is serialized once and revalidated by ETag.
+CURRENCIES_BODY = schemas.CurrenciesResponse(
+    currencies=list(currencies.SORTED_CODES),
+    minor_units=currencies.MINOR_UNITS,
+).model_dump_json().encode("utf-8")
+CURRENCIES_ETAG = f'"{hashlib.sha256(CURRENCIES_BODY).hexdigest()[:32]}"'
+CACHE_HEADERS = {"ETag": CURRENCIES_ETAG, "Cache-Control": "private, max-age=3600"}
+
+
+def _etag_matches(if_none_match: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == CURRENCIES_ETAG for tag in tags)
+
+
+def not_modified(if_none_match: str | None = Header(None)):
+    """Answer a matching If-None-Match with 304 before authentication or the database are touched."""
+    if if_none_match and _etag_matches(if_none_match):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=CACHE_HEADERS)
+
+
+@router.get("/", response_model=schemas.CurrenciesResponse, dependencies=[Depends(not_modified)])
+async def get_currencies(current_user=Depends(user_service.get_current_user)):
+    if current_user is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to fetch currencies"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
         )
+    return Response(content=CURRENCIES_BODY, media_type="application/json", headers=CACHE_HEADERS)
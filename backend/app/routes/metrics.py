@@ -0,0 +1,15 @@
+import asyncio
+
+from fastapi import APIRouter, Response
+
+from shared.metrics import CONTENT_TYPE, registry
+
+from app.services import metrics, retry_store
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    await asyncio.gather(metrics.refresh_outbox_pending(), retry_store.refresh_stats())
+    return Response(registry.render(), media_type=CONTENT_TYPE)
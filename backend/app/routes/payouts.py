@@ -1,13 +1,21 @@
-import httpx
+import base64
+import binascii
+import json
 import logging
+from typing import Annotated
+
+import httpx
 
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
 from app.db import database
 from app.models import models
-from app.schemas import schemas
-from app.services import crud, payment_service, user_service
+from app.schemas import schemas, serializers
+from app.services import crud, idempotency, user_service
+from app.services.outbox_dispatcher import dispatcher
+from app.services.payout_events import hub
 
 logger = logging.getLogger(__name__)
 
@@ -16,69 +24,194 @@ router = APIRouter(
     tags=["payouts"]
 )
 
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError("cursor id must be an integer")
+        return last_id
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=schemas.PaginatedPayouts)
-def get_payouts(
-    pagination: schemas.PaginationRequest = Depends(),
+async def get_payouts(
+    # A query model rather than Depends(): a class dependency is called in the threadpool.
+    pagination: Annotated[schemas.PaginationRequest, Query()],
     current_user: models.User = Depends(user_service.get_current_user),
-    db: Session = Depends(database.get_db)
+    db: database.DbSession = Depends(database.get_session)
 ):
     try:
-        payouts, total = crud.get_payouts_by_user_paginated(
-            db=db,
-            user_id=current_user.id,
-            offset=pagination.offset,
-            limit=pagination.limit
-        )
+        if pagination.cursor is not None:
+            payouts, has_more, total = await database.run_db(
+                db,
+                crud.get_payouts_by_user_keyset,
+                user_id=current_user.id,
+                before_id=decode_cursor(pagination.cursor),
+                limit=pagination.limit,
+                include_total=pagination.include_total
+            )
+        else:
+            payouts, total = await database.run_db(
+                db,
+                crud.get_payouts_by_user_paginated,
+                user_id=current_user.id,
+                offset=pagination.offset,
+                limit=pagination.limit
+            )
+            has_more = pagination.offset + len(payouts) < total
 
-        has_more = pagination.offset + len(payouts) < total
+        next_cursor = encode_cursor(payouts[-1].id) if has_more and payouts else None
 
-        return schemas.PaginatedPayouts(
-            payouts=payouts,
-            pagination=schemas.PaginationResponse(
-                total=total,
-                current_offset=pagination.offset,
-                has_more=has_more
-            )
+        # Rows go straight to JSON; response_model only documents the shape.
+        return Response(
+            content=serializers.paginated_payouts(payouts, total, pagination.offset, has_more, next_cursor),
+            media_type="application/json",
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Failed to get payouts for user {current_user.id}: {e}")
+        logger.exception("Failed to get payouts for user %s: %s", current_user.id, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to fetch payouts. Please try again later."
         )
 
 
-@router.post("/", response_model=schemas.PayoutPublic)
-def create_payout(
-    payout: schemas.PayoutCreate,
-    background_tasks: BackgroundTasks,
+@router.get("/summary", response_model=schemas.PayoutSummaryResponse)
+async def get_payout_summary(
     current_user: models.User = Depends(user_service.get_current_user),
-    db: Session = Depends(database.get_db)
+    db: database.DbSession = Depends(database.get_session)
 ):
     try:
-        new_payout = crud.create_payout_for_user(
-            db=db,
-            payout=payout,
-            user_id=current_user.id
+        buckets = await database.run_db(db, crud.get_payout_summary, user_id=current_user.id)
+        return schemas.PayoutSummaryResponse(
+            total_count=sum(bucket.payout_count for bucket in buckets),
+            buckets=buckets
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Failed to get payout summary for user %s: %s", current_user.id, e)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to fetch payout summary. Please try again later."
         )
 
-        mock_request_data = {
-            "user_id": current_user.id,
-            "amount": payout.amount,
-            "currency": payout.currency,
-            "idempotency_key": new_payout.idempotency_key
-        }
 
-        background_tasks.add_task(payment_service.send_payout_to_mock_service, mock_request_data)
+@router.get("/stream")
+async def stream_payout_events(
+    current_user: models.User = Depends(user_service.get_current_user),
+    db: database.DbSession = Depends(database.get_session)
+):
+    # Auth is done; don't pin a pooled DB connection for the lifetime of the stream.
+    await database.release(db)
+    subscription = hub.subscribe(current_user.id)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscription.next_event()
+                if event["type"] == "heartbeat":
+                    yield ": heartbeat\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event.get('payout'))}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/", response_model=schemas.PayoutPublic)
+async def create_payout(
+    payout: schemas.PayoutCreate,
+    response: Response,
+    current_user: models.User = Depends(user_service.get_current_user),
+    db: database.DbSession = Depends(database.get_session)
+):
+    try:
+        new_payout, created = await idempotency.create_payout(db, payout, current_user.id)
+
+        if created:
+            # The payout and its outbox row were committed together; the dispatcher sends it.
+            dispatcher.notify()
+        else:
+            response.headers["Idempotent-Replayed"] = "true"
 
         return new_payout
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(f"Failed to create payout for user {current_user.id}: {e}")
+        logger.exception("Failed to create payout for user %s: %s", current_user.id, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to create payout. Please try again later."
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/batch", response_model=schemas.PayoutBatchResponse)
+async def create_payouts_batch(
+    batch: schemas.PayoutBatchCreate,
+    current_user: models.User = Depends(user_service.get_current_user),
+    db: database.DbSession = Depends(database.get_session)
+):
+    try:
+        results = [None] * len(batch.payouts)
+        valid_indexes, valid_payouts, seen_keys = [], [], set()
+        for index, item in enumerate(batch.payouts):
+            key = item.get("idempotency_key")
+            key = str(key) if key is not None else None
+            try:
+                payout = schemas.PayoutCreate.model_validate(item)
+            except ValidationError as e:
+                error = "; ".join(err["msg"] for err in e.errors())
+                results[index] = schemas.PayoutBatchItemResult(index=index, idempotency_key=key, status="rejected", error=error)
+                continue
+            if payout.idempotency_key in seen_keys:
+                results[index] = schemas.PayoutBatchItemResult(
+                    index=index, idempotency_key=key, status="rejected", error="Duplicate idempotency_key in batch"
+                )
+                continue
+            seen_keys.add(payout.idempotency_key)
+            valid_indexes.append(index)
+            valid_payouts.append(payout)
+
+        outcomes = await database.run_db(db, crud.create_payouts_bulk, payouts=valid_payouts, user_id=current_user.id)
+        for index, payout, outcome in zip(valid_indexes, valid_payouts, outcomes):
+            if outcome["payout"] is not None:
+                idempotency.remember(outcome["payout"])
+            results[index] = schemas.PayoutBatchItemResult(
+                index=index,
+                idempotency_key=payout.idempotency_key,
+                status=outcome["status"],
+                payout=schemas.PayoutPublic.model_validate(outcome["payout"]) if outcome["payout"] is not None else None,
+                error=outcome.get("error"),
+            )
+
+        if any(outcome["status"] == "created" for outcome in outcomes):
+            dispatcher.notify()
+
+        return schemas.PayoutBatchResponse(
+            created=sum(1 for r in results if r.status == "created"),
+            duplicates=sum(1 for r in results if r.status == "duplicate"),
+            rejected=sum(1 for r in results if r.status == "rejected"),
+            results=results,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Failed to create payout batch for user %s: %s", current_user.id, e)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to create payouts. Please try again later."
+        )
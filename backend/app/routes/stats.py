@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+
+from app.services import http_client, idempotency, rate_limit, retry_store, user_service
+from app.services.outbox_dispatcher import dispatcher
+from app.services.payout_events import hub
+from app.services.provider_client import provider
+from app.services.resend_queue import resend_queue
+
+router = APIRouter(tags=["stats"])
+
+
+# Served beside /metrics, outside /api: nginx only proxies /api, so only the internal network reaches it.
+@router.get("/stats", include_in_schema=False)
+async def get_stats():
+    return {
+        "token_cache": user_service.token_cache_stats(),
+        "http_pools": http_client.pool_stats(),
+        "rate_limit": rate_limit.rate_limiter.stats(),
+        "outbox_dispatcher": dispatcher.stats(),
+        "payment_provider": provider.stats(),
+        "payout_idempotency": idempotency.stats(),
+        "payout_events": hub.stats(),
+        "webhook_resend_queue": resend_queue.stats(),
+        "webhook_resend_attempts": await retry_store.refresh_stats(),
+    }
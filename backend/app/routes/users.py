@@ -14,10 +14,10 @@ def get_current_user_profile(current_user: models.User = Depends(user_service.ge
     try:
         return schemas.UserPublic.from_orm(current_user)
     except HTTPException as e:
-        logger.warning(f"Auth error for current user: {e.detail}")
+        logger.warning("Auth error for current user: %s", e.detail)
         raise
     except Exception as e:
-        logger.exception(f"Unexpected error fetching current user: {e}")
+        logger.exception("Unexpected error fetching current user: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Failed to fetch user profile. Please try again later."
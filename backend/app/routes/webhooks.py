@@ -1,13 +1,20 @@
-import uuid
+import time
 import logging
 
-from fastapi import APIRouter, Header, HTTPException, Depends
-from sqlalchemy.orm import Session
+from collections import defaultdict
+
+from fastapi import APIRouter, Header, HTTPException, Depends, Request
+from pydantic import ValidationError
+
+from shared import logs
+from shared.signing import canonical_dumps
 
 from app.db import database
 from app.models import models
 from app.schemas import schemas
-from app.services import crud, payment_service
+from app.services import crud, metrics, payment_service
+from app.services.payout_events import hub
+from app.services.resend_queue import resend_queue
 
 
 router = APIRouter(
@@ -15,73 +22,184 @@ router = APIRouter(
     tags=["webhooks"]
 )
 
-logger = logging.getLogger("webhooks")
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] [%(levelname)s] [%(correlation_id)s] %(message)s'
-)
+logger = logging.getLogger(__name__)
+
+OUTCOME_MESSAGES = {
+    "updated": "Payout status updated successfully",
+    "unchanged": "Payout already has this status",
+    "stale": "Status transition not allowed, ignored",
+}
+
 
 @router.post("/payments")
 async def handle_payment_webhook(
     payload: schemas.WebhookPayload,
+    request: Request,
     x_mock_signature: str = Header(..., alias="X-Mock-Signature"),
-    db: Session = Depends(database.get_db)
+    db: database.DbSession = Depends(database.get_session)
 ):
-    correlation_id = payload.request_id or str(uuid.uuid4())
+    # The provider's request_id follows this callback through its retries and resends.
+    correlation_id = payload.request_id or logs.get_correlation_id()
+    logs.set_correlation_id(correlation_id)
 
     try:
-        valid_signature, old_timestamp = payment_service.verify_webhook_extended(
-            payload=payload.model_dump(),
-            signature=x_mock_signature
-        )
+        with metrics.webhook_verify_duration.time("single"):
+            # The body FastAPI parsed above is cached on the request, so this does not read it twice.
+            valid_signature, old_timestamp = payment_service.verify_webhook(
+                await request.body(), x_mock_signature, payload.timestamp
+            )
 
         if not valid_signature:
-            logger.error(
-                f"Rejected webhook for payout {payload.payout_id} due to INVALID signature",
-                extra={"correlation_id": correlation_id}
-            )
+            logger.error("Rejected webhook for payout %d due to INVALID signature", payload.payout_id)
             raise HTTPException(status_code=400, detail="Invalid signature")
 
+        dedup_key = payment_service.webhook_dedup_key(payload)
+        if payment_service.processed_webhooks.get(dedup_key) is not None:
+            metrics.webhook_events.inc("single", "duplicate")
+            logger.info("Webhook for payout %d was already processed, acknowledging", payload.payout_id)
+            return {"message": "Webhook already processed"}
+
         if old_timestamp:
-            logger.warning(
-                f"Webhook for payout {payload.payout_id} has OLD timestamp, requesting resend",
-                extra={"correlation_id": correlation_id}
-            )
-            payment_service.request_webhook_resend(payload.payout_id, correlation_id)
+            logger.warning("Webhook for payout %d has OLD timestamp, requesting resend", payload.payout_id)
+            resend_queue.enqueue(payload.payout_id, correlation_id)
             return {"message": "Webhook too old, requested resend"}
 
         try:
             status_enum = models.PayoutStatus[payload.new_status]
         except KeyError:
-            logger.error(
-                f"Invalid payout status received: {payload.new_status}",
-                extra={"correlation_id": correlation_id}
-            )
+            logger.error("Invalid payout status received: %s", payload.new_status)
             raise HTTPException(status_code=400, detail=f"Invalid status value: {payload.new_status}")
 
-        updated_payout = crud.update_payout_status(db=db, payout_id=payload.payout_id, new_status=status_enum)
-
-        if not updated_payout:
-            logger.warning(
-                f"Payout not found for ID {payload.payout_id}",
-                extra={"correlation_id": correlation_id}
+        with metrics.webhook_apply_duration.time("single"):
+            result = await database.run_db(
+                db, crud.update_payout_status, payout_id=payload.payout_id, new_status=status_enum
             )
-            raise HTTPException(status_code=404, detail=f"Payout with id {payload.payout_id} not found")
 
-        logger.info(
-            f"Payout {payload.payout_id} status updated to {payload.new_status}",
-            extra={"correlation_id": correlation_id}
-        )
-        return {"message": "Payout status updated successfully"}
+        outcome = result["status"]
+        payment_service.processed_webhooks.set(dedup_key, outcome)
+        metrics.webhook_events.inc("single", outcome)
+        if outcome != "updated":
+            logger.info("Payout %d is %s, ignoring %s status %s", payload.payout_id,
+                        result["payout"]["status"].value, outcome, payload.new_status)
+            return {"message": OUTCOME_MESSAGES[outcome]}
+
+        logger.info("Payout %d status updated to %s", payload.payout_id, payload.new_status)
+        updated_payout = result["payout"]
+        await hub.publish({
+            "type": "payout.status",
+            "user_id": updated_payout["user_id"],
+            "payout": schemas.PayoutPublic.model_validate(updated_payout).model_dump(mode="json"),
+        })
+        return {"message": OUTCOME_MESSAGES[outcome]}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.exception(
-            f"Unexpected error handling webhook for payout {payload.payout_id}: {e}",
-            extra={"correlation_id": correlation_id}
-        )
+        logger.exception("Unexpected error handling webhook for payout %d: %s", payload.payout_id, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to process webhook. Please try again later."
         )
+
+
+@router.post("/payments/batch", response_model=schemas.WebhookBatchResponse)
+async def handle_payment_webhook_batch(
+    batch: schemas.WebhookBatchPayload,
+    request: Request,
+    x_mock_signature: str | None = Header(None, alias="X-Mock-Signature"),
+    db: database.DbSession = Depends(database.get_session)
+):
+    """Apply many provider callbacks in one transaction.
+
+    Either the whole envelope is signed (X-Mock-Signature over the body, with its own timestamp)
+    or every event carries its own signature. Outcomes are reported per event.
+    """
+    results = [schemas.WebhookBatchItemResult(index=i, status="invalid_payload") for i in range(len(batch.events))]
+    events = {}
+    for i, event in enumerate(batch.events):
+        try:
+            events[i] = schemas.WebhookPayload.model_validate(event.payload)
+            results[i].payout_id = events[i].payout_id
+        except ValidationError as e:
+            results[i].error = str(e.errors()[0]["msg"])
+
+    stale = []
+    verify_started = time.perf_counter()
+    if x_mock_signature:
+        valid_signature, old_timestamp = payment_service.verify_webhook(
+            await request.body(), x_mock_signature, batch.timestamp
+        )
+        metrics.webhook_verify_duration.observe(time.perf_counter() - verify_started, "batch")
+        if not valid_signature:
+            logger.error("Rejected webhook batch due to INVALID envelope signature")
+            raise HTTPException(status_code=400, detail="Invalid signature")
+        if old_timestamp:
+            stale = list(events)
+    else:
+        for i in list(events):
+            event = batch.events[i]
+            # Nested events have no raw bytes of their own, so they are signed over their canonical JSON.
+            valid_signature, old_timestamp = payment_service.verify_webhook(
+                canonical_dumps(event.payload), event.signature, event.payload.get("timestamp")
+            )
+            if not valid_signature:
+                del events[i]
+                results[i].status = "invalid_signature"
+            elif old_timestamp:
+                stale.append(i)
+        metrics.webhook_verify_duration.observe(time.perf_counter() - verify_started, "batch")
+
+    for i in list(events):
+        if payment_service.processed_webhooks.get(payment_service.webhook_dedup_key(events[i])) is not None:
+            del events[i]
+            results[i].status = "duplicate"
+    stale = [i for i in stale if i in events]
+
+    if stale:
+        logger.warning("Webhook batch has %d events with OLD timestamps, requesting resend", len(stale))
+        for i in stale:
+            resend_queue.enqueue(events[i].payout_id, events[i].request_id)
+            del events[i]
+            results[i].status = "resend_requested"
+
+    # Each payout's events are applied in arrival order, as if the callbacks had come one by one.
+    updates = defaultdict(list)
+    indexes = defaultdict(list)
+    for i, payload in events.items():
+        updates[payload.payout_id].append(models.PayoutStatus[payload.new_status])
+        indexes[payload.payout_id].append(i)
+
+    try:
+        with metrics.webhook_apply_duration.time("batch"):
+            applied = await database.run_db(db, crud.update_payout_statuses_bulk, updates=dict(updates))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error handling webhook batch: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to process webhook batch. Please try again later."
+        )
+
+    updated = 0
+    for payout_id, event_indexes in indexes.items():
+        result = applied.get(payout_id)
+        if result is None:
+            for i in event_indexes:
+                results[i].status = "not_found"
+            continue
+        for i, outcome in zip(event_indexes, result["outcomes"]):
+            results[i].status = outcome
+            payment_service.processed_webhooks.set(payment_service.webhook_dedup_key(events[i]), outcome)
+        if "updated" in result["outcomes"]:
+            updated += 1
+            await hub.publish({
+                "type": "payout.status",
+                "user_id": result["payout"]["user_id"],
+                "payout": schemas.PayoutPublic.model_validate(result["payout"]).model_dump(mode="json"),
+            })
+    for result in results:
+        metrics.webhook_events.inc("batch", result.status)
+
+    logger.info("Webhook batch applied: %d of %d events updated payouts", updated, len(batch.events))
+    return {"updated": updated, "results": results}
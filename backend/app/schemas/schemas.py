@@ -1,7 +1,9 @@
 from datetime import datetime
 from decimal import Decimal
 from pydantic import BaseModel, ConfigDict, Field, field_validator, EmailStr
-from typing import List
+from typing import Any, Dict, List, Literal
+
+from shared import currencies
 
 from app.config.config import config
 from app.models import models
@@ -21,46 +23,70 @@ class PayoutCreate(BaseModel):
 
     @field_validator("currency")
     def validate_currency(cls, v):
-        if v not in config.VALID_CURRENCIES:
-            raise ValueError(f"Invalid currency: {v}. Must be one of {config.VALID_CURRENCIES}")
-        return v
+        return currencies.validate(v)
 
 class PayoutPublic(BaseModel):
+    id: int
     amount: Decimal = Field(..., gt=0, le=1000000, description="Amount must be > 0 and <= 1,000,000")
     currency: str
     status: models.PayoutStatus
     date: datetime
 
+    # Rows were validated when they were written; currency is not re-checked for every row listed.
     model_config = ConfigDict(from_attributes=True)
 
-    @field_validator("currency")
-    def validate_currency(cls, v):
-        if v not in config.VALID_CURRENCIES:
-            raise ValueError(f"Invalid currency: {v}. Must be one of {config.VALID_CURRENCIES}")
-        return v
-
     @field_validator("status")
     def validate_status(cls, v):
         if not isinstance(v, models.PayoutStatus):
             raise ValueError(f"Invalid status: {v}. Must be a valid PayoutStatus")
         return v
 
+class PayoutBatchCreate(BaseModel):
+    payouts: List[Dict[str, Any]] = Field(..., min_length=1, max_length=config.MAX_PAYOUT_BATCH_SIZE)
+
+class PayoutBatchItemResult(BaseModel):
+    index: int
+    idempotency_key: str | None = None
+    status: Literal["created", "duplicate", "rejected"]
+    payout: PayoutPublic | None = None
+    error: str | None = None
+
+class PayoutBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[PayoutBatchItemResult]
+
 class PaginationRequest(BaseModel):
     offset: int = Field(0, ge=0, description="Offset, must be ≥ 0")
     limit: int = Field(10, ge=1, le=50, description="Items per page, 1–50")
+    cursor: str | None = Field(None, description="Opaque next_cursor from a previous page; switches to keyset pagination")
+    include_total: bool = Field(False, description="Also count the total in cursor mode")
 
 class PaginationResponse(BaseModel):
-    total: int
+    total: int | None = None
     current_offset: int
     has_more: bool
+    next_cursor: str | None = None
 
-    class Config:
-        allow_population_by_field_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 class PaginatedPayouts(BaseModel):
     payouts: List[PayoutPublic]
     pagination: PaginationResponse
 
+class PayoutSummaryBucket(BaseModel):
+    currency: str
+    status: models.PayoutStatus
+    count: int = Field(..., validation_alias="payout_count")
+    total_amount: Decimal
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PayoutSummaryResponse(BaseModel):
+    total_count: int
+    buckets: List[PayoutSummaryBucket]
+
 class WebhookPayload(BaseModel):
     payout_id: int
     new_status: str
@@ -81,14 +107,25 @@ class WebhookPayload(BaseModel):
             raise ValueError("Timestamp must be a positive integer")
         return v
 
+class WebhookBatchEvent(BaseModel):
+    payload: Dict[str, Any]
+    signature: str | None = Field(None, description="Per-event signature; omit when the envelope is signed")
+
+class WebhookBatchPayload(BaseModel):
+    events: List[WebhookBatchEvent] = Field(..., min_length=1, max_length=config.MAX_WEBHOOK_BATCH_SIZE)
+    timestamp: int | None = None
+
+class WebhookBatchItemResult(BaseModel):
+    index: int
+    payout_id: int | None = None
+    status: Literal["updated", "unchanged", "stale", "duplicate", "not_found", "invalid_payload", "invalid_signature",
+                    "resend_requested"]
+    error: str | None = None
+
+class WebhookBatchResponse(BaseModel):
+    updated: int
+    results: List[WebhookBatchItemResult]
+
 class CurrenciesResponse(BaseModel):
     currencies: List[str]
-
-    @field_validator("currencies", mode="before")
-    def validate_currencies(cls, v):
-        if not isinstance(v, list):
-            raise ValueError("currencies must be a list")
-        invalid = [c for c in v if c not in config.VALID_CURRENCIES]
-        if invalid:
-            raise ValueError(f"Invalid currencies found: {invalid}. Must be one of {config.VALID_CURRENCIES}")
-        return v
+    minor_units: Dict[str, int | None] = Field(..., description="Digits after the decimal point per currency")
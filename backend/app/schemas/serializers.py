@@ -0,0 +1,46 @@
+"""JSON bodies for list endpoints, encoded straight from database rows.
+
+The rows come from column-only selects of data that was validated when it was written, so
+they are not re-validated through pydantic on the way out. The bytes match what the route's
+response_model would have produced: amounts as decimal strings, dates in ISO 8601.
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Optional
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder produces the same JSON, slower
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        # OPT_UTC_Z writes aware UTC datetimes with "Z", as pydantic does.
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def payout_rows(rows: Iterable) -> list:
+    """(id, amount, currency, status, date) rows as PayoutPublic-shaped dicts."""
+    return [
+        {"id": id, "amount": amount, "currency": currency, "status": status.value, "date": date}
+        for id, amount, currency, status, date in rows
+    ]
+
+
+def paginated_payouts(rows: Iterable, total: Optional[int], offset: int, has_more: bool,
+                      next_cursor: Optional[str]) -> bytes:
+    return dumps({
+        "payouts": payout_rows(rows),
+        "pagination": {"total": total, "current_offset": offset, "has_more": has_more, "next_cursor": next_cursor},
+    })
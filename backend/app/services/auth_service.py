@@ -4,14 +4,14 @@ import os
 import secrets
 import urllib.parse
 
-import httpx
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
 
-from app.services import crud
+from app.services import crud, http_client, user_service
+from app.services.session_tokens import session_tokens
 from app.config.config import config
+from app.db import database
 from app.models import models
 
 security = HTTPBearer()
@@ -46,7 +46,6 @@ def login_google(request: Request):
     }
 
     url = config.GOOGLE_ACCOUNTS_BASE_URL + urllib.parse.urlencode(params)
-    print(config.REDIRECT_URI)
     return RedirectResponse(url)
 
 
@@ -54,7 +53,7 @@ async def google_callback(
     request: Request,
     code: str,
     state: str,
-    db: Session,
+    db: database.DbSession,
 ):
     session_state = request.session.get("state") if hasattr(request, "session") else None
     if state != session_state:
@@ -62,7 +61,7 @@ async def google_callback(
 
     code_verifier = request.session.get("code_verifier") if hasattr(request, "session") else None
     token_url = config.GOOGLE_AUTH_BASE_URL + "/token"
-    user_info_url = "https://www.googleapis.com/oauth2/v3/userinfo"
+    user_info_url = config.GOOGLE_USERINFO_URL
     data = {
         "client_id": config.GOOGLE_CLIENT_ID,
         "client_secret": config.GOOGLE_CLIENT_SECRET,
@@ -72,21 +71,22 @@ async def google_callback(
         "code_verifier": code_verifier,
     }
 
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(token_url, data=data)
-        token_json = token_response.json()
+    client = http_client.get_client(http_client.GOOGLE)
+    token_response = await client.post(token_url, data=data)
+    token_json = token_response.json()
 
     if "error" in token_json:
         raise HTTPException(status_code=400, detail=token_json["error"])
 
     headers = {"Authorization": f"Bearer {token_json['access_token']}"}
-    async with httpx.AsyncClient() as client:
-        userinfo_response = await client.get(user_info_url, headers=headers)
-        userinfo = userinfo_response.json()
+    userinfo_response = await client.get(user_info_url, headers=headers)
+    userinfo = userinfo_response.json()
 
-    crud.get_or_create_user(db=db, google_profile=userinfo)
+    user = await database.run_db(db, crud.get_or_create_user, google_profile=userinfo)
+    user_service.cache_user(user)
 
+    # Google's token is only needed for the profile; the browser gets our own session token.
     return {
-            "access_token": token_json["access_token"],
+            "access_token": session_tokens.issue(user.id),
             "token_type": "Bearer"
         }
@@ -1,6 +1,12 @@
 import logging
 
-from typing import Tuple, List
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Tuple, List, Optional, Iterable
+from sqlalchemy import Integer, bindparam, case, cast, column, delete, func, insert, select, text, update, values
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from fastapi import HTTPException, status
@@ -10,6 +16,49 @@ from app.schemas import schemas
 
 logger = logging.getLogger(__name__)
 
+IDEMPOTENCY_KEY_REUSED = "idempotency_key was already used for a different payout"
+CENTS = Decimal("0.01")
+
+
+def _upsert(db: Session, table):
+    # database refuses to create engines for anything but Postgres and SQLite.
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _adjust_payout_summaries(db: Session, deltas: Dict[Tuple[int, str, models.PayoutStatus], Tuple[int, object]]) -> None:
+    """Apply (count, amount) deltas to many summary buckets with one upsert statement.
+
+    Buckets are written in key order so concurrent transactions lock them in the same order.
+    """
+    rows = [
+        {"user_id": user_id, "currency": currency, "status": payout_status,
+         "payout_count": count_delta, "total_amount": amount_delta}
+        for (user_id, currency, payout_status), (count_delta, amount_delta) in sorted(
+            deltas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2].value)
+        )
+        if count_delta or amount_delta
+    ]
+    if not rows:
+        return
+
+    summary = models.PayoutSummary.__table__
+    stmt = _upsert(db, summary).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[summary.c.user_id, summary.c.currency, summary.c.status],
+        set_={
+            "payout_count": summary.c.payout_count + stmt.excluded.payout_count,
+            "total_amount": summary.c.total_amount + stmt.excluded.total_amount,
+        },
+    )
+    db.execute(stmt)
+
+
+def _adjust_payout_summary(db: Session, user_id: int, currency: str, payout_status: models.PayoutStatus,
+                           count_delta: int, amount_delta) -> None:
+    _adjust_payout_summaries(db, {(user_id, currency, payout_status): (count_delta, amount_delta)})
+
 
 def get_or_create_user(db: Session, google_profile: dict) -> models.User:
     function_name = "get_or_create_user"
@@ -57,49 +106,211 @@ def get_or_create_user(db: Session, google_profile: dict) -> models.User:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error")
 
 
-def create_payout_for_user(db: Session, payout: schemas.PayoutCreate, user_id: int) -> models.Payout:
+def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
+    function_name = "get_user_by_id"
+    try:
+        return db.get(models.User, user_id)
+    except SQLAlchemyError as e:
+        logger.exception("[%s] DB query failed: %s", function_name, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
+
+
+def payout_matches(row, payout: schemas.PayoutCreate, user_id: int) -> bool:
+    """Whether an existing payout row is the one this request would have created."""
+    # Amounts are stored with two decimal places, so compare what would have been stored.
+    return (
+        row.user_id == user_id
+        and row.currency == payout.currency
+        and row.amount == payout.amount.quantize(CENTS, ROUND_HALF_UP)
+    )
+
+
+def _insert_payouts(db: Session, payouts: List[schemas.PayoutCreate], user_id: int) -> Tuple[Dict[str, Row], Dict[str, Row]]:
+    """Insert payouts whose idempotency_key is new, with their summaries and outbox rows; no commit.
+
+    Returns (created rows, existing rows for the keys that were taken), both by idempotency_key.
+    Taken keys are skipped by ON CONFLICT DO NOTHING, so a retry never fails the transaction.
+    """
+    payout_table = models.Payout.__table__
+    now = datetime.now()
+    stmt = (
+        _upsert(db, payout_table)
+        .values([
+            {
+                "amount": payout.amount,
+                "currency": payout.currency,
+                "idempotency_key": payout.idempotency_key,
+                "user_id": user_id,
+                "status": models.PayoutStatus.PENDING,
+                "date": now,
+            }
+            for payout in payouts
+        ])
+        .on_conflict_do_nothing(index_elements=[payout_table.c.idempotency_key])
+        .returning(*payout_table.c)
+    )
+    created = {row.idempotency_key: row for row in db.execute(stmt)}
+
+    conflicted_keys = [p.idempotency_key for p in payouts if p.idempotency_key not in created]
+    existing = {}
+    if conflicted_keys:
+        existing = {
+            row.idempotency_key: row
+            for row in db.execute(select(payout_table).where(payout_table.c.idempotency_key.in_(conflicted_keys)))
+        }
+
+    if created:
+        totals = {}
+        for row in created.values():
+            count, amount = totals.get(row.currency, (0, 0))
+            totals[row.currency] = (count + 1, amount + row.amount)
+        for currency, (count, amount) in totals.items():
+            _adjust_payout_summary(db, user_id, currency, models.PayoutStatus.PENDING, count, amount)
+        db.execute(insert(models.PayoutOutbox), [
+            {"payout_id": row.id, "payload": _outbox_payload(row), "next_attempt_at": models.utcnow()}
+            for row in created.values()
+        ])
+    return created, existing
+
+
+def create_payout_for_user(db: Session, payout: schemas.PayoutCreate, user_id: int) -> Tuple[Row, bool]:
+    """Create payout unless its idempotency_key is taken.
+
+    Returns (the row holding that key, whether it was created now). An existing row may belong
+    to another user or differ from payout; check it with payout_matches.
+    """
     function_name = "create_payout_for_user"
 
     try:
-        logger.info("[%s] Creating payout for user_id=%s: %s", function_name, user_id, payout.model_dump())
-        db_payout = models.Payout(
-            **payout.model_dump(),
-            user_id=user_id,
-            status=models.PayoutStatus.PENDING
-        )
-        db.add(db_payout)
+        logger.info("[%s] Creating payout for user_id=%s: %s %s key=%s", function_name, user_id, payout.amount,
+                    payout.currency, payout.idempotency_key)
+        created, existing = _insert_payouts(db, [payout], user_id)
         db.commit()
-        db.refresh(db_payout)
-        return db_payout
-    except IntegrityError as e:
-        db.rollback()
-        logger.exception("[%s] Integrity error creating payout: %s", function_name, e)
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Payout already exists")
+        row = created.get(payout.idempotency_key)
+        if row is not None:
+            return row, True
+        logger.info("[%s] Payout with key=%s already exists", function_name, payout.idempotency_key)
+        return existing[payout.idempotency_key], False
     except SQLAlchemyError as e:
         db.rollback()
         logger.exception("[%s] DB error creating payout: %s", function_name, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
-    except Exception as e:
+
+
+def create_payouts_bulk(db: Session, payouts: List[schemas.PayoutCreate], user_id: int) -> List[dict]:
+    """Insert many payouts with one multi-row statement and return one result per input item.
+
+    Items whose idempotency_key already exists are skipped by ON CONFLICT DO NOTHING and
+    reported as "duplicate" when the existing payout is the same one, or "rejected" (another
+    user's key, or a different amount or currency under the key).
+    Summaries and outbox rows for the new payouts are written in the same transaction.
+    """
+    function_name = "create_payouts_bulk"
+    if not payouts:
+        return []
+
+    try:
+        logger.info("[%s] Creating %d payouts for user_id=%s", function_name, len(payouts), user_id)
+        created, existing = _insert_payouts(db, payouts, user_id)
+        db.commit()
+
+        results = []
+        for payout in payouts:
+            row = created.get(payout.idempotency_key)
+            if row is not None:
+                results.append({"status": "created", "payout": row})
+                continue
+            row = existing.get(payout.idempotency_key)
+            if row is None or row.user_id != user_id:
+                results.append({"status": "rejected", "payout": None, "error": "Payout already exists"})
+            elif payout_matches(row, payout, user_id):
+                results.append({"status": "duplicate", "payout": row})
+            else:
+                results.append({"status": "rejected", "payout": None, "error": IDEMPOTENCY_KEY_REUSED})
+        return results
+    except SQLAlchemyError as e:
         db.rollback()
-        logger.exception("[%s] Unexpected error creating payout: %s", function_name, e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error")
+        logger.exception("[%s] DB error creating payouts: %s", function_name, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
+
+
+def _transition_payout(db: Session, payout_id: int, new_status: models.PayoutStatus) -> Optional[dict]:
+    """Move a payout to new_status if the state machine allows it from its current status.
+
+    Returns the updated row plus its old_status, or None when nothing was written (the payout
+    does not exist, or the transition is not allowed).
+    """
+    payouts = models.Payout.__table__
+    allowed = models.PAYOUT_TRANSITION_SOURCES[new_status]
+    if not allowed:
+        return None
+
+    if db.get_bind().dialect.name == "postgresql":
+        # One round trip: the CTE locks the row and reads the status it is leaving, and the
+        # UPDATE only matches if that status may move to new_status.
+        old = (
+            select(payouts.c.id, payouts.c.status)
+            .where(payouts.c.id == payout_id, payouts.c.status.in_(allowed))
+            .with_for_update()
+            .cte("old")
+        )
+        row = db.execute(
+            update(payouts)
+            .where(payouts.c.id == old.c.id)
+            .values(status=new_status)
+            .returning(*payouts.c, old.c.status.label("old_status"))
+        ).mappings().first()
+        return dict(row) if row else None
+
+    # SQLite cannot return columns of the FROM clause, so read the status first and make the
+    # UPDATE conditional on it still being that status.
+    while True:
+        old_status = db.execute(select(payouts.c.status).where(payouts.c.id == payout_id)).scalar()
+        if old_status not in allowed:
+            return None
+        row = db.execute(
+            update(payouts)
+            .where(payouts.c.id == payout_id, payouts.c.status == old_status)
+            .values(status=new_status)
+            .returning(*payouts.c)
+        ).mappings().first()
+        if row:
+            return {**row, "old_status": old_status}
 
 
-def update_payout_status(db: Session, payout_id: int, new_status: models.PayoutStatus) -> models.Payout:
+def update_payout_status(db: Session, payout_id: int, new_status: models.PayoutStatus) -> dict:
+    """Apply a provider status change; returns {"status": outcome, "payout": row}.
+
+    The outcome is "updated", "unchanged" (already in new_status) or "stale" (the state machine
+    does not allow the transition, e.g. PENDING after PAID). Only "updated" writes anything.
+    """
     function_name = "update_payout_status"
 
     try:
-        db_payout = db.query(models.Payout).filter(models.Payout.id == payout_id).first()
-        if not db_payout:
+        row = _transition_payout(db, payout_id, new_status)
+        if row:
+            logger.info("[%s] Updating payout_id=%d status %s -> %s", function_name, payout_id, row["old_status"],
+                        new_status)
+            _adjust_payout_summaries(db, {
+                (row["user_id"], row["currency"], row["old_status"]): (-1, -row["amount"]),
+                (row["user_id"], row["currency"], new_status): (1, row["amount"]),
+            })
+            db.commit()
+            return {"status": "updated", "payout": row}
+
+        db.rollback()
+        payouts = models.Payout.__table__
+        current = db.execute(select(payouts).where(payouts.c.id == payout_id)).mappings().first()
+        if not current:
             logger.warning("[%s] Payout not found: %d", function_name, payout_id)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payout not found")
 
-        logger.info("[%s] Updating payout_id=%d status to %s", function_name, payout_id, new_status)
-        db_payout.status = new_status
-        db.add(db_payout)
-        db.commit()
-        db.refresh(db_payout)
-        return db_payout
+        outcome = "unchanged" if current["status"] == new_status else "stale"
+        logger.info("[%s] Ignoring %s status %s for payout_id=%d in %s", function_name, outcome, new_status,
+                    payout_id, current["status"])
+        return {"status": outcome, "payout": dict(current)}
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         db.rollback()
         logger.exception("[%s] DB error updating payout %d: %s", function_name, payout_id, e)
@@ -110,18 +321,373 @@ def update_payout_status(db: Session, payout_id: int, new_status: models.PayoutS
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error")
 
 
-def get_payouts_by_user_paginated(db: Session, user_id: int, offset: int = 0, limit: int = 10) -> Tuple[List[models.Payout], int]:
+def _bulk_status_update(db: Session, new_statuses: Dict[int, models.PayoutStatus]):
+    payouts = models.Payout.__table__
+    status_type = payouts.c.status.type
+    if db.get_bind().dialect.name == "postgresql":
+        rows = values(column("id", Integer), column("status", status_type), name="v").data(
+            list(new_statuses.items())
+        )
+        return (
+            update(payouts)
+            .where(payouts.c.id == rows.c.id)
+            .values(status=cast(rows.c.status, status_type))
+        )
+    # Other dialects lack UPDATE ... FROM (VALUES ...) with column aliases; a CASE is still one statement.
+    return (
+        update(payouts)
+        .where(payouts.c.id.in_(list(new_statuses)))
+        .values(status=case(
+            {payout_id: bindparam(f"status_{payout_id}", new_status, type_=status_type)
+             for payout_id, new_status in new_statuses.items()},
+            value=payouts.c.id,
+        ))
+    )
+
+
+def update_payout_statuses_bulk(db: Session, updates: Dict[int, List[models.PayoutStatus]]) -> Dict[int, dict]:
+    """Apply many status changes in one transaction.
+
+    updates holds each payout's reported statuses in arrival order. They are folded through the
+    state machine as if the callbacks had arrived one by one, so a late PENDING cannot undo a PAID.
+    Returns {"outcomes": [per status], "payout": final row} by payout id; ids missing from the
+    result were not found.
+    """
+    function_name = "update_payout_statuses_bulk"
+    if not updates:
+        return {}
+
+    payouts = models.Payout.__table__
+    try:
+        # Lock in id order so concurrent batches cannot deadlock on each other.
+        rows = db.execute(
+            select(payouts)
+            .where(payouts.c.id.in_(list(updates)))
+            .order_by(payouts.c.id)
+            .with_for_update()
+        ).mappings().all()
+
+        changed = {}
+        summary_deltas = defaultdict(lambda: [0, 0])
+        result = {}
+        for row in rows:
+            current = row["status"]
+            outcomes = []
+            for new_status in updates[row["id"]]:
+                if new_status == current:
+                    outcomes.append("unchanged")
+                elif models.can_transition(current, new_status):
+                    outcomes.append("updated")
+                    current = new_status
+                else:
+                    outcomes.append("stale")
+            result[row["id"]] = {"outcomes": outcomes, "payout": {**row, "status": current}}
+            if current == row["status"]:
+                continue
+            changed[row["id"]] = current
+            old_bucket = summary_deltas[(row["user_id"], row["currency"], row["status"])]
+            old_bucket[0] -= 1
+            old_bucket[1] -= row["amount"]
+            new_bucket = summary_deltas[(row["user_id"], row["currency"], current)]
+            new_bucket[0] += 1
+            new_bucket[1] += row["amount"]
+
+        logger.info("[%s] Updating %d of %d payouts (%d not found)", function_name, len(changed), len(updates),
+                    len(updates) - len(rows))
+        if changed:
+            db.execute(_bulk_status_update(db, changed))
+            _adjust_payout_summaries(db, summary_deltas)
+        db.commit()
+        return result
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.exception("[%s] DB error updating %d payouts: %s", function_name, len(updates), e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
+
+
+# The columns PayoutPublic exposes; list queries select only these, as plain rows.
+PAYOUT_LIST_COLUMNS = (
+    models.Payout.id, models.Payout.amount, models.Payout.currency, models.Payout.status, models.Payout.date
+)
+
+
+def get_payouts_by_user_paginated(db: Session, user_id: int, offset: int = 0, limit: int = 10) -> Tuple[List[Row], int]:
+    """A page of the user's payouts, newest first, and their total.
+
+    The total is the sum of the user's payout_summaries buckets, not a COUNT(*) over payouts;
+    it is exact as long as the summaries are (python -m app.manage summaries check).
+    """
     function_name = "get_payouts_by_user_paginated"
 
     try:
         logger.info("[%s] Fetching payouts for user_id=%d offset=%d limit=%d", function_name, user_id, offset, limit)
-        query = db.query(models.Payout).filter(models.Payout.user_id == user_id)
-        total = query.count()
-        payouts = query.order_by(models.Payout.id.desc()).offset(offset).limit(limit).all()
-        return payouts, total
+        total = get_payout_total(db, user_id)
+        query = (
+            select(*PAYOUT_LIST_COLUMNS)
+            .where(models.Payout.user_id == user_id)
+            .order_by(models.Payout.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return db.execute(query).all(), total
+    except SQLAlchemyError as e:
+        logger.exception("[%s] DB error fetching payouts for user %d: %s", function_name, user_id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
+    except Exception as e:
+        logger.exception("[%s] Unexpected error fetching payouts for user %d: %s", function_name, user_id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error")
+
+
+def get_payouts_by_user_keyset(
+    db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 10, include_total: bool = False
+) -> Tuple[List[Row], bool, Optional[int]]:
+    function_name = "get_payouts_by_user_keyset"
+
+    try:
+        logger.info("[%s] Fetching payouts for user_id=%d before_id=%s limit=%d", function_name, user_id, before_id, limit)
+        query = select(*PAYOUT_LIST_COLUMNS).where(models.Payout.user_id == user_id)
+        total = get_payout_total(db, user_id) if include_total else None
+        if before_id is not None:
+            query = query.where(models.Payout.id < before_id)
+        # One extra row tells us whether another page exists without counting.
+        payouts = db.execute(query.order_by(models.Payout.id.desc()).limit(limit + 1)).all()
+        return payouts[:limit], len(payouts) > limit, total
     except SQLAlchemyError as e:
         logger.exception("[%s] DB error fetching payouts for user %d: %s", function_name, user_id, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
     except Exception as e:
         logger.exception("[%s] Unexpected error fetching payouts for user %d: %s", function_name, user_id, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error")
+
+
+def _outbox_payload(payout) -> dict:
+    return {
+        "user_id": payout.user_id,
+        "amount": str(payout.amount),
+        "currency": payout.currency,
+        "idempotency_key": payout.idempotency_key,
+    }
+
+
+def claim_outbox_batch(db: Session, batch_size: int, lease_seconds: int) -> List[dict]:
+    """Lease up to batch_size due outbox rows to this dispatcher.
+
+    Rows are locked with SKIP LOCKED so concurrent dispatchers on other replicas claim disjoint
+    batches, then pushed lease_seconds into the future so a crashed dispatcher's rows come back.
+    """
+    now = models.utcnow()
+    try:
+        rows = (
+            db.query(models.PayoutOutbox)
+            .filter(
+                models.PayoutOutbox.status == models.OutboxStatus.PENDING,
+                models.PayoutOutbox.next_attempt_at <= now,
+            )
+            .order_by(models.PayoutOutbox.next_attempt_at, models.PayoutOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        claimed = []
+        for row in rows:
+            row.attempts += 1
+            row.next_attempt_at = now + timedelta(seconds=lease_seconds)
+            claimed.append({"id": row.id, "payout_id": row.payout_id, "payload": row.payload, "attempts": row.attempts})
+        db.commit()
+        return claimed
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def complete_outbox_entries(db: Session, entry_ids: Iterable[int]) -> None:
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return
+    try:
+        db.execute(delete(models.PayoutOutbox).where(models.PayoutOutbox.id.in_(entry_ids)))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def reschedule_outbox_entries(db: Session, retries: List[dict], error: str) -> None:
+    """Push failed deliveries back; each retry is {"id", "delay_seconds", "give_up"}."""
+    function_name = "reschedule_outbox_entries"
+    if not retries:
+        return
+
+    try:
+        now = models.utcnow()
+        by_id = {retry["id"]: retry for retry in retries}
+        entries = db.query(models.PayoutOutbox).filter(models.PayoutOutbox.id.in_(by_id)).all()
+        for entry in entries:
+            retry = by_id[entry.id]
+            entry.last_error = error[:1000]
+            if retry["give_up"]:
+                logger.error("[%s] Giving up on outbox entry %d for payout %d after %d attempts: %s",
+                             function_name, entry.id, entry.payout_id, entry.attempts, error)
+                entry.status = models.OutboxStatus.FAILED
+            else:
+                entry.next_attempt_at = now + timedelta(seconds=retry["delay_seconds"])
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def defer_outbox_entries(db: Session, entry_ids: Iterable[int]) -> None:
+    """Put claimed entries back as due, without counting the attempt: they were never sent."""
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return
+    try:
+        db.execute(
+            update(models.PayoutOutbox)
+            .where(models.PayoutOutbox.id.in_(entry_ids))
+            .values(attempts=models.PayoutOutbox.attempts - 1, next_attempt_at=models.utcnow())
+        )
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def increment_resend_attempts(db: Session, key: str, ttl_seconds: float) -> int:
+    """Count one more resend attempt for key and return the total; counts expire ttl_seconds after the last one."""
+    table = models.WebhookResendAttempt.__table__
+    now = models.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    stmt = _upsert(db, table).values(key=key, attempts=1, expires_at=expires_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={
+            "attempts": case((table.c.expires_at <= now, 1), else_=table.c.attempts + 1),
+            "expires_at": expires_at,
+        },
+    ).returning(table.c.attempts)
+    try:
+        attempts = db.execute(stmt).scalar_one()
+        db.commit()
+        return attempts
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def purge_resend_attempts(db: Session, max_rows: int) -> Tuple[int, int]:
+    """Delete expired counts, then the least recently used ones beyond max_rows; returns (expired, evicted)."""
+    table = models.WebhookResendAttempt.__table__
+    try:
+        expired = db.execute(delete(table).where(table.c.expires_at <= models.utcnow())).rowcount
+        excess = db.execute(select(func.count()).select_from(table)).scalar() - max_rows
+        evicted = 0
+        if excess > 0:
+            # Every write pushes expires_at out by the same TTL, so the earliest expiry is the least recently used.
+            oldest = select(table.c.key).order_by(table.c.expires_at).limit(excess).scalar_subquery()
+            evicted = db.execute(delete(table).where(table.c.key.in_(oldest))).rowcount
+        db.commit()
+        return expired, evicted
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def resend_attempts_stats(db: Session) -> dict:
+    table = models.WebhookResendAttempt.__table__
+    size = db.execute(select(func.count()).select_from(table)).scalar()
+    memory_bytes = None
+    if db.get_bind().dialect.name == "postgresql":
+        memory_bytes = db.execute(select(func.pg_total_relation_size(table.name))).scalar()
+    return {"size": size, "memory_bytes": memory_bytes}
+
+
+def count_pending_outbox(db: Session) -> int:
+    return db.query(func.count(models.PayoutOutbox.id)).filter(
+        models.PayoutOutbox.status == models.OutboxStatus.PENDING
+    ).scalar()
+
+
+def get_payout_total(db: Session, user_id: int) -> int:
+    total = (
+        db.query(func.coalesce(func.sum(models.PayoutSummary.payout_count), 0))
+        .filter(models.PayoutSummary.user_id == user_id)
+        .scalar()
+    )
+    return int(total)
+
+
+def get_payout_summary(db: Session, user_id: int) -> List[models.PayoutSummary]:
+    function_name = "get_payout_summary"
+
+    try:
+        return (
+            db.query(models.PayoutSummary)
+            .filter(models.PayoutSummary.user_id == user_id, models.PayoutSummary.payout_count > 0)
+            .order_by(models.PayoutSummary.currency, models.PayoutSummary.status)
+            .all()
+        )
+    except SQLAlchemyError as e:
+        logger.exception("[%s] DB error fetching payout summary for user %d: %s", function_name, user_id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error")
+
+
+def _payout_aggregates_query():
+    return select(
+        models.Payout.user_id,
+        models.Payout.currency,
+        models.Payout.status,
+        func.count(models.Payout.id).label("payout_count"),
+        func.sum(models.Payout.amount).label("total_amount"),
+    ).group_by(models.Payout.user_id, models.Payout.currency, models.Payout.status)
+
+
+def check_payout_summaries(db: Session) -> List[dict]:
+    """Compare the maintained summaries with a GROUP BY over payouts and return every mismatch."""
+    expected = {
+        (row.user_id, row.currency, row.status): (row.payout_count, row.total_amount)
+        for row in db.execute(_payout_aggregates_query())
+    }
+    actual = {
+        (row.user_id, row.currency, row.status): (row.payout_count, row.total_amount)
+        for row in db.query(models.PayoutSummary).filter(models.PayoutSummary.payout_count != 0)
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        if expected.get(key) != actual.get(key):
+            user_id, currency, payout_status = key
+            mismatches.append({
+                "user_id": user_id,
+                "currency": currency,
+                "status": payout_status.value,
+                "expected": expected.get(key, (0, 0)),
+                "actual": actual.get(key, (0, 0)),
+            })
+    return mismatches
+
+
+def rebuild_payout_summaries(db: Session) -> int:
+    """Recompute all summaries from payouts in one transaction and return the number of buckets."""
+    function_name = "rebuild_payout_summaries"
+
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # Hold off payout writers so no create/update lands between the scan and the insert.
+            db.execute(text("LOCK TABLE payouts IN SHARE MODE"))
+        db.execute(delete(models.PayoutSummary))
+        aggregates = _payout_aggregates_query().subquery()
+        db.execute(
+            insert(models.PayoutSummary).from_select(
+                ["user_id", "currency", "status", "payout_count", "total_amount"],
+                select(aggregates),
+            )
+        )
+        db.commit()
+        buckets = db.query(func.count()).select_from(models.PayoutSummary).scalar()
+        logger.info("[%s] Rebuilt %d payout summary buckets", function_name, buckets)
+        return buckets
+    except SQLAlchemyError:
+        db.rollback()
+        raise
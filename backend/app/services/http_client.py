@@ -0,0 +1,153 @@
+import logging
+import time
+from typing import Dict
+
+import httpx
+
+from shared import logs
+
+from app.config.config import config
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+GOOGLE = "google"
+MOCK_PAYMENTS = "mock_payments"
+
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+class UpstreamStats:
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0
+        self.new_connections = 0
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport to count in-flight requests, new connections and saturation."""
+
+    def __init__(self, upstream: str, stats: UpstreamStats, **transport_kwargs):
+        self.upstream = upstream
+        self.stats = stats
+        self._transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.new_connections += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+        if stats.in_flight >= stats.max_connections:
+            stats.saturated += 1
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        request.extensions.setdefault("trace", self._trace)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self._transport.handle_async_request(request)
+            outcome = str(response.status_code)
+            return response
+        except httpx.TransportError:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            metrics.upstream_request_duration.observe(
+                time.perf_counter() - started, self.upstream, request.url.path, outcome
+            )
+
+    def pool_connections(self) -> Dict[str, int]:
+        # httpcore does not expose the pool through httpx's public API.
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_UPSTREAMS = {
+    GOOGLE: {
+        "timeout": httpx.Timeout(config.GOOGLE_HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+        "max_connections": config.GOOGLE_HTTP_MAX_CONNECTIONS,
+    },
+    MOCK_PAYMENTS: {
+        "timeout": httpx.Timeout(config.MOCK_PAYMENTS_HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+        "max_connections": config.MOCK_PAYMENTS_HTTP_MAX_CONNECTIONS,
+        # Our own service: send X-Request-ID so its logs for this payout share our correlation id.
+        "propagate_correlation_id": True,
+    },
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, InstrumentedTransport] = {}
+_stats: Dict[str, UpstreamStats] = {
+    name: UpstreamStats(settings["max_connections"]) for name, settings in _UPSTREAMS.items()
+}
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream, creating it on first use."""
+    client = _clients.get(upstream)
+    if client is not None and not client.is_closed:
+        return client
+
+    settings = _UPSTREAMS[upstream]
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=min(config.HTTP_MAX_KEEPALIVE_CONNECTIONS, settings["max_connections"]),
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = InstrumentedTransport(
+        upstream,
+        _stats[upstream],
+        limits=limits,
+        http2=config.HTTP2_ENABLED and _HTTP2_AVAILABLE,
+        retries=0,
+    )
+    hooks = [logs.propagate_correlation_id] if settings.get("propagate_correlation_id") else []
+    client = httpx.AsyncClient(transport=transport, timeout=settings["timeout"], event_hooks={"request": hooks})
+    _clients[upstream] = client
+    _transports[upstream] = transport
+    return client
+
+
+async def close_clients() -> None:
+    for upstream, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning("Failed to close HTTP client for %s: %s", upstream, e)
+    _clients.clear()
+    _transports.clear()
+
+
+def pool_stats() -> Dict[str, dict]:
+    result = {}
+    for upstream, stats in _stats.items():
+        transport = _transports.get(upstream)
+        pool = transport.pool_connections() if transport else {"open_connections": 0, "idle_connections": 0}
+        result[upstream] = {
+            "requests": stats.requests,
+            "errors": stats.errors,
+            "in_flight": stats.in_flight,
+            "peak_in_flight": stats.peak_in_flight,
+            "max_connections": stats.max_connections,
+            "saturated_requests": stats.saturated,
+            "new_connections": stats.new_connections,
+            "reused_connections": max(stats.requests - stats.errors - stats.new_connections, 0),
+            **pool,
+        }
+    return result
@@ -0,0 +1,69 @@
+"""Idempotent payout creation: a retried POST /api/payouts gets back the payout it created.
+
+The payouts table, with its unique idempotency_key, is the durable record of every key. In
+front of it a bounded in-memory cache maps recently used keys to their payout row, so a
+client retrying after a timeout is answered without touching the database, and concurrent
+requests for the same key in this worker share one insert. A replay returns the payout as
+it was created when the key is cached, and as it is now when it has to be read back.
+"""
+import logging
+from typing import Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.engine import Row
+
+from app.config.config import config
+from app.db import database
+from app.schemas import schemas
+from app.services import crud
+from app.services.cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+payouts_by_key = TTLCache(max_size=config.IDEMPOTENCY_CACHE_SIZE, default_ttl=config.IDEMPOTENCY_CACHE_TTL)
+create_flight = SingleFlight()
+outcomes = {"created": 0, "replayed": 0, "rejected": 0}
+
+
+def remember(row: Row) -> None:
+    payouts_by_key.set(row.idempotency_key, row)
+
+
+def stats() -> dict:
+    return {**payouts_by_key.stats(), "shared_inserts": create_flight.shared, **outcomes}
+
+
+async def create_payout(db: database.DbSession, payout: schemas.PayoutCreate, user_id: int) -> Tuple[Row, bool]:
+    """The payout for payout.idempotency_key and whether this call created it.
+
+    Raises 400 if the key belongs to another user's payout and 422 if the same user already
+    used it for a different amount or currency.
+    """
+    key = payout.idempotency_key
+    row = payouts_by_key.get(key)
+    created = False
+    if row is None:
+        inserted_here = False
+
+        async def insert():
+            nonlocal inserted_here
+            inserted_here = True
+            return await database.run_db(db, crud.create_payout_for_user, payout=payout, user_id=user_id)
+
+        row, inserted = await create_flight.do(key, insert)
+        created = inserted and inserted_here
+        remember(row)
+
+    if created:
+        outcomes["created"] += 1
+        return row, True
+    if row.user_id != user_id:
+        outcomes["rejected"] += 1
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Payout already exists")
+    if not crud.payout_matches(row, payout, user_id):
+        outcomes["rejected"] += 1
+        logger.warning("Idempotency key %s reused for a different payout (existing payout %d)", key, row.id)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=crud.IDEMPOTENCY_KEY_REUSED)
+    outcomes["replayed"] += 1
+    logger.info("Replaying payout %d for idempotency key %s", row.id, key)
+    return row, False
@@ -0,0 +1,157 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from shared.metrics import Counter, Gauge, Histogram, MetricsMiddleware
+
+from app.db import database
+from app.services import crud
+
+logger = logging.getLogger(__name__)
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "LOCK"}
+
+http_requests = Counter("http_requests", "HTTP requests by route and status.", ["method", "route", "status"])
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route"]
+)
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds", "Database statement latency by operation.", ["operation"], buckets=DB_BUCKETS
+)
+db_statements_per_request = Histogram(
+    "db_statements_per_request", "Database statements executed per HTTP request.", ["route"],
+    buckets=STATEMENT_COUNT_BUCKETS,
+)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds", "Outbound HTTP latency by upstream and path.", ["upstream", "path", "status"]
+)
+webhook_verify_duration = Histogram(
+    "webhook_verify_duration_seconds", "Webhook signature verification time.", ["mode"], buckets=DB_BUCKETS
+)
+webhook_apply_duration = Histogram("webhook_apply_duration_seconds", "Webhook status write time.", ["mode"])
+webhook_events = Counter(
+    "webhook_events", "Webhook events by outcome (updated, unchanged, stale, duplicate, ...).", ["mode", "outcome"]
+)
+
+_outbox_pending: Optional[int] = None
+_request_statements: ContextVar[Optional[list]] = ContextVar("request_statements", default=None)
+
+async def refresh_outbox_pending() -> None:
+    global _outbox_pending
+    try:
+        _outbox_pending = await database.run_in_session(crud.count_pending_outbox)
+    except Exception as e:
+        logger.warning("Could not count pending outbox rows: %s", e)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    operation = statement.lstrip()[:6].upper()
+    db_statement_duration.observe(time.perf_counter() - started, operation if operation in OPERATIONS else "OTHER")
+    statements = _request_statements.get()
+    if statements is not None:
+        statements[0] += 1
+
+
+def instrument_engine(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class DbStatementsMiddleware:
+    """Counts the statements each request runs; the count list is shared with threadpool copies of the context."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        statements = [0]
+        token = _request_statements.set(statements)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            db_statements_per_request.observe(statements[0], route)
+
+
+def _stat(stats: dict, name: str) -> float:
+    value = stats.get(name)
+    return float("nan") if value is None else value
+
+
+def _register_gauges() -> None:
+    from app.services import http_client, idempotency, payment_service, rate_limit, retry_store, user_service
+    from app.services.outbox_dispatcher import dispatcher
+    from app.services.payout_events import hub
+    from app.services.provider_client import STATES, provider
+    from app.services.resend_queue import resend_queue
+
+    Gauge("outbox_pending", "Payout outbox rows waiting to be sent, as of the last scrape.",
+          lambda: _outbox_pending if _outbox_pending is not None else float("nan"))
+    Gauge("outbox_in_flight", "Payouts being sent to the provider right now.", lambda: dispatcher.in_flight)
+    Gauge("outbox_sent_total", "Payouts accepted by the provider.", lambda: dispatcher.sent, kind="counter")
+    Gauge("outbox_retried_total", "Outbox deliveries rescheduled after a failure.", lambda: dispatcher.retried,
+          kind="counter")
+    Gauge("outbox_failed_total", "Outbox entries given up on.", lambda: dispatcher.failed, kind="counter")
+    Gauge("outbox_deferred_total", "Claimed outbox entries put back unsent because the provider's circuit was open.",
+          lambda: dispatcher.deferred, kind="counter")
+    Gauge("provider_circuit_state", "1 for the payments provider circuit's current state (closed, half_open, open).",
+          lambda: {state: int(provider.breaker.state == state) for state in STATES}, ["state"])
+    Gauge("provider_circuit_transitions_total", "Payments provider circuit state changes, by the state entered.",
+          lambda: dict(provider.breaker.transitions), ["state"], kind="counter")
+    Gauge("provider_concurrency_limit", "Adaptive limit on concurrent payments provider requests.",
+          lambda: provider.limit.current)
+    Gauge("provider_in_flight", "Payments provider requests in flight under the limit.", lambda: provider.limit.in_flight)
+    Gauge("provider_limit_changes_total", "Adjustments of the provider concurrency limit (increase, decrease).",
+          lambda: {"increase": provider.limit.increases, "decrease": provider.limit.decreases}, ["direction"],
+          kind="counter")
+    Gauge("provider_latency_baseline_seconds", "Usual payments provider latency the limit compares against, by endpoint and batch size.",
+          lambda: dict(provider.limit.baselines), ["endpoint"])
+    Gauge("provider_calls_total", "Payments provider calls by outcome (succeeded, failed, retried, rejected).",
+          lambda: dict(provider.calls), ["outcome"], kind="counter")
+    Gauge("idempotency_cache_size", "Payout idempotency keys cached in memory.", lambda: len(idempotency.payouts_by_key))
+    Gauge("payout_creates_total", "POST /api/payouts outcomes (created, replayed, rejected).",
+          lambda: dict(idempotency.outcomes), ["outcome"], kind="counter")
+    Gauge("rate_limit_in_flight", "Admitted requests in flight by route class.",
+          lambda: dict(rate_limit.rate_limiter.in_flight), ["route_class"])
+    Gauge("rate_limit_rejected_total", "Requests shed by route class and reason (user, ip, concurrency).",
+          lambda: dict(rate_limit.rate_limiter.rejected), ["route_class", "reason"], kind="counter")
+    Gauge("payout_event_subscribers", "Open payout status streams.", hub.subscriber_count)
+    Gauge("token_cache_size", "Cached access tokens.", lambda: len(user_service.token_cache))
+    Gauge("user_cache_size", "Cached users for session tokens.", lambda: len(user_service.user_cache))
+    Gauge("webhook_resend_store_size", "Tracked webhook resend counters, as of the last scrape.",
+          lambda: _stat(retry_store.last_stats(), "size"))
+    Gauge("webhook_resend_store_memory_bytes", "Memory used by the resend counter store, as of the last scrape.",
+          lambda: _stat(retry_store.last_stats(), "memory_bytes"))
+    Gauge("webhook_resend_store_evictions_total", "Resend counters evicted to stay within bounds.",
+          lambda: _stat(retry_store.last_stats(), "evictions"), kind="counter")
+    Gauge("webhook_resend_queue_depth", "Payouts waiting for a webhook resend request, including retries.",
+          lambda: resend_queue.depth)
+    Gauge("webhook_resend_in_flight", "Webhook resend requests being made right now.", lambda: resend_queue.in_flight)
+    Gauge("webhook_resend_requests_total", "Webhook resend requests by outcome (queued, coalesced, sent, ...).",
+          lambda: {outcome: count for outcome, count in resend_queue.stats().items()
+                   if outcome not in ("depth", "in_flight")}, ["outcome"], kind="counter")
+    Gauge("webhook_dedup_cache_size", "Remembered webhook request ids.", lambda: len(payment_service.processed_webhooks))
+    Gauge("upstream_in_flight", "Outbound requests in flight by upstream.",
+          lambda: {upstream: stats["in_flight"] for upstream, stats in http_client.pool_stats().items()}, ["upstream"])
+
+
+def install(app) -> None:
+    _register_gauges()
+    app.add_middleware(DbStatementsMiddleware)
+    app.add_middleware(MetricsMiddleware, requests=http_requests, duration=http_request_duration)
+    database.on_engine_created(instrument_engine)
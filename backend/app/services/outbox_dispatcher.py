@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import random
+from decimal import Decimal
+from typing import Optional
+
+from shared import logs
+
+from app.config.config import config
+from app.db import database
+from app.services import crud, payment_service
+from app.services.provider_client import ProviderUnavailable, provider
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Drains payout_outbox and submits payouts to the payments provider.
+
+    Each loop claims a batch of due rows, sends them to the provider's batch endpoint in
+    chunks of OUTBOX_PROVIDER_BATCH_SIZE, as many at once as provider_client's concurrency
+    limit allows, and then deletes the delivered rows in one statement. Failed sends are
+    rescheduled with jittered exponential backoff until OUTBOX_MAX_ATTEMPTS, after which the
+    row is marked FAILED. While the provider's circuit is open nothing is claimed, and chunks
+    refused by the breaker go back as due without using up an attempt.
+    """
+
+    # What _deliver returns for a chunk the breaker refused.
+    DEFERRED = object()
+
+    def __init__(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.deferred = 0
+        self.in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="payout-outbox-dispatcher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the dispatcher now instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed, "deferred": self.deferred,
+                "in_flight": self.in_flight}
+
+    async def _run(self) -> None:
+        while True:
+            retry_in = provider.retry_in()
+            if retry_in > 0:
+                # New payouts stay in the outbox until the provider is tried again.
+                await asyncio.sleep(min(retry_in, config.OUTBOX_POLL_INTERVAL))
+                continue
+            try:
+                claimed = await database.run_in_session(
+                    crud.claim_outbox_batch, config.OUTBOX_BATCH_SIZE, config.OUTBOX_LEASE_SECONDS
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Failed to claim payout outbox batch: %s", e)
+                claimed = []
+
+            if claimed:
+                await self._dispatch(claimed)
+                if len(claimed) == config.OUTBOX_BATCH_SIZE:
+                    continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, claimed) -> None:
+        size = max(config.OUTBOX_PROVIDER_BATCH_SIZE, 1)
+        chunks = [claimed[i:i + size] for i in range(0, len(claimed), size)]
+        outcomes = await asyncio.gather(*(self._deliver(chunk) for chunk in chunks))
+
+        delivered, retries, deferred = [], [], []
+        for chunk, results in zip(chunks, outcomes):
+            if results is self.DEFERRED:
+                deferred.extend(entry["id"] for entry in chunk)
+                continue
+            for entry, result in zip(chunk, results):
+                if result is not None:
+                    delivered.append(entry["id"])
+                else:
+                    retries.append(self._retry_for(entry))
+
+        self.sent += len(delivered)
+        if delivered:
+            try:
+                await database.run_in_session(crud.complete_outbox_entries, delivered)
+            except Exception as e:
+                # The provider dedupes on idempotency_key, so a re-send after the lease is harmless.
+                logger.exception("Failed to mark %d outbox entries as sent: %s", len(delivered), e)
+        if retries:
+            try:
+                await database.run_in_session(crud.reschedule_outbox_entries, retries, "Payment provider request failed")
+            except Exception as e:
+                logger.exception("Failed to reschedule %d outbox entries: %s", len(retries), e)
+        if deferred:
+            self.deferred += len(deferred)
+            try:
+                await database.run_in_session(crud.defer_outbox_entries, deferred)
+            except Exception as e:
+                # The lease runs out and they are claimed again, at the cost of one attempt.
+                logger.exception("Failed to defer %d outbox entries: %s", len(deferred), e)
+
+    async def _deliver(self, chunk):
+        """The provider's result for each entry (None if it failed), or DEFERRED."""
+        payloads = [{**entry["payload"], "amount": Decimal(entry["payload"]["amount"])} for entry in chunk]
+        # gather() runs each chunk in its own task, so this id covers just this provider call; it is
+        # passed on to the mock service, so both sides' lines can be joined.
+        logs.set_correlation_id(logs.new_correlation_id())
+        self.in_flight += len(chunk)
+        try:
+            if len(payloads) == 1:
+                results = [await payment_service.send_payout_to_mock_service(payloads[0])]
+            else:
+                results = await payment_service.send_payout_batch_to_mock_service(payloads)
+        except ProviderUnavailable as e:
+            logger.info("Deferring %d payouts: %s", len(chunk), e)
+            return self.DEFERRED
+        except Exception as e:
+            logger.exception("Unexpected error sending %d payouts: %s", len(chunk), e)
+            results = None
+        finally:
+            self.in_flight -= len(chunk)
+        return results if results is not None else [None] * len(chunk)
+
+    def _retry_for(self, entry: dict) -> dict:
+        give_up = entry["attempts"] >= config.OUTBOX_MAX_ATTEMPTS
+        delay = min(config.OUTBOX_RETRY_BASE_DELAY * 2 ** (entry["attempts"] - 1), config.OUTBOX_RETRY_MAX_DELAY)
+        if give_up:
+            self.failed += 1
+        else:
+            self.retried += 1
+        return {"id": entry["id"], "delay_seconds": delay * random.uniform(0.5, 1.0), "give_up": give_up}
+
+dispatcher = OutboxDispatcher()
@@ -1,116 +1,84 @@
-import time
-import hmac
-import hashlib
-import json
 import logging
 import httpx
 
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from decimal import Decimal
 
+from shared.signing import WebhookSigner, is_fresh
+
 from app.config.config import config
 from app.services import crud
+from app.services.cache import TTLCache
+from app.services.provider_client import provider
+
+
+logger = logging.getLogger(__name__)
 
+# Outcomes of webhooks already applied, keyed by (request_id, payout_id, new_status), so provider
+# retries are acknowledged without another database round trip.
+processed_webhooks = TTLCache(max_size=config.WEBHOOK_DEDUP_CACHE_SIZE, default_ttl=config.WEBHOOK_DEDUP_TTL)
 
-logger = logging.getLogger("payment_service")
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] [%(message)s]')
 
-timestamp_retry_store: Dict[str, int] = {}
+def webhook_dedup_key(payload) -> Tuple[str, int, str]:
+    return payload.request_id, payload.payout_id, payload.new_status
 
 
-def send_payout_to_mock_service(payout_data: Dict) -> Optional[Dict]:
+async def send_payout_to_mock_service(payout_data: Dict) -> Optional[Dict]:
+    """The provider's record of the payout, or None if it failed; raises ProviderUnavailable while its circuit is open."""
     try:
         json_payload = {
             k: float(v) if isinstance(v, Decimal) else v
             for k, v in payout_data.items()
         }
 
-        response = httpx.post(
-            f"{config.MOCK_PAYMENTS_URL}/mock/payouts",
-            json=json_payload,
-            timeout=5
-        )
+        response = await provider.post("/mock/payouts", json=json_payload)
         response.raise_for_status()
-        logger.info(
-            f"Payout sent to mock service: {response.json()}",
-            extra={"correlation_id": payout_data.get("idempotency_key")}
-        )
-        return response.json()
+        result = response.json()
+        logger.info("Payout %s sent to mock service as %s", payout_data.get("idempotency_key"), result.get("payout_id"))
+        return result
     except httpx.RequestError as e:
-        logger.error(f"[MockService] Request failed: {e}")
+        logger.error("[MockService] Request failed: %s", e)
         return None
     except httpx.HTTPStatusError as e:
-        logger.error(f"[MockService] HTTP error: {e}")
+        logger.error("[MockService] HTTP error: %s", e)
         return None
 
 
+async def send_payout_batch_to_mock_service(payouts: List[Dict]) -> Optional[List[Optional[Dict]]]:
+    try:
+        json_payload = {
+            "payouts": [
+                {k: float(v) if isinstance(v, Decimal) else v for k, v in payout.items()}
+                for payout in payouts
+            ]
+        }
 
-def verify_webhook(payload: dict, signature: str) -> bool:
-    timestamp = payload.get("timestamp")
-    if not timestamp or abs(int(time.time()) - timestamp) > config.MAX_WEBHOOK_AGE:
-        logger.warning(f"Webhook timestamp invalid or too old: {timestamp}")
-        return False
-
-    payload_bytes = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
-    expected_sig = hmac.new(config.MOCK_PAYMENTS_CALLBACK_SECRET.encode(), payload_bytes, hashlib.sha256).hexdigest()
-    valid = hmac.compare_digest(signature, expected_sig)
-    if not valid:
-        logger.warning("Webhook signature invalid")
-    return valid
-
-def verify_webhook_extended(payload: Dict[str, any], signature: str) -> Tuple[bool, bool]:
-    timestamp = payload.get("timestamp")
-    is_timestamp_old = False
-
-    if not timestamp:
-        is_timestamp_old = True
-    elif abs(int(time.time()) - int(timestamp)) > config.MAX_WEBHOOK_AGE:
-        is_timestamp_old = True
-
-    payload_bytes = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
-    expected_sig = hmac.new(config.MOCK_PAYMENTS_CALLBACK_SECRET.encode(), payload_bytes, hashlib.sha256).hexdigest()
-    is_signature_valid = hmac.compare_digest(signature, expected_sig)
-
-    return is_signature_valid, is_timestamp_old
-
-
-def request_webhook_resend(payout_id: int, correlation_id: str) -> bool:
-    key = f"{correlation_id}:{payout_id}"
-    retries = timestamp_retry_store.get(key, 0)
+        response = await provider.post("/mock/payouts/batch", json=json_payload, size=len(payouts))
+        response.raise_for_status()
+        results = response.json()["results"]
+        logger.info("Payout batch of %d sent to mock service", len(payouts))
+        return [result.get("payout") for result in results]
+    except httpx.RequestError as e:
+        logger.error("[MockService] Batch request failed: %s", e)
+        return None
+    except httpx.HTTPStatusError as e:
+        logger.error("[MockService] Batch HTTP error: %s", e)
+        return None
 
-    if retries >= config.MAX_TIMESTAMP_RETRIES:
-        logger.warning(
-            f"Max retries reached for payout {payout_id} with correlation {correlation_id}. Not requesting again.",
-            extra={"correlation_id": correlation_id}
-        )
-        return False
 
-    timestamp_retry_store[key] = retries + 1
+webhook_signer = WebhookSigner(config.MOCK_PAYMENTS_CALLBACK_SECRETS)
 
-    try:
-        response = httpx.post(
-            f"{config.MOCK_PAYMENTS_URL}/mock/resend",
-            json={"payout_id": payout_id, "request_id": correlation_id},
-            timeout=5
-        )
-        response.raise_for_status()
-        logger.info(
-            f"Requested resend for payout {payout_id} (attempt {retries + 1})",
-            extra={"correlation_id": correlation_id}
-        )
-        return True
 
-    except httpx.RequestError as e:
-        logger.error(
-            f"Request failed while attempting webhook resend for payout {payout_id}: {e}",
-            extra={"correlation_id": correlation_id}
-        )
-    except httpx.HTTPStatusError as e:
-        logger.error(
-            f"HTTP error when requesting webhook resend for payout {payout_id}: {e}",
-            extra={"correlation_id": correlation_id}
-        )
+def verify_webhook(body: bytes, signature: Optional[str], timestamp) -> Tuple[bool, bool]:
+    """Check a callback's signature over its raw body bytes; returns (signature valid, timestamp too old)."""
+    return webhook_signer.verify(body, signature), not is_fresh(timestamp, config.MAX_WEBHOOK_AGE)
 
-    return False
 
+async def request_webhook_resend(payout_id: int, request_id: str) -> None:
+    """Ask the provider to send payout_id's current status again.
 
+    Raises httpx.HTTPError on failure and ProviderUnavailable while its circuit is open. Callers
+    go through resend_queue, which coalesces duplicates and retries.
+    """
+    response = await provider.post("/mock/resend", json={"payout_id": payout_id, "request_id": request_id})
+    response.raise_for_status()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from typing import Dict, Optional, Set
+
+from sqlalchemy import text
+
+from app.config.config import config
+from app.db import database
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "payout_events"
+HEARTBEAT = {"type": "heartbeat"}
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    __slots__ = ("user_id", "queue", "lagged")
+
+    def __init__(self, user_id: int, max_queued: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.lagged = False
+
+    def offer(self, event: dict) -> None:
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what it has not read and tell it to refetch instead of buffering without bound.
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def next_event(self) -> dict:
+        event = await self.queue.get()
+        if event is RESYNC:
+            self.lagged = False
+        return event
+
+
+class PayoutEventHub:
+    """In-process fan-out of payout status changes to the current user's open streams.
+
+    With PAYOUT_EVENTS_BACKEND=postgres, events are published with NOTIFY and every replica
+    LISTENs, so a webhook handled on one replica reaches streams held by the others.
+    One ticker task feeds heartbeats to all subscribers, so idle streams need no timers of their own.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.published = 0
+        self.delivered = 0
+        self.lagged = 0
+
+    @property
+    def uses_postgres(self) -> bool:
+        return config.PAYOUT_EVENTS_BACKEND == "postgres"
+
+    def start(self) -> None:
+        if self._heartbeat_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="payout-events-heartbeat")
+        if self.uses_postgres:
+            self._listener = threading.Thread(target=self._listen, name="payout-events-listener", daemon=True)
+            self._listener.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._listener is not None:
+            await asyncio.to_thread(self._listener.join, config.PAYOUT_EVENTS_HEARTBEAT_SECONDS)
+            self._listener = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, config.PAYOUT_EVENTS_MAX_QUEUED)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stats(self) -> dict:
+        return {
+            "backend": config.PAYOUT_EVENTS_BACKEND,
+            "subscribers": self.subscriber_count(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "lagged": self.lagged,
+        }
+
+    async def publish(self, event: dict) -> None:
+        self.published += 1
+        if self.uses_postgres:
+            try:
+                await database.run_in_session(_notify, json.dumps(event, default=str))
+                return
+            except Exception as e:
+                logger.exception("Failed to NOTIFY payout event, delivering locally only: %s", e)
+        self._fanout(event)
+
+    def _fanout(self, event: dict) -> None:
+        for subscription in self._subscribers.get(event.get("user_id"), ()):
+            was_lagged = subscription.lagged
+            subscription.offer(event)
+            if subscription.lagged and not was_lagged:
+                self.lagged += 1
+            elif not subscription.lagged:
+                self.delivered += 1
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(config.PAYOUT_EVENTS_HEARTBEAT_SECONDS)
+            for subscribers in list(self._subscribers.values()):
+                for subscription in list(subscribers):
+                    if not subscription.queue.full():
+                        subscription.queue.put_nowait(HEARTBEAT)
+
+    def _listen(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._listen_once()
+            except Exception as e:
+                logger.exception("Payout event listener failed, reconnecting: %s", e)
+                self._stopping.wait(1)
+
+    def _listen_once(self) -> None:
+        raw = database.get_engine().raw_connection()
+        # Keep this LISTEN connection out of the pool; it lives as long as the listener.
+        raw.detach()
+        try:
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while not self._stopping.is_set():
+                if select.select([connection], [], [], config.PAYOUT_EVENTS_HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self._loop.call_soon_threadsafe(self._fanout, json.loads(notify.payload))
+        finally:
+            raw.close()
+
+
+def _notify(db, payload: str) -> None:
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+    db.commit()
+
+
+hub = PayoutEventHub()
@@ -0,0 +1,312 @@
+"""Calls to the payments provider, guarded by a circuit breaker and an adaptive concurrency limit.
+
+Every request to the provider (payout submissions and webhook resends) goes through
+provider.post(), which
+
+- refuses at once with ProviderUnavailable while the circuit is open. The breaker opens after
+  PROVIDER_BREAKER_FAILURES consecutive failed requests. After PROVIDER_BREAKER_OPEN_SECONDS it
+  lets one probe through (half-open): success closes it, failure reopens it for twice as long,
+  up to PROVIDER_BREAKER_MAX_OPEN_SECONDS. Callers keep their work for later: the outbox
+  dispatcher stops claiming rows, the resend queue requeues.
+- waits for a slot under an AIMD concurrency limit, until PROVIDER_CALL_DEADLINE at most. A call
+  that gets no slot in time is refused with ProviderUnavailable as well; it is not a failure. The
+  limit grows by one per round of requests that come back on time and shrinks by
+  PROVIDER_LIMIT_BACKOFF on a failure, or when a request takes PROVIDER_LATENCY_TOLERANCE times
+  longer than usual for its endpoint and batch size.
+- gives each attempt its own deadline (PROVIDER_ATTEMPT_TIMEOUT) within PROVIDER_CALL_DEADLINE,
+  retrying failed attempts while time and PROVIDER_MAX_ATTEMPTS allow. Both provider endpoints
+  are safe to repeat: payouts are deduplicated on idempotency_key, resends are idempotent.
+
+Failures are transport errors, timeouts, 5xx and 429; other responses are returned for the
+caller to handle. State is per worker.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import httpx
+
+from app.config.config import config
+from app.services import http_client
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+# Latency under this never counts as congestion; at a few ms, jitter alone would shrink the limit.
+MIN_SLOW_SECONDS = 0.05
+# Weight of each response in the usual (moving average) latency, so it follows lasting changes only.
+BASELINE_WEIGHT = 0.05
+# Longest pause between attempts of one call.
+RETRY_JITTER_SECONDS = 0.1
+# How soon callers refused while the half-open probe is in flight should check back.
+PROBE_WAIT_SECONDS = 0.5
+# How soon callers that got no concurrency slot before their deadline should check back.
+SLOT_WAIT_SECONDS = 0.5
+
+
+class ProviderUnavailable(Exception):
+    """The request was not sent (circuit open, or no slot free in time); try again in retry_in seconds."""
+
+    def __init__(self, retry_in: float, reason: str = "circuit open"):
+        super().__init__(f"Payment provider {reason}, retrying in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+def is_failure(response: Optional[httpx.Response]) -> bool:
+    """A response that says the provider is struggling; None stands for no response at all."""
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, open_seconds: float, max_open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.transitions = {state: 0 for state in STATES}
+        self._open_for = open_seconds
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until a request may be let through; 0 if one would be now."""
+        if self.state == OPEN:
+            return max(0.0, self._opened_at + self._open_for - time.monotonic())
+        if self.state == HALF_OPEN and self._probing:
+            return PROBE_WAIT_SECONDS
+        return 0.0
+
+    def allow(self) -> Optional[bool]:
+        """None to refuse the request, True if it is the half-open probe, False otherwise."""
+        if self.state == OPEN:
+            if self.retry_in() > 0:
+                return None
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return None
+            self._probing = True
+            return True
+        return False
+
+    def record(self, probe: bool, failed: Optional[bool]) -> None:
+        """Count a request's outcome; failed is None if it ended without one (cancelled)."""
+        if probe:
+            self._probing = False
+            if failed is None:
+                return
+            if failed:
+                self._open_for = min(self._open_for * 2, self.max_open_seconds)
+                self._open()
+            else:
+                self._open_for = self.open_seconds
+                self.consecutive_failures = 0
+                self._transition(CLOSED)
+            return
+        if self.state != CLOSED or failed is None:
+            # Sent before the circuit opened; the probe decides what happens next.
+            return
+        if not failed:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state and state != OPEN:
+            return
+        previous, self.state = self.state, state
+        self.transitions[state] += 1
+        if state == OPEN:
+            reason = "probe failed" if previous == HALF_OPEN else f"{self.consecutive_failures} failures in a row"
+            logger.warning("Payment provider circuit open (%s), retrying in %.1fs", reason, self._open_for)
+        elif state == HALF_OPEN:
+            logger.info("Payment provider circuit half-open, sending a probe")
+        else:
+            logger.warning("Payment provider circuit closed, provider is answering again")
+
+
+class AdaptiveLimit:
+    """Concurrency limit that grows additively while latency holds and shrinks multiplicatively when it does not."""
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, tolerance: float, backoff: float):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        # Usual latency per endpoint and batch size.
+        self.baselines: Dict[str, float] = {}
+        self._decreased_at = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the time it was granted, for release()."""
+        while self.in_flight >= self.current:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+        self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, endpoint: str, started: float, latency: float, failed: Optional[bool]) -> None:
+        """Free a slot; failed is None if the request ended without an outcome, which leaves the limit alone."""
+        saturated = self.in_flight >= self.current
+        self.in_flight -= 1
+        if failed is not None:
+            self._update(endpoint, started, latency, failed, saturated)
+        # Everyone waiting checks again; the limit may have moved by more than one.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _update(self, endpoint: str, started: float, latency: float, failed: bool, saturated: bool) -> None:
+        baseline = self.baselines.get(endpoint)
+        slow = baseline is not None and latency > max(baseline * self.tolerance, MIN_SLOW_SECONDS)
+        if not failed:
+            self.baselines[endpoint] = latency if baseline is None else baseline + (latency - baseline) * BASELINE_WEIGHT
+        if failed or slow:
+            # Requests already in flight when the limit was cut report the same congestion; cut once per round.
+            if started >= self._decreased_at:
+                previous = self.current
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased_at = time.monotonic()
+                self.decreases += 1
+                if self.current != previous:
+                    logger.info("Payment provider concurrency limit %d -> %d (%s)", previous, self.current,
+                                "failure" if failed else f"{latency * 1000:.0f} ms on {endpoint}")
+        elif saturated and self.limit < self.max_limit:
+            # Only while the limit is what holds requests back; otherwise it would grow unchecked.
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+
+
+class ProviderClient:
+    def __init__(self, breaker: CircuitBreaker, limit: AdaptiveLimit, attempt_timeout: float,
+                 call_deadline: float, max_attempts: int):
+        self.breaker = breaker
+        self.limit = limit
+        self.attempt_timeout = attempt_timeout
+        self.call_deadline = call_deadline
+        self.max_attempts = max_attempts
+        self.calls = {"succeeded": 0, "failed": 0, "retried": 0, "rejected": 0}
+
+    def retry_in(self) -> float:
+        return self.breaker.retry_in()
+
+    async def post(self, path: str, json, size: int = 1) -> httpx.Response:
+        """POST json, carrying size payouts, to the provider's path.
+
+        Raises ProviderUnavailable while the circuit is open or if no slot came free before the
+        deadline, and the last attempt's
+        httpx.RequestError if no attempt got a response. A 5xx or 429 left after the last
+        attempt is returned, like any other response.
+        """
+        deadline = time.monotonic() + self.call_deadline
+        # Bigger batches take longer; compare each with batches of about its size.
+        endpoint = f"{path} x{2 ** (max(size, 1).bit_length() - 1)}"
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._attempt(path, endpoint, json, deadline)
+                error = None
+            except httpx.RequestError as e:
+                response, error = None, e
+            except ProviderUnavailable:
+                self.calls["rejected"] += 1
+                raise
+
+            if not is_failure(response):
+                self.calls["succeeded"] += 1
+                return response
+            pause = random.uniform(0, RETRY_JITTER_SECONDS)
+            if attempt >= self.max_attempts or deadline - time.monotonic() - pause <= 0 or self.breaker.retry_in():
+                self.calls["failed"] += 1
+                if error is not None:
+                    raise error
+                return response
+            self.calls["retried"] += 1
+            logger.warning("Payment provider %s attempt %d failed, retrying: %s", path, attempt,
+                           error or f"HTTP {response.status_code}")
+            await asyncio.sleep(pause)
+
+    async def _attempt(self, path: str, endpoint: str, json, deadline: float) -> httpx.Response:
+        if self.breaker.retry_in():
+            raise ProviderUnavailable(self.breaker.retry_in())
+        try:
+            started = await asyncio.wait_for(self.limit.acquire(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise ProviderUnavailable(SLOT_WAIT_SECONDS, "busy, no slot free before the deadline") from None
+        # Asked only now, so a half-open probe is not held while its request waits for a slot.
+        probe = self.breaker.allow()
+        if probe is None:
+            self.limit.release(endpoint, started, 0.0, None)
+            raise ProviderUnavailable(self.breaker.retry_in())
+        timeout = min(self.attempt_timeout, deadline - time.monotonic())
+        failed = None
+        try:
+            client = http_client.get_client(http_client.MOCK_PAYMENTS)
+            try:
+                response = await asyncio.wait_for(client.post(f"{config.MOCK_PAYMENTS_URL}{path}", json=json), timeout)
+            except asyncio.TimeoutError:
+                failed = True
+                raise httpx.TimeoutException(f"No response from payment provider within {timeout:.2f}s") from None
+            except httpx.RequestError:
+                failed = True
+                raise
+            failed = is_failure(response)
+            return response
+        finally:
+            self.limit.release(endpoint, started, time.monotonic() - started, failed)
+            self.breaker.record(probe, failed)
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "retry_in": round(self.breaker.retry_in(), 3),
+            "transitions": dict(self.breaker.transitions),
+            "concurrency_limit": self.limit.current,
+            "in_flight": self.limit.in_flight,
+            "limit_increases": self.limit.increases,
+            "limit_decreases": self.limit.decreases,
+            "latency_baselines": {endpoint: round(value, 4) for endpoint, value in self.limit.baselines.items()},
+            **self.calls,
+        }
+
+
+provider = ProviderClient(
+    CircuitBreaker(config.PROVIDER_BREAKER_FAILURES, config.PROVIDER_BREAKER_OPEN_SECONDS,
+                   config.PROVIDER_BREAKER_MAX_OPEN_SECONDS),
+    AdaptiveLimit(config.PROVIDER_CONCURRENCY_INITIAL, config.PROVIDER_CONCURRENCY_MIN,
+                  config.PROVIDER_CONCURRENCY_MAX, config.PROVIDER_LATENCY_TOLERANCE, config.PROVIDER_LIMIT_BACKOFF),
+    attempt_timeout=config.PROVIDER_ATTEMPT_TIMEOUT,
+    call_deadline=config.PROVIDER_CALL_DEADLINE,
+    max_attempts=config.PROVIDER_MAX_ATTEMPTS,
+)
@@ -0,0 +1,309 @@
+"""Admission control: sheds excess load with 429 or 503 before any auth or database work.
+
+Requests are sorted into route classes by path (reads, payout_writes, webhooks, auth). Per class:
+
+- a token bucket per user (the session token's subject) and one per client address, refilled
+  at a steady rate up to a burst. An empty bucket answers 429 with Retry-After set to when the
+  next token arrives. Buckets live in this worker (RATE_LIMIT_BACKEND=memory) or in Redis,
+  shared by every worker and replica (redis); if Redis is unreachable, requests are let through.
+- a cap on requests in flight in this worker. Beyond it the request gets 503 straight away
+  instead of queueing for a threadpool thread or database connection it would not get in time.
+
+The client address is scope["client"]: behind the frontend's nginx, run uvicorn with
+FORWARDED_ALLOW_IPS set to the proxy's address so that is the caller, not the proxy.
+"""
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import jwt
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+
+from app.config.config import config
+from app.services.cache import TTLCache
+from app.services.session_tokens import COOKIE_NAME, session_tokens
+
+logger = logging.getLogger(__name__)
+
+READS = "reads"
+PAYOUT_WRITES = "payout_writes"
+WEBHOOKS = "webhooks"
+AUTH = "auth"
+ROUTE_CLASSES = (READS, PAYOUT_WRITES, WEBHOOKS, AUTH)
+# Open for as long as the client stays connected, so they do not hold a concurrency slot.
+LONG_LIVED_PATHS = {"/api/payouts/stream"}
+# How long to stay quiet after warning that the shared backend is unreachable.
+WARN_INTERVAL_SECONDS = 60
+
+# (bucket key, tokens per second, burst)
+Check = Tuple[str, float, float]
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """The class a request is limited as, or None for paths outside /api (health, /metrics, docs)."""
+    if not path.startswith("/api/"):
+        return None
+    if path.startswith("/api/webhooks/"):
+        return WEBHOOKS
+    if path.startswith("/api/auth/"):
+        return AUTH
+    if method == "POST" and path.startswith("/api/payouts"):
+        return PAYOUT_WRITES
+    return READS
+
+
+def parse_rates(spec: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """"reads=20:60,payout_writes=5:20" -> {"reads": (20.0, 60.0), "payout_writes": (5.0, 20.0)}."""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, limit = part.strip().partition("=")
+        if name:
+            rate, _, burst = limit.partition(":")
+            rates[name] = (float(rate), float(burst or rate))
+    return rates
+
+
+def parse_concurrency(spec: Optional[str]) -> Dict[str, int]:
+    """"reads=64,webhooks=32" -> {"reads": 64, "webhooks": 32}."""
+    limits = {}
+    for part in (spec or "").split(","):
+        name, _, limit = part.strip().partition("=")
+        if name:
+            limits[name] = int(limit)
+    return limits
+
+
+class MemoryBuckets:
+    """Token buckets in a bounded LRU. Each uvicorn worker limits on its own.
+
+    A bucket is dropped once it would have refilled completely, since a missing bucket is a full one.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_size: int, max_refill_seconds: float):
+        self._buckets = TTLCache(max_size=max_size, default_ttl=max(1.0, max_refill_seconds))
+
+    async def take(self, checks: List[Check]) -> Tuple[float, int]:
+        """Take a token from every bucket, or from none.
+
+        Returns (0, -1) if taken, else the seconds until every bucket has a token and the index
+        of the check that waits longest.
+        """
+        now = time.monotonic()
+        wait, blocked = 0.0, -1
+        refilled = []
+        for i, (key, rate, burst) in enumerate(checks):
+            tokens, updated = self._buckets.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1 and (1 - tokens) / rate > wait:
+                wait, blocked = (1 - tokens) / rate, i
+            refilled.append((key, tokens, burst / rate))
+        if blocked < 0:
+            for key, tokens, refill_seconds in refilled:
+                self._buckets.set(key, (tokens - 1, now), ttl=refill_seconds)
+        return wait, blocked
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, **self._buckets.stats()}
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+class RedisBuckets:
+    """Token buckets in Redis (or Valkey, KeyDB, Dragonfly), shared by every worker and replica.
+
+    One script call per request checks all of its buckets atomically, timed by the server's clock.
+    """
+
+    backend = "redis"
+    KEY_PREFIX = "rate-limit:"
+    # KEYS: buckets; ARGV: rate and burst of each. Returns {wait, blocked} like MemoryBuckets.take,
+    # the wait as a string since Redis truncates Lua numbers to integers.
+    TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local wait, blocked = 0, -1
+local tokens = {}
+for i, key in ipairs(KEYS) do
+  local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+  local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+  local available = tonumber(bucket[1]) or burst
+  local updated = tonumber(bucket[2]) or now
+  available = math.min(burst, available + math.max(0, now - updated) * rate)
+  if available < 1 and (1 - available) / rate > wait then
+    wait, blocked = (1 - available) / rate, i - 1
+  end
+  tokens[i] = available
+end
+if blocked < 0 then
+  for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'updated', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+  end
+end
+return {tostring(wait), blocked}
+"""
+
+    def __init__(self, url: str, timeout: float):
+        import redis.asyncio as redis
+
+        # RESP2, which every Redis-compatible server speaks; newer clients default to RESP3.
+        self._client = redis.Redis.from_url(url, protocol=2, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._take = self._client.register_script(self.TAKE_SCRIPT)
+
+    async def take(self, checks: List[Check]) -> Tuple[float, int]:
+        keys = [self.KEY_PREFIX + key for key, _, _ in checks]
+        args = [value for _, rate, burst in checks for value in (rate, burst)]
+        wait, blocked = await self._take(keys=keys, args=args)
+        return float(wait), int(blocked)
+
+    def stats(self) -> dict:
+        return {"backend": self.backend}
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class RateLimiter:
+    def __init__(self, buckets, user_rates: Dict[str, Tuple[float, float]],
+                 ip_rates: Dict[str, Tuple[float, float]], concurrency: Dict[str, int]):
+        self.buckets = buckets
+        self.user_rates = user_rates
+        self.ip_rates = ip_rates
+        self.concurrency = concurrency
+        self.in_flight = {name: 0 for name in ROUTE_CLASSES}
+        self.admitted = {name: 0 for name in ROUTE_CLASSES}
+        # (route class, reason) -> requests shed; reason is "user", "ip" or "concurrency".
+        self.rejected: Dict[Tuple[str, str], int] = {}
+        self.backend_errors = 0
+        self._warned_at = float("-inf")
+
+    def acquire(self, name: str) -> bool:
+        limit = self.concurrency.get(name)
+        if limit is not None and self.in_flight[name] >= limit:
+            return False
+        self.in_flight[name] += 1
+        return True
+
+    def release(self, name: str) -> None:
+        self.in_flight[name] -= 1
+
+    async def wait_seconds(self, name: str, user_id: Optional[int], client_ip: Optional[str]) -> Tuple[float, str]:
+        """Seconds until this caller may send a name request (0 if now) and which bucket is empty."""
+        checks, reasons = [], []
+        if user_id is not None and name in self.user_rates:
+            checks.append((f"user:{name}:{user_id}", *self.user_rates[name]))
+            reasons.append("user")
+        if client_ip is not None and name in self.ip_rates:
+            checks.append((f"ip:{name}:{client_ip}", *self.ip_rates[name]))
+            reasons.append("ip")
+        if not checks:
+            return 0.0, ""
+        try:
+            wait, blocked = await self.buckets.take(checks)
+        except Exception as e:
+            self.backend_errors += 1
+            now = time.monotonic()
+            if now - self._warned_at >= WARN_INTERVAL_SECONDS:
+                self._warned_at = now
+                logger.warning("Rate limit backend %s unavailable, letting requests through: %s",
+                               self.buckets.backend, e)
+            return 0.0, ""
+        return (wait, reasons[blocked]) if blocked >= 0 else (0.0, "")
+
+    def reject(self, name: str, reason: str) -> None:
+        self.rejected[(name, reason)] = self.rejected.get((name, reason), 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            **self.buckets.stats(),
+            "in_flight": dict(self.in_flight),
+            "concurrency_limits": dict(self.concurrency),
+            "admitted": dict(self.admitted),
+            "rejected": {f"{name}:{reason}": count for (name, reason), count in self.rejected.items()},
+            "backend_errors": self.backend_errors,
+        }
+
+    async def close(self) -> None:
+        await self.buckets.close()
+
+
+def _user_id(scope) -> Optional[int]:
+    """The user of a valid session token cookie; anything else is left for get_current_user to reject."""
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            token = cookie_parser(value.decode("latin-1")).get(COOKIE_NAME)
+            if not token:
+                return None
+            try:
+                claims = session_tokens.verify(token)
+            except jwt.InvalidTokenError:
+                return None
+            return claims.user_id if claims is not None else None
+    return None
+
+
+def _client_ip(scope) -> Optional[str]:
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RateLimitMiddleware:
+    """Admits or sheds each /api request before the rest of the stack sees it."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        bounded = scope["path"] not in LONG_LIVED_PATHS
+        if bounded and not limiter.acquire(name):
+            limiter.reject(name, "concurrency")
+            response = JSONResponse({"detail": "Server busy, please retry"}, status_code=503,
+                                    headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        try:
+            wait, reason = await limiter.wait_seconds(name, _user_id(scope), _client_ip(scope))
+            if wait:
+                limiter.reject(name, reason)
+                response = JSONResponse({"detail": "Too many requests"}, status_code=429,
+                                        headers={"Retry-After": str(max(1, math.ceil(wait)))})
+                await response(scope, receive, send)
+                return
+            limiter.admitted[name] += 1
+            await self.app(scope, receive, send)
+        finally:
+            if bounded:
+                limiter.release(name)
+
+
+def create_rate_limiter() -> RateLimiter:
+    user_rates = parse_rates(config.RATE_LIMIT_USER)
+    ip_rates = parse_rates(config.RATE_LIMIT_IP)
+    backend = config.RATE_LIMIT_BACKEND
+    if backend == "memory":
+        refill_seconds = [burst / rate for rate, burst in [*user_rates.values(), *ip_rates.values()]]
+        buckets = MemoryBuckets(config.RATE_LIMIT_MAX_BUCKETS, max(refill_seconds, default=1))
+    elif backend == "redis":
+        buckets = RedisBuckets(config.RATE_LIMIT_REDIS_URL, config.RATE_LIMIT_REDIS_TIMEOUT)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return RateLimiter(buckets, user_rates, ip_rates, parse_concurrency(config.RATE_LIMIT_CONCURRENCY))
+
+
+rate_limiter = create_rate_limiter()
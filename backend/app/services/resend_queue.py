@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from shared import logs
+
+from app.config.config import config
+from app.services import payment_service, retry_store
+from app.services.cache import TTLCache
+from app.services.provider_client import ProviderUnavailable, provider
+
+logger = logging.getLogger(__name__)
+
+
+def _retryable(error: httpx.HTTPError) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.RequestError)
+
+
+class ResendQueue:
+    """Asks the payments provider to resend webhooks, off the request path.
+
+    enqueue() only records the payout and returns; RESEND_CONCURRENCY workers make the
+    requests. The provider resends a payout's current status, so one request covers every
+    stale webhook for it: a payout already waiting, or asked for within RESEND_COALESCE_WINDOW
+    seconds, is not queued again. Failed requests are retried with jittered exponential
+    backoff until RESEND_MAX_ATTEMPTS, and resends per webhook stay capped at
+    MAX_TIMESTAMP_RETRIES by the retry store. While the provider's circuit is open, requests
+    wait for it without using up attempts.
+    """
+
+    def __init__(self):
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.limited = 0
+        self.deferred = 0
+        self.in_flight = 0
+        # payout_id -> request_id of the webhook that asked, while queued or backing off.
+        self._pending: Dict[int, str] = {}
+        # Payouts whose resend the retry store has counted already; deferrals and retries are not counted again.
+        self._counted: Set[int] = set()
+        self._recent = TTLCache(max_size=config.RESEND_QUEUE_MAX_SIZE, default_ttl=config.RESEND_COALESCE_WINDOW)
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._run(), name=f"webhook-resend-{i}") for i in range(config.RESEND_CONCURRENCY)
+        ]
+
+    async def stop(self) -> None:
+        if self._queue is None:
+            return
+        for timer in self._timers.values():
+            timer.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._pending:
+            logger.warning("Dropping %d queued webhook resends on shutdown", len(self._pending))
+        self._pending.clear()
+        self._counted.clear()
+        self._timers.clear()
+        self._workers = []
+        self._queue = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, payout_id: int, request_id: str) -> bool:
+        """Queue a resend for payout_id; False if one is already queued or was just made."""
+        if payout_id in self._pending or self._recent.get(payout_id) is not None:
+            self.coalesced += 1
+            logger.info("Resend for payout %d already requested, coalescing", payout_id)
+            return False
+        if len(self._pending) >= config.RESEND_QUEUE_MAX_SIZE:
+            self.dropped += 1
+            logger.warning("Resend queue full (%d), dropping resend for payout %d", len(self._pending), payout_id)
+            return False
+
+        self.start()
+        self._pending[payout_id] = request_id
+        self._queue.put_nowait((payout_id, 1))
+        self.queued += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth, "in_flight": self.in_flight, "queued": self.queued, "coalesced": self.coalesced,
+            "dropped": self.dropped, "sent": self.sent, "retried": self.retried, "failed": self.failed,
+            "limited": self.limited, "deferred": self.deferred,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            payout_id, attempt = await self._queue.get()
+            request_id = self._pending[payout_id]
+            self.in_flight += 1
+            try:
+                # Logged under the webhook's request_id, like the callback that asked for it.
+                with logs.correlation(request_id):
+                    finished = await self._request(payout_id, request_id, attempt)
+            except Exception as e:
+                logger.exception("Unexpected error requesting resend for payout %d: %s", payout_id, e)
+                self.failed += 1
+                finished = True
+            finally:
+                self.in_flight -= 1
+            if finished:
+                del self._pending[payout_id]
+                self._counted.discard(payout_id)
+
+    async def _request(self, payout_id: int, request_id: str, attempt: int) -> bool:
+        """Make one resend request; False when it has been rescheduled."""
+        retry_in = provider.retry_in()
+        if retry_in:
+            self._defer(payout_id, attempt, retry_in)
+            return False
+        if payout_id not in self._counted:
+            try:
+                attempts = await retry_store.resend_attempts.increment(f"{request_id}:{payout_id}")
+            except Exception as e:
+                logger.error("Could not count resend attempts for payout %d, not requesting one: %s", payout_id, e)
+                self.failed += 1
+                return True
+            if attempts > config.MAX_TIMESTAMP_RETRIES:
+                logger.warning("Max retries reached for payout %d. Not requesting again.", payout_id)
+                self.limited += 1
+                return True
+            self._counted.add(payout_id)
+
+        try:
+            await payment_service.request_webhook_resend(payout_id, request_id)
+        except ProviderUnavailable as e:
+            # The circuit opened since the check above, or no slot came free. Nothing was sent,
+            # so this is not an attempt.
+            self._defer(payout_id, attempt, e.retry_in)
+            return False
+        except httpx.HTTPError as e:
+            if attempt >= config.RESEND_MAX_ATTEMPTS or not _retryable(e):
+                logger.error("Giving up on webhook resend for payout %d after %d attempts: %s", payout_id, attempt, e)
+                self.failed += 1
+                return True
+            delay = min(config.RESEND_RETRY_BASE_DELAY * 2 ** (attempt - 1), config.RESEND_RETRY_MAX_DELAY)
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning("Webhook resend for payout %d failed (attempt %d), retrying in %.2fs: %s",
+                           payout_id, attempt, delay, e)
+            self.retried += 1
+            self._timers[payout_id] = asyncio.get_running_loop().call_later(delay, self._requeue, payout_id, attempt + 1)
+            return False
+
+        self.sent += 1
+        self._recent.set(payout_id, request_id)
+        logger.info("Requested resend for payout %d", payout_id)
+        return True
+
+    def _defer(self, payout_id: int, attempt: int, delay: float) -> None:
+        logger.info("Webhook resend for payout %d waiting %.1fs for the provider's circuit", payout_id, delay)
+        self.deferred += 1
+        self._timers[payout_id] = asyncio.get_running_loop().call_later(delay, self._requeue, payout_id, attempt)
+
+    def _requeue(self, payout_id: int, attempt: int) -> None:
+        del self._timers[payout_id]
+        self._queue.put_nowait((payout_id, attempt))
+
+
+resend_queue = ResendQueue()
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.config.config import config
+from app.db import database
+from app.services import crud
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryRetryStore:
+    """Per-process counts in a bounded LRU with TTL. Each uvicorn worker counts on its own."""
+
+    backend = "memory"
+
+    def __init__(self, max_size: int, ttl: float):
+        self._counts = TTLCache(max_size=max_size, default_ttl=ttl)
+
+    async def increment(self, key: str) -> int:
+        attempts = self._counts.get(key, 0) + 1
+        self._counts.set(key, attempts)
+        return attempts
+
+    async def stats(self) -> dict:
+        # memory_bytes walks every entry, so keep this off the request path; only /stats and /metrics read it.
+        return {"backend": self.backend, **self._counts.stats(), "memory_bytes": self._counts.memory_bytes()}
+
+    async def close(self) -> None:
+        self._counts.clear()
+
+
+class DatabaseRetryStore:
+    """Counts in the webhook_resend_attempts table, shared by every worker and replica.
+
+    Each increment is a single upsert. Expired rows, and the least recently used ones beyond
+    max_size, are purged every PURGE_EVERY increments.
+    """
+
+    backend = "database"
+    PURGE_EVERY = 256
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._since_purge = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def increment(self, key: str) -> int:
+        attempts = await database.run_in_session(crud.increment_resend_attempts, key, self.ttl)
+        self._since_purge += 1
+        if self._since_purge >= self.PURGE_EVERY:
+            self._since_purge = 0
+            await self.purge()
+        return attempts
+
+    async def purge(self) -> None:
+        expired, evicted = await database.run_in_session(crud.purge_resend_attempts, self.max_size)
+        self.expirations += expired
+        self.evictions += evicted
+
+    async def stats(self) -> dict:
+        table_stats = await database.run_in_session(crud.resend_attempts_stats)
+        return {
+            "backend": self.backend,
+            **table_stats,
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisRetryStore:
+    """Counts in Redis or anything speaking its protocol (Valkey, KeyDB, Dragonfly), shared by every replica.
+
+    Keys expire after the TTL. The size bound is the server's maxmemory with an LRU eviction
+    policy, so evictions and memory are reported from the server's INFO, for the whole server.
+    """
+
+    backend = "redis"
+    KEY_PREFIX = "webhook-resend:"
+    SCAN_BATCH = 1000
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis
+
+        self.ttl = max(1, int(ttl))
+        # RESP2, which every Redis-compatible server speaks; newer clients default to RESP3.
+        self._client = redis.Redis.from_url(url, protocol=2, socket_timeout=config.HTTP_CONNECT_TIMEOUT)
+
+    async def increment(self, key: str) -> int:
+        async with self._client.pipeline(transaction=True) as pipe:
+            # Sets the TTL only when the key is created; INCR keeps it. MULTI/EXEC makes the pair atomic.
+            pipe.set(self.KEY_PREFIX + key, 0, ex=self.ttl, nx=True)
+            pipe.incr(self.KEY_PREFIX + key)
+            _, attempts = await pipe.execute()
+        return int(attempts)
+
+    async def size(self) -> int:
+        """Keys under KEY_PREFIX. The database may be shared (e.g. with the rate limiter), so DBSIZE would overcount."""
+        size = 0
+        async for _ in self._client.scan_iter(match=self.KEY_PREFIX + "*", count=self.SCAN_BATCH):
+            size += 1
+        return size
+
+    async def stats(self) -> dict:
+        memory, server_stats, size = await asyncio.gather(
+            self._client.info("memory"), self._client.info("stats"), self.size()
+        )
+        return {
+            "backend": self.backend,
+            "size": size,
+            "max_size": None,
+            "evictions": server_stats.get("evicted_keys"),
+            "expirations": server_stats.get("expired_keys"),
+            "memory_bytes": memory.get("used_memory"),
+            "max_memory_bytes": memory.get("maxmemory"),
+        }
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_retry_store():
+    backend = config.RETRY_STORE_BACKEND
+    if backend == "memory":
+        return MemoryRetryStore(config.RETRY_STORE_MAX_SIZE, config.RETRY_STORE_TTL)
+    if backend == "database":
+        return DatabaseRetryStore(config.RETRY_STORE_MAX_SIZE, config.RETRY_STORE_TTL)
+    if backend == "redis":
+        return RedisRetryStore(config.RETRY_STORE_REDIS_URL, config.RETRY_STORE_TTL)
+    raise ValueError(f"Unknown RETRY_STORE_BACKEND: {backend}")
+
+
+resend_attempts = create_retry_store()
+_last_stats: Optional[dict] = None
+
+
+async def refresh_stats() -> Optional[dict]:
+    """Re-read the store's stats for /metrics; keeps the previous ones if the backend is unreachable."""
+    global _last_stats
+    try:
+        _last_stats = await resend_attempts.stats()
+    except Exception as e:
+        logger.warning("Could not read %s retry store stats: %s", resend_attempts.backend, e)
+    return _last_stats
+
+
+def last_stats() -> dict:
+    return _last_stats or {}
@@ -0,0 +1,151 @@
+"""Session tokens the backend issues itself once Google login succeeds.
+
+A token is an HS256 JWT carrying the local user id (sub), when it was issued (iat), when the
+user logged in with Google (auth_time) and when it expires (exp). Checking one needs neither
+Google nor the database: only the HMAC key its kid header names, from a table built once.
+SESSION_TOKEN_SECRET signs; PREVIOUS_SESSION_TOKEN_SECRETS still verify, so the secret can be
+rotated without logging everyone out. It is a key of its own, not SESSION_SECRET_KEY, which
+Starlette's SessionMiddleware signs with.
+"""
+import hashlib
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import jwt
+from starlette.responses import Response
+
+from app.config.config import config
+from app.services.cache import TTLCache
+
+ALGORITHM = "HS256"
+COOKIE_NAME = "access_token"
+REQUIRED_CLAIMS = ["sub", "iat", "exp", "auth_time"]
+# Tolerated clock difference between replicas.
+LEEWAY_SECONDS = 10
+
+
+class SessionClaims(NamedTuple):
+    user_id: int
+    issued_at: int
+    auth_time: int
+    expires_at: int
+
+
+def key_id(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+class SessionTokens:
+    def __init__(self, secrets: List[str], ttl: int, refresh_after: int, max_age: int, verified_cache_size: int = 10000):
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.max_age = max_age
+        self._keys: Dict[str, bytes] = {key_id(secret): secret.encode("utf-8") for secret in secrets}
+        self._signing_kid = key_id(secrets[0]) if secrets else None
+        # Token -> claims of tokens already verified, so each is only checked once per worker
+        # (the rate limiter and get_current_user both read it).
+        self._verified = TTLCache(max_size=verified_cache_size, default_ttl=ttl)
+
+    def issue(self, user_id: int, auth_time: Optional[int] = None) -> str:
+        if self._signing_kid is None:
+            raise RuntimeError("SESSION_TOKEN_SECRET is not set")
+        now = int(time.time())
+        auth_time = now if auth_time is None else auth_time
+        claims = {
+            "sub": str(user_id),
+            "iat": now,
+            "auth_time": auth_time,
+            "exp": min(now + self.ttl, auth_time + self.max_age),
+        }
+        return jwt.encode(claims, self._keys[self._signing_kid], algorithm=ALGORITHM,
+                          headers={"kid": self._signing_kid})
+
+    def verify(self, token: str) -> Optional[SessionClaims]:
+        """Claims of a valid token, or None if token is not a JWT at all (e.g. a Google access token).
+
+        Raises jwt.InvalidTokenError for a JWT that is expired, tampered with or signed by an unknown key.
+        """
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims.expires_at + LEEWAY_SECONDS <= time.time():
+                raise jwt.ExpiredSignatureError("Signature has expired")
+            return claims
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.DecodeError:
+            return None
+        key = self._keys.get(header.get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown session token key")
+        claims = jwt.decode(token, key, algorithms=[ALGORITHM], leeway=LEEWAY_SECONDS,
+                            options={"require": REQUIRED_CLAIMS})
+        try:
+            verified = SessionClaims(int(claims["sub"]), claims["iat"], claims["auth_time"], claims["exp"])
+        except (TypeError, ValueError) as e:
+            raise jwt.InvalidTokenError("Malformed session token claims") from e
+        self._verified.set(token, verified)
+        return verified
+
+    def refreshed(self, claims: SessionClaims) -> Optional[str]:
+        """A new token for the same login once claims is old enough, unless it cannot be extended."""
+        now = time.time()
+        if now - claims.issued_at < self.refresh_after or claims.expires_at >= claims.auth_time + self.max_age:
+            return None
+        return self.issue(claims.user_id, claims.auth_time)
+
+
+def check_config() -> None:
+    """Raise RuntimeError unless session tokens have a signing secret of their own; called at startup."""
+    if not config.SESSION_TOKEN_SECRET:
+        raise RuntimeError("SESSION_TOKEN_SECRET is not set")
+    if config.SESSION_TOKEN_SECRET == config.SESSION_SECRET_KEY:
+        raise RuntimeError("SESSION_TOKEN_SECRET must not be the same as SESSION_SECRET_KEY")
+
+
+session_tokens = SessionTokens(
+    [s for s in [config.SESSION_TOKEN_SECRET, *config.PREVIOUS_SESSION_TOKEN_SECRETS] if s],
+    ttl=config.SESSION_TOKEN_TTL,
+    refresh_after=config.SESSION_TOKEN_REFRESH_AFTER,
+    max_age=config.SESSION_MAX_AGE,
+    verified_cache_size=config.TOKEN_CACHE_MAX_SIZE,
+)
+
+
+def set_cookie(response: Response, token: str) -> None:
+    response.set_cookie(key=COOKIE_NAME, value=token, httponly=True, secure=True, max_age=session_tokens.ttl)
+
+
+def replace_cookie(request, token: str) -> None:
+    """Have SessionCookieMiddleware send token as the new cookie with this request's response."""
+    request.state.session_token = token
+
+
+class SessionCookieMiddleware:
+    """Adds the Set-Cookie for a token replaced during the request (see replace_cookie).
+
+    Done here rather than on the route's response because several routes return their own
+    Response objects, which FastAPI does not merge dependency-set headers into.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                token = scope.get("state", {}).get("session_token")
+                if token is not None:
+                    cookie = Response()
+                    set_cookie(cookie, token)
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        *((name, value) for name, value in cookie.raw_headers if name == b"set-cookie"),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
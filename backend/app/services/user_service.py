@@ -1,30 +1,62 @@
-import httpx
+import hashlib
 
-from fastapi import HTTPException, status, Depends, Cookie
-from sqlalchemy.orm import Session
+import jwt
+from fastapi import HTTPException, Request, status, Depends, Cookie
+from sqlalchemy.orm import object_session
 
-from app.services import crud
+from app.services import crud, http_client
+from app.services.cache import TTLCache, SingleFlight
+from app.services.session_tokens import session_tokens, replace_cookie
 from app.config.config import config
 from app.models import models
 from app.db import database
 
-async def get_current_user(
-    access_token: str = Cookie(None),
-    db: Session = Depends(database.get_db),
-) -> models.User:
-    user_info_url = "https://www.googleapis.com/oauth2/v3/userinfo"
+# User id -> user, for requests carrying a session token. Users are only read here, never
+# changed after creation, so a cached copy is only ever briefly stale.
+user_cache = TTLCache(max_size=config.TOKEN_CACHE_MAX_SIZE, default_ttl=config.TOKEN_CACHE_TTL)
+user_flight = SingleFlight()
+# Google access token (hashed) -> resolved user, for cookies set before session tokens existed.
+token_cache = TTLCache(
+    max_size=config.TOKEN_CACHE_MAX_SIZE,
+    default_ttl=min(config.TOKEN_CACHE_TTL, config.ACCESS_TOKEN_MAX_AGE),
+)
+userinfo_flight = SingleFlight()
 
-    if not access_token:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authenticated",
-        )
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            user_info_url,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+def _detached(user: models.User) -> models.User:
+    # Detach the user so later commits in the request's session cannot expire the cached copy.
+    session = object_session(user)
+    if session is not None:
+        session.expunge(user)
+    return user
+
+
+def cache_user(user: models.User) -> None:
+    user_cache.set(user.id, _detached(user))
+
+
+def cache_user_for_token(access_token: str, user: models.User) -> None:
+    token_cache.set(_token_key(access_token), _detached(user))
+
+
+def token_cache_stats() -> dict:
+    return {
+        **token_cache.stats(),
+        "shared_lookups": userinfo_flight.shared,
+        "users": {**user_cache.stats(), "shared_lookups": user_flight.shared},
+    }
+
+
+async def _resolve_user(access_token: str, db: database.DbSession) -> models.User:
+    client = http_client.get_client(http_client.GOOGLE)
+    resp = await client.get(
+        config.GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
 
     if resp.status_code != 200:
         raise HTTPException(
@@ -33,13 +65,65 @@ async def get_current_user(
         )
 
     userinfo = resp.json()
-    user = crud.get_or_create_user(db=db, google_profile=userinfo)
-    print(user)
+    user = await database.run_db(db, crud.get_or_create_user, google_profile=userinfo)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+
+    cache_user_for_token(access_token, user)
+    return user
 
+
+async def _load_user(user_id: int, db: database.DbSession) -> models.User:
+    user = await database.run_db(db, crud.get_user_by_id, user_id=user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
 
-    return user
\ No newline at end of file
+    cache_user(user)
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    access_token: str = Cookie(None),
+    db: database.DbSession = Depends(database.get_session),
+) -> models.User:
+    if not access_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authenticated",
+        )
+
+    try:
+        claims = session_tokens.verify(access_token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+        )
+
+    if claims is None:
+        # A Google access token from before session tokens: check it with Google once and
+        # swap the cookie for a session token.
+        key = _token_key(access_token)
+        user = token_cache.get(key)
+        if user is None:
+            user = await userinfo_flight.do(key, lambda: _resolve_user(access_token, db))
+        replace_cookie(request, session_tokens.issue(user.id))
+        return user
+
+    refreshed = session_tokens.refreshed(claims)
+    if refreshed is not None:
+        replace_cookie(request, refreshed)
+
+    user = user_cache.get(claims.user_id)
+    if user is not None:
+        return user
+
+    return await user_flight.do(claims.user_id, lambda: _load_user(claims.user_id, db))
@@ -0,0 +1,143 @@
+"""Helpers shared by the backend benchmarks.
+
+Benchmarks run the FastAPI app in-process over httpx's ASGI transport, against a throwaway
+SQLite database unless --database-url points at a local Postgres.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REPO_DIR = BACKEND_DIR.parent
+for path in (REPO_DIR, BACKEND_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from shared.signing import SIGNATURE_HEADER, WebhookSigner  # noqa: E402
+
+WEBHOOK_SECRET = "benchmark-secret"
+
+
+def configure_env(database_url: str = None, **overrides) -> str:
+    """Set the env the app reads at import time. Must run before importing app.*"""
+    if database_url is None:
+        database_url = f"sqlite:///{tempfile.mkdtemp(prefix='fintech-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SESSION_SECRET_KEY", "benchmark")
+    os.environ.setdefault("SESSION_TOKEN_SECRET", "benchmark-session-tokens")
+    os.environ.setdefault("SHARED_CALLBACK_SECRET", WEBHOOK_SECRET)
+    os.environ.setdefault("MOCK_PAYMENTS_URL", "http://127.0.0.1:9")
+    # Every in-process request comes from one address; bench_rate_limit turns limiting back on.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    for key, value in overrides.items():
+        os.environ[key] = str(value)
+    return database_url
+
+
+def seed_user(payout_count: int, currency: str = "USD"):
+    """Create one user with payout_count payouts and their summaries; return (detached user, payout ids)."""
+    from app.db import database, migrations
+    from app.models import models
+    from app.services import crud
+
+    migrations.upgrade()
+    db = database.SessionLocal()
+    try:
+        user = models.User(oauth_provider="google", oauth_id=str(uuid.uuid4()), email=f"{uuid.uuid4()}@bench.local")
+        db.add(user)
+        db.flush()
+        batch = []
+        for i in range(payout_count):
+            batch.append({
+                "amount": Decimal("10.00"),
+                "currency": currency,
+                "status": models.PayoutStatus.PENDING,
+                "user_id": user.id,
+                "idempotency_key": str(uuid.uuid4()),
+            })
+            if len(batch) == 5000:
+                db.execute(models.Payout.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.execute(models.Payout.__table__.insert(), batch)
+        db.commit()
+        crud.rebuild_payout_summaries(db)
+        db.refresh(user)
+        payout_ids = [row[0] for row in db.query(models.Payout.id).filter(models.Payout.user_id == user.id)]
+        db.expunge(user)
+        return user, payout_ids
+    finally:
+        db.close()
+
+
+def override_current_user(app, user) -> None:
+    from app.services import user_service
+
+    async def _current_user():
+        return user
+
+    app.dependency_overrides[user_service.get_current_user] = _current_user
+
+
+def sign_webhook(payload: dict, secret: str = WEBHOOK_SECRET):
+    """Return (body bytes, headers); post the bytes with content= so the signed body is what is sent."""
+    body, signature = WebhookSigner([secret]).sign_payload({"timestamp": int(time.time()), **payload})
+    return body, {SIGNATURE_HEADER: signature, "Content-Type": "application/json"}
+
+
+async def run_load(send, total: int, concurrency: int) -> dict:
+    """Call `await send(i)` total times with bounded concurrency; return throughput and latency."""
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await send(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if ok is False:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors)
+
+
+def summarize(latencies, elapsed: float, errors: int = 0) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(p):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(pct(50), 3),
+        "p99_ms": round(pct(99), 3),
+    }
+
+
+def print_table(rows, columns) -> None:
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
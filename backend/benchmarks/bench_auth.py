@@ -0,0 +1,117 @@
+"""Cost of authenticating one request: Google userinfo lookups vs locally verified session tokens.
+
+    python benchmarks/bench_auth.py [--calls 2000] [--google-delay-ms 0]
+
+Calls user_service.get_current_user directly, µs per call:
+
+  google, cache miss     the cookie holds a Google access token that is not cached in this
+                         worker (new worker, or TOKEN_CACHE_TTL passed): userinfo over HTTP
+                         to a local stub answering after --google-delay-ms (real Google
+                         takes tens of ms), then get_or_create_user
+  google, cache hit      the same token, cached
+  session, user cached   a session token: JWT verify plus the per-worker user cache
+  session, user miss     a session token whose user is not cached: JWT verify plus a primary key lookup
+
+Plus session_tokens.verify alone.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _support
+
+
+class StubUserinfo(BaseHTTPRequestHandler):
+    delay = 0.0
+    protocol_version = "HTTP/1.1"
+    # One write per response; separate header and body segments would add a delayed-ACK stall.
+    wbufsize = 65536
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = json.dumps({"sub": "bench-google-id", "email": "bench@bench.local", "name": "Bench"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--google-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    StubUserinfo.delay = args.google_delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubUserinfo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _support.configure_env(
+        args.database_url, OUTBOX_DISPATCHER_ENABLED="false", LOG_LEVEL="WARNING",
+        GOOGLE_USERINFO_URL=f"http://127.0.0.1:{server.server_address[1]}/userinfo",
+    )
+
+    from starlette.requests import Request
+
+    from app.db import database, migrations
+    from app.services import http_client, user_service
+    from app.services.session_tokens import session_tokens
+
+    migrations.upgrade()
+
+    def request() -> Request:
+        return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+    async def per_call(token: str, before=None) -> float:
+        db = database.SessionLocal()
+        try:
+            total = 0.0
+            for _ in range(args.calls):
+                if before is not None:
+                    before()
+                started = time.perf_counter()
+                await user_service.get_current_user(request(), token, db)
+                total += time.perf_counter() - started
+            return total / args.calls * 1e6
+        finally:
+            db.close()
+
+    async def run() -> list:
+        google_token = "ya29.bench-google-token"
+        db = database.SessionLocal()
+        user = await user_service.get_current_user(request(), google_token, db)
+        db.close()
+        session_token = session_tokens.issue(user.id)
+        rows = [
+            {"path": "google, cache miss", "us_per_call": await per_call(google_token, user_service.token_cache.clear)},
+            {"path": "google, cache hit", "us_per_call": await per_call(google_token)},
+            {"path": "session, user cached", "us_per_call": await per_call(session_token)},
+            {"path": "session, user miss", "us_per_call": await per_call(session_token, user_service.user_cache.clear)},
+        ]
+        await http_client.close_clients()
+        return rows
+
+    rows = asyncio.run(run())
+    token = session_tokens.issue(1)
+    started = time.perf_counter()
+    for _ in range(args.calls * 10):
+        session_tokens.verify(token)
+    rows.append({"path": "session_tokens.verify", "us_per_call": (time.perf_counter() - started) / (args.calls * 10) * 1e6})
+    server.shutdown()
+
+    for row in rows:
+        row["us_per_call"] = round(row["us_per_call"], 1)
+    print(f"{args.calls} calls per path, stub userinfo answering after {args.google_delay_ms} ms")
+    _support.print_table(rows, ["path", "us_per_call"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare requests/sec for GET /api/payouts and POST /api/webhooks/payments with DB_ASYNC off and on.
+
+    python benchmarks/bench_db_modes.py [--database-url postgresql://...] [--requests 2000] [--concurrency 50]
+
+Each mode runs in its own process because the engine is chosen at import time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+
+import _support
+
+
+def run_worker(args) -> dict:
+    _support.configure_env(args.database_url, DB_ASYNC="true" if args.worker == "async" else "false")
+
+    import httpx
+    from app.main import app
+
+    user, payout_ids = _support.seed_user(args.payouts)
+    _support.override_current_user(app, user)
+    rng = random.Random(42)
+
+    async def main():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def list_payouts(i):
+                    response = await client.get("/api/payouts/", params={"offset": rng.randrange(0, 500), "limit": 50})
+                    return response.status_code == 200
+
+                async def webhook(i):
+                    body, headers = _support.sign_webhook({
+                        "payout_id": rng.choice(payout_ids),
+                        "new_status": rng.choice(["PENDING", "AUTHORIZED", "EXECUTED", "PAID"]),
+                        "request_id": f"bench-{i}",
+                    })
+                    response = await client.post("/api/webhooks/payments", content=body, headers=headers)
+                    return response.status_code == 200
+
+                return {
+                    "list_payouts": await _support.run_load(list_payouts, args.requests, args.concurrency),
+                    "webhook": await _support.run_load(webhook, args.requests, args.concurrency),
+                }
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Defaults to a fresh SQLite file per mode")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--payouts", type=int, default=5000)
+    parser.add_argument("--worker", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    rows = []
+    for mode in ("sync", "async"):
+        command = [sys.executable, __file__, "--worker", mode, "--requests", str(args.requests),
+                   "--concurrency", str(args.concurrency), "--payouts", str(args.payouts)]
+        if args.database_url:
+            command += ["--database-url", args.database_url]
+        env = {**os.environ, "PYTHONWARNINGS": "ignore"}
+        output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for endpoint, stats in result.items():
+            rows.append({"mode": mode, "endpoint": endpoint, **stats})
+
+    _support.print_table(rows, ["mode", "endpoint", "requests", "errors", "rps", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
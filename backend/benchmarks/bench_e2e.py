@@ -0,0 +1,318 @@
+"""End-to-end load test of the payout lifecycle with local stand-ins for every external service.
+
+    python benchmarks/bench_e2e.py [--requests 5000] [--concurrency 50] [--mix create=5,list=4,webhook=1]
+                                   [--users 20] [--seed 42] [--output results.json]
+
+Starts three processes on this machine: the backend, benchmarks/stub_oauth.py in place of Google,
+and payment-microservice/app/mock_payments.py seeded with --seed. Each simulated user streams
+/api/payouts/stream, which is how "created -> final status" time is measured: from the POST
+/api/payouts/ response to the mock's webhook reaching that user's stream. The operation sequence
+is drawn from --seed, so two runs issue the same traffic; timings are all that should differ.
+
+Webhook traffic is signed callbacks sent straight to /api/webhooks/payments for payouts created
+during warm-up, so it never races the mock's own callbacks. Results are printed and, with
+--output, written as JSON for comparing commits. Use --backend-env KEY=VALUE to vary settings
+(DB_ASYNC=true, PROVIDER_CONCURRENCY_MAX=...). Keep the backend on one worker unless
+PAYOUT_EVENTS_BACKEND=postgres, or streams will miss events published by other workers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import _support
+
+import httpx
+
+MOCK_DIR = _support.REPO_DIR / "payment-microservice"
+STATUSES = ["PENDING", "AUTHORIZED", "EXECUTED", "PAID"]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("create", "list", "webhook"):
+            raise argparse.ArgumentTypeError(f"Unknown operation in --mix: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def start_process(name: str, module: str, port: int, cwd: Path, env: dict, log_dir: Path, workers: int = 1):
+    log = open(log_dir / f"{name}.log", "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=cwd, env={**os.environ, "PYTHONPATH": str(_support.REPO_DIR), **env}, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def migrate(env: dict) -> None:
+    subprocess.run([sys.executable, "-m", "app.manage", "migrate"], cwd=_support.BACKEND_DIR, check=True,
+                   env={**os.environ, "PYTHONPATH": str(_support.REPO_DIR), **env}, stdout=subprocess.DEVNULL)
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=_support.BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 1)
+
+    return {"count": len(ordered), "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99), "max_ms": pct(100)}
+
+
+class Harness:
+    def __init__(self, args, backend_url: str):
+        self.args = args
+        self.backend_url = backend_url
+        self.rng = random.Random(args.seed)
+        self.clients = []
+        self.created_at = {}
+        self.finished_at = {}
+        self.webhook_targets = []
+        self.latencies = {"create": [], "list": [], "webhook": []}
+        self.errors = {"create": 0, "list": 0, "webhook": 0}
+        self.streams = []
+        self.streams_ready = 0
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=self.args.concurrency + 2)
+        for i in range(self.args.users):
+            self.clients.append(httpx.AsyncClient(
+                base_url=self.backend_url, limits=limits, timeout=30,
+                cookies={"access_token": f"bench-user-{self.args.seed}-{i}"},
+            ))
+        self.streams = [asyncio.create_task(self._follow(client)) for client in self.clients]
+        while self.streams_ready < len(self.clients):
+            await asyncio.sleep(0.05)
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self.streams:
+            task.cancel()
+        await asyncio.gather(*self.streams, return_exceptions=True)
+        for client in self.clients:
+            await client.aclose()
+
+    async def _follow(self, client: httpx.AsyncClient):
+        async with client.stream("GET", "/api/payouts/stream", timeout=None) as response:
+            response.raise_for_status()
+            self.streams_ready += 1
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payout = json.loads(line[5:])
+                if payout:
+                    self.finished_at.setdefault(payout["id"], time.perf_counter())
+
+    async def create(self, user: int, amount: int, currency: str):
+        response = await self.clients[user].post("/api/payouts/", json={
+            "amount": amount, "currency": currency, "idempotency_key": str(uuid.uuid4()),
+        })
+        if response.status_code != 200:
+            return False
+        return response.json()["id"]
+
+    async def list(self, user: int, limit: int):
+        response = await self.clients[user].get("/api/payouts/", params={"limit": limit})
+        return response.status_code == 200
+
+    async def webhook(self, user: int, target: int, new_status: str):
+        body, headers = _support.sign_webhook({
+            "payout_id": self.webhook_targets[target % len(self.webhook_targets)],
+            "new_status": new_status,
+            "request_id": str(uuid.uuid4()),
+        })
+        response = await self.clients[user].post("/api/webhooks/payments", content=body, headers=headers)
+        return response.status_code == 200
+
+    async def warm_up(self):
+        # One payout per user: logs everyone in, primes the token cache and gives webhook traffic targets.
+        ids = await asyncio.gather(*(self.create(user, 1, "USD") for user in range(self.args.users)))
+        self.webhook_targets = [payout_id for payout_id in ids if payout_id]
+        await self.settle(self.webhook_targets)
+        self.created_at.clear()
+        self.finished_at.clear()
+
+    def plan(self):
+        weights = self.args.mix
+        names = list(weights)
+        operations = []
+        for _ in range(self.args.requests):
+            name = self.rng.choices(names, [weights[n] for n in names])[0]
+            user = self.rng.randrange(self.args.users)
+            if name == "create":
+                operations.append((name, (user, self.rng.randint(1, 1000), self.rng.choice(["USD", "EUR", "GBP"]))))
+            elif name == "list":
+                operations.append((name, (user, self.rng.choice([10, 25, 50]))))
+            else:
+                operations.append((name, (user, self.rng.randrange(1 << 30), self.rng.choice(STATUSES))))
+        return operations
+
+    async def run(self, operations):
+        created = []
+
+        async def send(i):
+            name, op_args = operations[i]
+            started = time.perf_counter()
+            try:
+                result = await getattr(self, name)(*op_args)
+            except httpx.HTTPError:
+                result = False
+            finished = time.perf_counter()
+            self.latencies[name].append(finished - started)
+            if result is False:
+                self.errors[name] += 1
+            elif name == "create":
+                self.created_at[result] = finished
+                created.append(result)
+
+        started = time.perf_counter()
+        await _support.run_load(send, len(operations), self.args.concurrency)
+        return time.perf_counter() - started, created
+
+    async def settle(self, payout_ids, timeout: float = None):
+        deadline = time.monotonic() + (timeout or self.args.settle_timeout)
+        self.created_at.update({payout_id: self.created_at.get(payout_id, time.perf_counter()) for payout_id in payout_ids})
+        while time.monotonic() < deadline and any(payout_id not in self.finished_at for payout_id in payout_ids):
+            await asyncio.sleep(0.1)
+
+
+async def drive(args, backend_url: str) -> dict:
+    async with Harness(args, backend_url) as harness:
+        await harness.warm_up()
+        operations = harness.plan()
+        elapsed, created = await harness.run(operations)
+        await harness.settle(created)
+
+        routes = {}
+        for name, latencies in harness.latencies.items():
+            if latencies:
+                routes[name] = {**_support.summarize(latencies, elapsed, harness.errors[name]),
+                                **percentiles(latencies)}
+        lifecycle = [harness.finished_at[p] - harness.created_at[p] for p in created if p in harness.finished_at]
+        return {
+            "throughput": {
+                "requests": len(operations),
+                "seconds": round(elapsed, 3),
+                "rps": round(len(operations) / elapsed, 1),
+                "errors": sum(harness.errors.values()),
+            },
+            "routes": routes,
+            "lifecycle": {**percentiles(lifecycle), "created": len(created),
+                          "unfinished": len(created) - len(lifecycle)},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("create=5,list=4,webhook=1"))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="Defaults to a fresh SQLite file")
+    parser.add_argument("--backend-workers", type=int, default=1)
+    parser.add_argument("--backend-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--mock-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--webhook-delay", type=float, nargs=2, default=(0.5, 2.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--settle-timeout", type=float, default=60)
+    parser.add_argument("--base-port", type=int, default=8600)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="fintech-e2e-"))
+    database_url = args.database_url or f"sqlite:///{work_dir}/bench.db"
+    oauth_port, mock_port, backend_port = args.base_port, args.base_port + 1, args.base_port + 2
+    backend_url = f"http://127.0.0.1:{backend_port}"
+
+    backend_env = {
+        "DATABASE_URL": database_url,
+        "SESSION_SECRET_KEY": "benchmark",
+        "SESSION_TOKEN_SECRET": "benchmark-session-tokens",
+        "SHARED_CALLBACK_SECRET": _support.WEBHOOK_SECRET,
+        "GOOGLE_USERINFO_URL": f"http://127.0.0.1:{oauth_port}/userinfo",
+        "MOCK_PAYMENTS_URL": f"http://127.0.0.1:{mock_port}",
+        # All simulated users share 127.0.0.1; measure capacity, not the per-IP limit.
+        "RATE_LIMIT_ENABLED": "false",
+        **dict(item.split("=", 1) for item in args.backend_env),
+    }
+    mock_env = {
+        "SHARED_CALLBACK_SECRET": _support.WEBHOOK_SECRET,
+        "MOCK_CALLBACK_URL": f"{backend_url}/api/webhooks/payments",
+        "MOCK_RANDOM_SEED": str(args.seed),
+        "WEBHOOK_DELAY_MIN": str(args.webhook_delay[0]),
+        "WEBHOOK_DELAY_MAX": str(args.webhook_delay[1]),
+        **dict(item.split("=", 1) for item in args.mock_env),
+    }
+
+    migrate(backend_env)
+    processes = []
+    try:
+        processes.append(start_process("oauth", "stub_oauth:app", oauth_port, Path(__file__).parent, {}, work_dir))
+        processes.append(start_process("mock", "app.mock_payments:app", mock_port, MOCK_DIR, mock_env, work_dir))
+        processes.append(start_process("backend", "app.main:app", backend_port, _support.BACKEND_DIR, backend_env,
+                                       work_dir, workers=args.backend_workers))
+        for process, url in zip(processes, (f"http://127.0.0.1:{oauth_port}/stats",
+                                            f"http://127.0.0.1:{mock_port}/docs", f"{backend_url}/docs")):
+            wait_until_up(url, process)
+
+        results = asyncio.run(drive(args, backend_url))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    results["meta"] = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "database": database_url.split(":", 1)[0],
+        "logs": str(work_dir),
+        "args": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+
+    _support.print_table([{"route": name, **stats} for name, stats in results["routes"].items()],
+                         ["route", "requests", "errors", "rps", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"])
+    print()
+    print("throughput:", results["throughput"])
+    print("created -> final status:", results["lifecycle"])
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, default=str))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""POST /api/payouts retried with the same idempotency_key, before and after idempotent replay.
+
+    python benchmarks/bench_idempotency.py [--database-url postgresql://...] [--retries 2000] [--concurrency 20]
+
+"legacy" is the handler as it was: every retry runs the ORM INSERT, hits the unique
+constraint, rolls back and answers 400. "replay" is the current route with the key cached,
+"replay, cold" the same with the in-memory cache cleared before every request (another
+worker, or the entry expired): ON CONFLICT DO NOTHING plus a read of the existing row.
+Fresh creates (a new key per request) are timed on both paths as well, to check the new insert
+costs no more than the ORM one.
+"""
+import argparse
+import asyncio
+import uuid
+
+import _support
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--retries", type=int, default=2000)
+    parser.add_argument("--creates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    _support.configure_env(args.database_url, OUTBOX_DISPATCHER_ENABLED="false", LOG_LEVEL="ERROR")
+
+    import httpx
+    from fastapi import Depends, HTTPException
+    from sqlalchemy.exc import IntegrityError
+
+    from app.db import database
+    from app.main import app
+    from app.models import models
+    from app.schemas import schemas
+    from app.services import crud, idempotency, user_service
+
+    user, _ = _support.seed_user(0)
+    _support.override_current_user(app, user)
+
+    def legacy_create(db, payout: schemas.PayoutCreate, user_id: int):
+        try:
+            db_payout = models.Payout(**payout.model_dump(), user_id=user_id, status=models.PayoutStatus.PENDING)
+            db.add(db_payout)
+            db.flush()
+            crud._adjust_payout_summary(db, user_id, db_payout.currency, db_payout.status, 1, db_payout.amount)
+            db.add(models.PayoutOutbox(payout_id=db_payout.id, payload=crud._outbox_payload(db_payout)))
+            db.commit()
+            db.refresh(db_payout)
+            return db_payout
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Payout already exists")
+
+    @app.post("/bench/legacy-payouts", response_model=schemas.PayoutPublic)
+    async def legacy_payouts(payout: schemas.PayoutCreate, current_user=Depends(user_service.get_current_user),
+                             db=Depends(database.get_session)):
+        return await database.run_db(db, legacy_create, payout=payout, user_id=current_user.id)
+
+    def body(key: str) -> dict:
+        return {"amount": "10.00", "currency": "USD", "idempotency_key": key}
+
+    async def run() -> list:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def load(path: str, total: int, key=None, before=None, expect=200) -> dict:
+                    async def send(i):
+                        if before is not None:
+                            before()
+                        response = await client.post(path, json=body(key or str(uuid.uuid4())))
+                        return response.status_code == expect
+                    return await _support.run_load(send, total, args.concurrency)
+
+                rows = []
+                for name, path in (("legacy", "/bench/legacy-payouts"), ("replay", "/api/payouts/")):
+                    created = await load(path, args.creates)
+                    rows.append({"case": f"{name}: fresh creates", **created})
+
+                key = str(uuid.uuid4())
+                await client.post("/api/payouts/", json=body(key))
+                rows.append({"case": "legacy: retries", **await load("/bench/legacy-payouts", args.retries, key, expect=400)})
+                rows.append({"case": "replay: retries", **await load("/api/payouts/", args.retries, key)})
+                rows.append({"case": "replay, cold: retries",
+                             **await load("/api/payouts/", args.retries, key, before=idempotency.payouts_by_key.clear)})
+                return rows
+
+    rows = asyncio.run(run())
+    print(f"concurrency {args.concurrency}; retries all reuse one key")
+    _support.print_table(rows, ["case", "requests", "errors", "rps", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Cost of logging on the request path: synchronous stream handler vs the queue in shared/logs.py.
+
+    python benchmarks/bench_logging.py [--calls 50000] [--slow-sink-ms 1] [--requests 2000]
+
+"sync" is the setup the services had: basicConfig's StreamHandler writing each formatted line
+from the thread that logs. "queue-text" and "queue-json" are logs.configure(); "queue-json
+sampled" also keeps 10% of INFO lines. Each writes to a temporary file, and again to a sink
+that stalls --slow-sink-ms per write (a blocked stderr or a slow log shipper). Reported: µs per
+logger.info() call in the calling thread, time for the listener to drain, and the mean latency
+of an in-process GET /api/payouts/ (which logs from the route and the crud call) under each.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import _support
+
+from shared import logs
+
+SETUPS = ("sync", "queue-text", "queue-json", "queue-json sampled")
+
+
+class SlowFile:
+    """A file whose every write stalls, like a pipe nobody is reading fast enough."""
+
+    def __init__(self, file, delay: float):
+        self.file = file
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+def install(setup: str, stream) -> None:
+    logs.shutdown()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    if setup == "sync":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(logs.TEXT_FORMAT))
+        handler.addFilter(logs.ContextFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        return
+    fmt = "text" if setup == "queue-text" else "json"
+    rates = {"": 0.1} if setup.endswith("sampled") else None
+    logs.configure("bench", "INFO", fmt, rates, stream=stream)
+
+
+def per_call(setup: str, stream, calls: int) -> dict:
+    install(setup, stream)
+    logger = logging.getLogger("app.services.crud")
+    started = time.perf_counter()
+    for i in range(calls):
+        with logs.correlation(logs.new_correlation_id()):
+            logger.info("[%s] Fetched %s payouts for user %s", "get_payouts_by_user_paginated", 50, i)
+    calling = time.perf_counter() - started
+    logs.shutdown()
+    drained = time.perf_counter() - started
+    return {"us_per_call": round(calling / calls * 1e6, 2), "drained_ms": round(drained * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--slow-calls", type=int, default=2000)
+    parser.add_argument("--slow-sink-ms", type=float, default=1.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--payouts", type=int, default=1000)
+    args = parser.parse_args()
+
+    _support.configure_env(args.database_url, OUTBOX_DISPATCHER_ENABLED="false")
+    directory = tempfile.mkdtemp(prefix="fintech-bench-logs-")
+
+    rows = []
+    for setup in SETUPS:
+        with open(os.path.join(directory, "fast.log"), "w") as fast:
+            fast_cost = per_call(setup, fast, args.calls)
+        with open(os.path.join(directory, "slow.log"), "w") as slow:
+            slow_cost = per_call(setup, SlowFile(slow, args.slow_sink_ms / 1000), args.slow_calls)
+        rows.append({
+            "setup": setup,
+            "us_per_call": fast_cost["us_per_call"],
+            "drained_ms": fast_cost["drained_ms"],
+            "slow_sink_us_per_call": slow_cost["us_per_call"],
+        })
+
+    import httpx
+
+    from app.main import app
+
+    user, _ = _support.seed_user(args.payouts)
+    _support.override_current_user(app, user)
+
+    async def request_latency() -> dict:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def send(i):
+                    response = await client.get("/api/payouts/", params={"offset": i % 500, "limit": 20})
+                    return response.status_code == 200
+                await send(0)
+                return await _support.run_load(send, args.requests, 1)
+
+    for row in rows:
+        with open(os.path.join(directory, "requests.log"), "w") as sink:
+            install(row["setup"], sink)
+            row["request_mean_ms"] = asyncio.run(request_latency())["mean_ms"]
+            logs.shutdown()
+
+    print(f"{args.calls} calls to a file; {args.slow_calls} to a sink stalling {args.slow_sink_ms} ms per write;"
+          f" {args.requests} GET /api/payouts/")
+    _support.print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
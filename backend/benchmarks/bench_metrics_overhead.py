@@ -0,0 +1,127 @@
+"""Cost of recording metrics on the hot path.
+
+    python benchmarks/bench_metrics_overhead.py [--ops 1000000] [--threads 8] [--requests 20000]
+
+Reports ns per Counter.inc / Histogram.observe on one thread and across --threads threads
+(with a single-lock dict as the baseline the thread-local tables replace), then the added
+per-request latency of MetricsMiddleware on a trivial FastAPI route.
+"""
+import argparse
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+
+import _support  # noqa: F401  (puts the repo on sys.path)
+
+from shared.metrics import Counter, DEFAULT_BUCKETS, Histogram, MetricsMiddleware, Registry
+
+
+class LockedHistogram:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = {}
+
+    def observe(self, value, *labels):
+        with self.lock:
+            entry = self.table.get(labels)
+            if entry is None:
+                entry = self.table[labels] = [0] * (len(DEFAULT_BUCKETS) + 1) + [0.0]
+            entry[bisect_left(DEFAULT_BUCKETS, value)] += 1
+            entry[-1] += value
+
+
+def ns_per_op(fn, ops: int, threads: int) -> float:
+    per_thread = ops // threads
+
+    def work():
+        for i in range(per_thread):
+            fn(0.003, "GET", "/api/payouts/")
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (per_thread * threads) * 1e9
+
+
+def micro(args):
+    registry = Registry()
+    counter = Counter("bench_requests", "", ["method", "route"], registry=registry)
+    histogram = Histogram("bench_latency_seconds", "", ["method", "route"], registry=registry)
+    locked = LockedHistogram()
+
+    def inc(value, *labels):
+        counter.inc(*labels)
+
+    rows = []
+    for threads in (1, args.threads):
+        rows.append({
+            "threads": threads,
+            "counter_inc_ns": round(ns_per_op(inc, args.ops, threads), 1),
+            "histogram_observe_ns": round(ns_per_op(histogram.observe, args.ops, threads), 1),
+            "locked_observe_ns": round(ns_per_op(locked.observe, args.ops, threads), 1),
+        })
+    expected = args.ops // args.threads * args.threads + args.ops
+    recorded = sum(sum(entry[:-1]) for entry in histogram.values().values())
+    print(f"histogram recorded {recorded} of {expected} observations")
+    _support.print_table(rows, list(rows[0]))
+
+    started = time.perf_counter()
+    registry.render()
+    print(f"render: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+def macro(args):
+    import httpx
+    from fastapi import FastAPI
+
+    def build(instrumented: bool):
+        app = FastAPI()
+
+        @app.get("/ping/{item}")
+        async def ping(item: int):
+            return {"item": item}
+
+        if instrumented:
+            registry = Registry()
+            app.add_middleware(
+                MetricsMiddleware,
+                requests=Counter("http_requests", "", ["method", "route", "status"], registry=registry),
+                duration=Histogram("http_request_duration_seconds", "", ["method", "route"], registry=registry),
+            )
+        return app
+
+    async def run(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def send(i):
+                response = await client.get(f"/ping/{i}")
+                return response.status_code == 200
+            await _support.run_load(send, 500, 1)
+            return await _support.run_load(send, args.requests, 1)
+
+    rows = []
+    for instrumented in (False, True):
+        result = asyncio.run(run(build(instrumented)))
+        rows.append({"middleware": "on" if instrumented else "off", **result,
+                     "us_per_request": round(result["seconds"] / result["requests"] * 1e6, 1)})
+    _support.print_table(rows, ["middleware", "requests", "rps", "mean_ms", "p50_ms", "p99_ms", "us_per_request"])
+    print(f"overhead: {rows[1]['us_per_request'] - rows[0]['us_per_request']:.1f} us per request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    micro(args)
+    print()
+    macro(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Payouts/sec through POST /api/payouts (one payout per request) vs POST /api/payouts/batch.
+
+    python benchmarks/bench_payout_batch.py [--database-url postgresql://...] [--payouts 5000] [--batch-size 500]
+
+The outbox dispatcher is disabled so only the API and database path is measured; provider
+submission happens later and off the request path either way.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import _support
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Defaults to a fresh SQLite file")
+    parser.add_argument("--payouts", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    _support.configure_env(args.database_url, OUTBOX_DISPATCHER_ENABLED="false")
+
+    import httpx
+    from app.main import app
+
+    user, _ = _support.seed_user(0)
+    _support.override_current_user(app, user)
+
+    def item(i):
+        return {"amount": 10 + i % 100, "currency": "USD", "idempotency_key": str(uuid.uuid4())}
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                async def single(i):
+                    response = await client.post("/api/payouts/", json=item(i))
+                    return response.status_code == 200
+
+                started = time.perf_counter()
+                single_stats = await _support.run_load(single, args.payouts, args.concurrency)
+                single_elapsed = time.perf_counter() - started
+
+                batches = (args.payouts + args.batch_size - 1) // args.batch_size
+
+                async def batch(i):
+                    response = await client.post(
+                        "/api/payouts/batch", json={"payouts": [item(j) for j in range(args.batch_size)]}
+                    )
+                    return response.status_code == 200 and response.json()["created"] == args.batch_size
+
+                started = time.perf_counter()
+                batch_stats = await _support.run_load(batch, batches, min(args.concurrency, batches))
+                batch_elapsed = time.perf_counter() - started
+
+        return [
+            {"mode": "single", "payouts": args.payouts, "requests": single_stats["requests"],
+             "errors": single_stats["errors"], "payouts_per_sec": round(args.payouts / single_elapsed, 1),
+             "p50_ms": single_stats["p50_ms"], "p99_ms": single_stats["p99_ms"]},
+            {"mode": f"batch({args.batch_size})", "payouts": batches * args.batch_size,
+             "requests": batch_stats["requests"], "errors": batch_stats["errors"],
+             "payouts_per_sec": round(batches * args.batch_size / batch_elapsed, 1),
+             "p50_ms": batch_stats["p50_ms"], "p99_ms": batch_stats["p99_ms"]},
+        ]
+
+    rows = asyncio.run(run())
+    _support.print_table(rows, ["mode", "payouts", "requests", "errors", "payouts_per_sec", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""GET /api/payouts page cost for a user with a long history: ORM entities + pydantic vs rows + direct JSON.
+
+    python benchmarks/bench_payout_list.py [--database-url postgresql://...] [--payouts 100000] [--pages 500]
+
+"orm" is the handler as it was: pagination parsed by a class dependency (which FastAPI calls
+in the threadpool), full Payout entities into the session's identity map, a PaginatedPayouts
+model validated again by FastAPI against response_model, then JSONResponse. It is mounted
+next to the real route for the run. "rows" is the current route: a query-parameter model,
+column-only rows and JSON bytes encoded straight from them. Both are timed per page (limit=50, random offsets) over
+HTTP, then without HTTP with tracemalloc on for the peak memory one page allocates.
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+import _support
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--payouts", type=int, default=100000)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--max-offset", type=int, default=1000)
+    args = parser.parse_args()
+
+    _support.configure_env(args.database_url, OUTBOX_DISPATCHER_ENABLED="false")
+
+    import httpx
+    from fastapi import Depends
+
+    from app.db import database
+    from app.main import app
+    from app.models import models
+    from app.routes.payouts import encode_cursor
+    from app.schemas import schemas, serializers
+    from app.services import crud, user_service
+
+    user, _ = _support.seed_user(args.payouts)
+    _support.override_current_user(app, user)
+
+    def orm_page(db, offset: int):
+        total = crud.get_payout_total(db, user.id)
+        payouts = (
+            db.query(models.Payout).filter(models.Payout.user_id == user.id)
+            .order_by(models.Payout.id.desc()).offset(offset).limit(args.limit).all()
+        )
+        return payouts, total
+
+    @app.get("/bench/orm-payouts", response_model=schemas.PaginatedPayouts)
+    async def orm_payouts(pagination: schemas.PaginationRequest = Depends(),
+                          current_user=Depends(user_service.get_current_user), db=Depends(database.get_session)):
+        offset = pagination.offset
+        payouts, total = await database.run_db(db, orm_page, offset)
+        has_more = offset + len(payouts) < total
+        return schemas.PaginatedPayouts(
+            payouts=payouts,
+            pagination=schemas.PaginationResponse(
+                total=total, current_offset=offset, has_more=has_more,
+                next_cursor=encode_cursor(payouts[-1].id) if has_more and payouts else None,
+            ),
+        )
+
+    offsets = [random.Random(42).randrange(0, args.max_offset) for _ in range(args.pages)]
+
+    async def http_latency(path: str, client) -> dict:
+        latencies = []
+        started = time.perf_counter()
+        for offset in offsets:
+            request_started = time.perf_counter()
+            response = await client.get(path, params={"offset": offset, "limit": args.limit})
+            latencies.append(time.perf_counter() - request_started)
+            assert response.status_code == 200, response.text
+        return _support.summarize(latencies, time.perf_counter() - started)
+
+    async def run_http():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                orm_body = (await client.get("/bench/orm-payouts", params={"offset": 7, "limit": args.limit})).json()
+                rows_body = (await client.get("/api/payouts/", params={"offset": 7, "limit": args.limit})).json()
+                assert orm_body == rows_body, f"the two paths must return the same JSON:\n{orm_body}\n{rows_body}"
+                rows = await http_latency("/api/payouts/", client)
+                orm = await http_latency("/bench/orm-payouts", client)
+                return {"orm": orm, "rows": rows}
+
+    http = asyncio.run(run_http())
+
+    # The same work without HTTP: query + build + encode one page, under tracemalloc.
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    def orm_encode(db, offset):
+        payouts, total = orm_page(db, offset)
+        page = schemas.PaginatedPayouts(
+            payouts=payouts,
+            pagination=schemas.PaginationResponse(total=total, current_offset=offset, has_more=True),
+        )
+        revalidated = schemas.PaginatedPayouts.model_validate(page.model_dump())
+        return JSONResponse(jsonable_encoder(revalidated)).body
+
+    def rows_encode(db, offset):
+        payouts, total = crud.get_payouts_by_user_paginated(db, user.id, offset, args.limit)
+        return serializers.paginated_payouts(payouts, total, offset, True, None)
+
+    def page_cost(encode) -> dict:
+        db = database.SessionLocal()
+        try:
+            encode(db, 0)
+            started = time.perf_counter()
+            for offset in offsets:
+                encode(db, offset)
+            seconds = (time.perf_counter() - started) / len(offsets)
+
+            peaks = []
+            tracemalloc.start()
+            for offset in offsets[:50]:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                encode(db, offset)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            tracemalloc.stop()
+            return {"ms_per_page": round(seconds * 1000, 3), "peak_kib_per_page": round(sum(peaks) / len(peaks) / 1024, 1)}
+        finally:
+            db.close()
+
+    in_process = {"orm": page_cost(orm_encode), "rows": page_cost(rows_encode)}
+
+    rows = []
+    for name in ("orm", "rows"):
+        rows.append({
+            "path": name,
+            "http_mean_ms": http[name]["mean_ms"],
+            "http_p50_ms": http[name]["p50_ms"],
+            "http_p99_ms": http[name]["p99_ms"],
+            **in_process[name],
+        })
+    print(f"{args.payouts} payouts, limit={args.limit}, {args.pages} pages at offsets < {args.max_offset}")
+    _support.print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
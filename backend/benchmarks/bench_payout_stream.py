@@ -0,0 +1,114 @@
+"""Load test for GET /api/payouts/stream with thousands of idle SSE subscribers.
+
+    python benchmarks/bench_payout_stream.py [--subscribers 2000] [--events 20] [--idle-seconds 10]
+
+Runs uvicorn in-process, opens the streams, then reports memory per subscriber, CPU used while
+idle (heartbeats only) and the time for one published event to reach every subscriber. Client and
+server share the process, so the per-subscriber memory figure is an upper bound for the server.
+"""
+import argparse
+import asyncio
+import resource
+import time
+
+import _support
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--idle-seconds", type=float, default=10)
+    parser.add_argument("--heartbeat", type=float, default=2)
+    parser.add_argument("--port", type=int, default=8791)
+    args = parser.parse_args()
+
+    _support.configure_env(None, OUTBOX_DISPATCHER_ENABLED="false", PAYOUT_EVENTS_HEARTBEAT_SECONDS=args.heartbeat)
+
+    import httpx
+    import uvicorn
+    from app.main import app
+    from app.services.payout_events import hub
+
+    user, _ = _support.seed_user(0)
+    _support.override_current_user(app, user)
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning", lifespan="on"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        limits = httpx.Limits(max_connections=args.subscribers, max_keepalive_connections=0)
+        received = [0] * args.subscribers
+        heartbeats = [0] * args.subscribers
+        ready = asyncio.Event()
+        connected = 0
+
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=None) as client:
+            async def subscriber(i):
+                nonlocal connected
+                async with client.stream("GET", "/api/payouts/stream") as response:
+                    connected += 1
+                    if connected == args.subscribers:
+                        ready.set()
+                    async for line in response.aiter_lines():
+                        if line.startswith("data:"):
+                            received[i] += 1
+                        elif line.startswith(": heartbeat"):
+                            heartbeats[i] += 1
+
+            rss_before = rss_mb()
+            started = time.perf_counter()
+            tasks = [asyncio.create_task(subscriber(i)) for i in range(args.subscribers)]
+            await asyncio.wait_for(ready.wait(), timeout=120)
+            while hub.subscriber_count() < args.subscribers:
+                await asyncio.sleep(0.01)
+            connect_seconds = time.perf_counter() - started
+            rss_after = rss_mb()
+
+            cpu_started = time.process_time()
+            await asyncio.sleep(args.idle_seconds)
+            idle_cpu = time.process_time() - cpu_started
+
+            fanout_ms = []
+            for n in range(args.events):
+                target = n + 1
+                started = time.perf_counter()
+                await hub.publish({"type": "payout.status", "user_id": user.id, "payout": {"id": n, "status": "PAID"}})
+                while min(received) < target:
+                    await asyncio.sleep(0.001)
+                fanout_ms.append((time.perf_counter() - started) * 1000)
+
+            server.should_exit = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await server_task
+
+        fanout_ms.sort()
+        return {
+            "subscribers": args.subscribers,
+            "connect_seconds": round(connect_seconds, 2),
+            "rss_mb_total": round(rss_after - rss_before, 1),
+            "rss_kb_per_subscriber": round((rss_after - rss_before) * 1024 / args.subscribers, 1),
+            "idle_cpu_pct": round(idle_cpu / args.idle_seconds * 100, 1),
+            "heartbeats_per_subscriber": round(sum(heartbeats) / args.subscribers, 1),
+            "fanout_p50_ms": round(fanout_ms[len(fanout_ms) // 2], 1),
+            "fanout_max_ms": round(fanout_ms[-1], 1),
+        }
+
+    result = asyncio.run(run())
+    _support.print_table([result], list(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Payout delivery through a payments provider outage, with and without the circuit breaker.
+
+    python benchmarks/bench_provider_outage.py [--rate 20] [--healthy 3] [--outage 10] [--outage-mode hang]
+
+Payouts are created at --rate per second while the outbox dispatcher sends them to a stub
+provider. The stub answers after --provider-delay-ms for --healthy seconds, then fails for
+--outage seconds ("hang": never answers; "error": 503 at once), then recovers. Creation stops
+when the outage ends, and the run lasts until the outbox is empty.
+
+"fixed" is provider access as it was: 10 concurrent requests, one 5 s attempt per call, no
+breaker. "guarded" is provider_client with its defaults. Reported per case: provider requests
+that arrived during the outage, seconds spent in provider calls then (summed over concurrent
+calls), outbox attempts used up (retries, payouts given up), payouts deferred while the
+circuit was open, and how long after recovery the outbox was empty.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _support
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 65536
+    delay = 0.0
+    mode = "healthy"
+    outage_requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if StubProvider.mode != "healthy":
+            with StubProvider.lock:
+                StubProvider.outage_requests += 1
+            if StubProvider.mode == "hang":
+                while StubProvider.mode == "hang":
+                    time.sleep(0.05)
+            else:
+                self._reply(503, {"detail": "Provider unavailable"})
+                return
+        time.sleep(self.delay)
+        if self.path.endswith("/batch"):
+            body = {"results": [{"payout": {"payout_id": p["idempotency_key"]}} for p in payload["payouts"]]}
+        else:
+            body = {"payout_id": payload["idempotency_key"]}
+        self._reply(200, body)
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20)
+    parser.add_argument("--healthy", type=float, default=3)
+    parser.add_argument("--outage", type=float, default=10)
+    parser.add_argument("--outage-mode", choices=["hang", "error"], default="hang")
+    parser.add_argument("--provider-delay-ms", type=float, default=20)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    StubProvider.delay = args.provider_delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _support.configure_env(
+        None, LOG_LEVEL="CRITICAL", HTTP2_ENABLED="false", OUTBOX_POLL_INTERVAL="0.2",
+        MOCK_PAYMENTS_URL=f"http://127.0.0.1:{server.server_address[1]}",
+    )
+
+    from app.config.config import config
+    from app.db import database
+    from app.schemas import schemas
+    from app.services import crud, http_client, provider_client
+    from app.services.outbox_dispatcher import dispatcher
+    from app.services.provider_client import provider
+
+    user, _ = _support.seed_user(0)
+
+    def configure(case: str) -> None:
+        if case == "fixed":
+            provider.breaker = provider_client.CircuitBreaker(10 ** 9, 1, 1)
+            provider.limit = provider_client.AdaptiveLimit(10, 10, 10, float("inf"), 1)
+            provider.attempt_timeout = provider.call_deadline = config.MOCK_PAYMENTS_HTTP_TIMEOUT
+            provider.max_attempts = 1
+        else:
+            provider.breaker = provider_client.CircuitBreaker(
+                config.PROVIDER_BREAKER_FAILURES, config.PROVIDER_BREAKER_OPEN_SECONDS,
+                config.PROVIDER_BREAKER_MAX_OPEN_SECONDS)
+            provider.limit = provider_client.AdaptiveLimit(
+                config.PROVIDER_CONCURRENCY_INITIAL, config.PROVIDER_CONCURRENCY_MIN, config.PROVIDER_CONCURRENCY_MAX,
+                config.PROVIDER_LATENCY_TOLERANCE, config.PROVIDER_LIMIT_BACKOFF)
+            provider.attempt_timeout = config.PROVIDER_ATTEMPT_TIMEOUT
+            provider.call_deadline = config.PROVIDER_CALL_DEADLINE
+            provider.max_attempts = config.PROVIDER_MAX_ATTEMPTS
+
+    def create_payout(db) -> None:
+        payout = schemas.PayoutCreate(amount=Decimal("10.00"), currency="USD", idempotency_key=str(uuid.uuid4()))
+        crud.create_payout_for_user(db, payout, user.id)
+
+    async def run(case: str) -> dict:
+        configure(case)
+        StubProvider.mode, StubProvider.outage_requests = "healthy", 0
+        baseline = dict(dispatcher.stats())
+        waited = 0.0
+        original_post = provider.post
+
+        async def timed_post(path, json, size=1):
+            nonlocal waited
+            started = time.monotonic()
+            try:
+                return await original_post(path, json, size)
+            finally:
+                if StubProvider.mode != "healthy":
+                    waited += time.monotonic() - started
+
+        provider.post = timed_post
+        dispatcher.start()
+        started = time.monotonic()
+        created = 0
+        try:
+            while time.monotonic() - started < args.healthy + args.outage:
+                elapsed = time.monotonic() - started
+                if elapsed >= args.healthy and StubProvider.mode == "healthy":
+                    StubProvider.mode = args.outage_mode
+                if created < elapsed * args.rate:
+                    await database.run_in_session(create_payout)
+                    created += 1
+                    dispatcher.notify()
+                else:
+                    await asyncio.sleep(0.01)
+            StubProvider.mode = "healthy"
+            recovered = time.monotonic()
+            while await database.run_in_session(crud.count_pending_outbox):
+                if time.monotonic() - recovered > args.drain_timeout:
+                    break
+                await asyncio.sleep(0.1)
+            drained_after = time.monotonic() - recovered
+        finally:
+            await dispatcher.stop()
+            del provider.post
+        stats = dispatcher.stats()
+        return {
+            "case": case,
+            "payouts": created,
+            "outage_requests": StubProvider.outage_requests,
+            "waited_s": round(waited, 1),
+            "retries": stats["retried"] - baseline["retried"],
+            "gave_up": stats["failed"] - baseline["failed"],
+            "deferred": stats["deferred"] - baseline["deferred"],
+            "pending_left": await database.run_in_session(crud.count_pending_outbox),
+            "drained_after_s": round(drained_after, 1),
+            "circuit_opened": provider.breaker.transitions[provider_client.OPEN],
+        }
+
+    async def run_all() -> list:
+        rows = [await run("fixed"), await run("guarded")]
+        await http_client.close_clients()
+        return rows
+
+    rows = asyncio.run(run_all())
+    StubProvider.mode = "healthy"
+    server.shutdown()
+    print(f"{args.rate} payouts/s; provider healthy {args.healthy}s, then {args.outage_mode} for {args.outage}s")
+    _support.print_table(rows, ["case", "payouts", "outage_requests", "waited_s", "retries", "gave_up", "deferred",
+                                "pending_left", "drained_after_s", "circuit_opened"])
+
+
+if __name__ == "__main__":
+    main()
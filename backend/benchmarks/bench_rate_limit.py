@@ -0,0 +1,138 @@
+"""Cost of admission control per request, and what it does under overload.
+
+    python benchmarks/bench_rate_limit.py [--calls 20000] [--redis-url redis://localhost:6379/0]
+                                          [--requests 3000] [--rate 1000] [--work-ms 50]
+
+Overhead: RateLimitMiddleware around an ASGI app that answers at once, µs per request, for a
+request the limiter skips (/metrics), one only counted against the concurrency limit, one
+checked against its client address's bucket, and one with a session cookie checked against
+both the user's and the address's bucket. With --redis-url the last is repeated with the
+buckets in Redis, which adds a round trip.
+
+Overload: --requests requests arriving at --rate per second, whatever the answers, to a route
+that holds a threadpool thread for --work-ms (standing in for a database query), through the
+full app. The default rate is more than the 40 threadpool threads can serve. "unlimited" lets
+every request queue for a thread; "limited" caps reads in flight at --reads-limit and sheds the
+rest with 503. Latency is reported separately for admitted and shed requests.
+"""
+import argparse
+import asyncio
+import time
+
+import _support
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--work-ms", type=float, default=50)
+    parser.add_argument("--reads-limit", type=int, default=40)
+    args = parser.parse_args()
+
+    _support.configure_env(
+        args.database_url, OUTBOX_DISPATCHER_ENABLED="false", LOG_LEVEL="ERROR", RATE_LIMIT_ENABLED="true",
+        # High enough that every request in the benchmark is admitted by the buckets.
+        RATE_LIMIT_USER="reads=1000000:1000000", RATE_LIMIT_IP="reads=1000000:1000000",
+    )
+
+    import httpx
+    from starlette.concurrency import run_in_threadpool
+
+    from app.main import app
+    from app.services import rate_limit
+    from app.services.session_tokens import session_tokens
+
+    async def instant(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def per_call(middleware, path: str, headers=()) -> float:
+        scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers), "client": ("10.0.0.1", 5000)}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            pass
+
+        for _ in range(100):
+            await middleware(scope, receive, send)
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            await middleware(scope, receive, send)
+        return round((time.perf_counter() - started) / args.calls * 1e6, 2)
+
+    def limiter(buckets, user=True, ip=True) -> rate_limit.RateLimiter:
+        rates = {rate_limit.READS: (1e6, 1e6)}
+        return rate_limit.RateLimiter(buckets, rates if user else {}, rates if ip else {}, {rate_limit.READS: 1000})
+
+    async def overhead() -> list:
+        cookie = [(b"cookie", f"access_token={session_tokens.issue(1)}".encode())]
+        memory = rate_limit.MemoryBuckets(100000, 1)
+        rows = [
+            {"case": "no middleware", "us_per_request": await per_call(instant, "/api/currency/")},
+            {"case": "skipped path", "us_per_request":
+                await per_call(rate_limit.RateLimitMiddleware(instant, limiter(memory)), "/metrics")},
+            {"case": "concurrency only", "us_per_request":
+                await per_call(rate_limit.RateLimitMiddleware(instant, limiter(memory, False, False)), "/api/currency/")},
+            {"case": "memory, ip bucket", "us_per_request":
+                await per_call(rate_limit.RateLimitMiddleware(instant, limiter(memory)), "/api/currency/")},
+            {"case": "memory, user + ip buckets", "us_per_request":
+                await per_call(rate_limit.RateLimitMiddleware(instant, limiter(memory)), "/api/currency/", cookie)},
+        ]
+        if args.redis_url:
+            redis_buckets = rate_limit.RedisBuckets(args.redis_url, timeout=1)
+            rows.append({"case": "redis, user + ip buckets", "us_per_request":
+                         await per_call(rate_limit.RateLimitMiddleware(instant, limiter(redis_buckets)),
+                                        "/api/currency/", cookie)})
+            await redis_buckets.close()
+        return rows
+
+    @app.get("/api/bench/work")
+    async def work():
+        await run_in_threadpool(time.sleep, args.work_ms / 1000)
+        return {"ok": True}
+
+    async def overload() -> list:
+        rows = []
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for case, limit in (("unlimited", None), ("limited", args.reads_limit)):
+                    rate_limit.rate_limiter.concurrency = {} if limit is None else {rate_limit.READS: limit}
+                    latencies = {200: [], 503: []}
+
+                    async def send():
+                        started = time.perf_counter()
+                        response = await client.get("/api/bench/work")
+                        latencies.setdefault(response.status_code, []).append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    requests = []
+                    for i in range(args.requests):
+                        delay = started + i / args.rate - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        requests.append(asyncio.create_task(send()))
+                    await asyncio.gather(*requests)
+                    elapsed = time.perf_counter() - started
+                    for status, outcome in ((200, "admitted"), (503, "shed")):
+                        rows.append({"case": case, "outcome": outcome, **_support.summarize(latencies[status], elapsed)})
+        return rows
+
+    overhead_rows = asyncio.run(overhead())
+    overload_rows = asyncio.run(overload())
+
+    print(f"overhead, {args.calls} requests per case")
+    _support.print_table(overhead_rows, ["case", "us_per_request"])
+    print()
+    print(f"overload: {args.requests} requests offered at {args.rate}/s, {args.work_ms} ms of threadpool work each")
+    _support.print_table(overload_rows, ["case", "outcome", "requests", "rps", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
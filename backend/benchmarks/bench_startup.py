@@ -0,0 +1,118 @@
+"""Backend startup: import time and time to first request, per worker count.
+
+    python benchmarks/bench_startup.py [--runs 5] [--workers 1 4] [--database-url URL]
+
+"import" is `import app.main` in a fresh interpreter. "import + create_all" adds what every
+worker used to do at import before migrations: build the engine, connect and check each
+table. "first request" is from spawning uvicorn to the first 200 from GET /, so it includes
+the interpreter, the imports, the lifespan hook and, with --workers > 1, the process manager.
+"migrate" is the one-off `python -m app.manage migrate` a deploy now runs instead.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import _support
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+if {create_all}:
+    from app.db import database
+    database.Base.metadata.create_all(bind=database.get_engine())
+print(imported - started, time.perf_counter() - started)
+"""
+
+
+def child_env(database_url: str) -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(_support.REPO_DIR), str(_support.BACKEND_DIR)]),
+        "DATABASE_URL": database_url,
+        "SESSION_SECRET_KEY": "benchmark",
+        "SESSION_TOKEN_SECRET": "benchmark-session-tokens",
+        "SHARED_CALLBACK_SECRET": _support.WEBHOOK_SECRET,
+        "MOCK_PAYMENTS_URL": "http://127.0.0.1:9",
+        "OUTBOX_DISPATCHER_ENABLED": "false",
+    }
+
+
+def time_migrate(env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "app.manage", "migrate"], cwd=_support.BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def time_import(env: dict, create_all: bool) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(create_all=create_all)],
+                            cwd=_support.BACKEND_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    return float(output.split()[1])
+
+
+def time_first_request(env: dict, workers: int, port: int, timeout: float = 60) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=_support.BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    time.sleep(0.005)
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+
+def summarize(name: str, samples) -> dict:
+    return {
+        "phase": name,
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--database-url", default=None, help="Defaults to a fresh SQLite file")
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='fintech-startup-')}/bench.db"
+    env = child_env(database_url)
+
+    rows = [summarize("migrate", [time_migrate(env)])]
+    # The first interpreter run warms the bytecode and filesystem caches; it is not counted.
+    time_import(env, create_all=False)
+    rows.append(summarize("import", [time_import(env, create_all=False) for _ in range(args.runs)]))
+    rows.append(summarize("import + create_all (before)", [time_import(env, create_all=True) for _ in range(args.runs)]))
+    for workers in args.workers:
+        samples = [time_first_request(env, workers, args.port) for _ in range(args.runs)]
+        rows.append(summarize(f"first request, {workers} worker{'s' if workers > 1 else ''}", samples))
+
+    _support.print_table(rows, ["phase", "runs", "median_ms", "min_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Stale-timestamp webhooks against a slow provider: resend inline vs through resend_queue.
+
+    python benchmarks/bench_webhook_resend.py [--webhooks 400] [--payouts 20] [--provider-delay-ms 200]
+
+Every webhook is signed but too old, so the backend asks the provider (a stub counting
+/mock/resend calls, answering after --provider-delay-ms) to send it again. --webhooks are
+spread over --payouts payouts, each with its own request_id, as the provider's retries of a
+skewed clock would be. "inline" is the handler as it was: the resend awaited before
+answering, once per webhook. "queued" is the current route. Reported: webhook latency, the
+resend calls the provider received and, for the queue, how long it took to drain.
+"""
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _support
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    delay = 0.0
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with StubProvider.lock:
+            StubProvider.calls += 1
+        time.sleep(self.delay)
+        body = b'{"message": "Webhook resend scheduled"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--webhooks", type=int, default=400)
+    parser.add_argument("--payouts", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--provider-delay-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    StubProvider.delay = args.provider_delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _support.configure_env(
+        None, OUTBOX_DISPATCHER_ENABLED="false", LOG_LEVEL="ERROR", HTTP2_ENABLED="false",
+        MOCK_PAYMENTS_URL=f"http://127.0.0.1:{server.server_address[1]}",
+    )
+
+    import httpx
+    from fastapi import Request
+
+    from app.config.config import config
+    from app.main import app
+    from app.schemas import schemas
+    from app.services import payment_service, retry_store
+    from app.services.resend_queue import resend_queue
+
+    @app.post("/bench/inline-resend")
+    async def inline_resend(payload: schemas.WebhookPayload, request: Request):
+        valid, old = payment_service.verify_webhook(
+            await request.body(), request.headers["X-Mock-Signature"], payload.timestamp
+        )
+        assert valid and old
+        attempts = await retry_store.resend_attempts.increment(f"{payload.request_id}:{payload.payout_id}")
+        if attempts <= config.MAX_TIMESTAMP_RETRIES:
+            try:
+                await payment_service.request_webhook_resend(payload.payout_id, payload.request_id)
+            except httpx.HTTPError:
+                pass
+        return {"message": "Webhook too old, requested resend"}
+
+    stale = int(time.time()) - 3600
+
+    def webhook(run: str, i: int):
+        return _support.sign_webhook({
+            "payout_id": i % args.payouts + 1, "new_status": "PAID", "request_id": f"{run}-{i}", "timestamp": stale,
+        })
+
+    async def run(path: str, name: str) -> dict:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                async def send(i):
+                    body, headers = webhook(name, i)
+                    response = await client.post(path, content=body, headers=headers)
+                    return response.status_code == 200
+
+                calls_before = StubProvider.calls
+                load = await _support.run_load(send, args.webhooks, args.concurrency)
+                started = time.perf_counter()
+                while resend_queue.depth or resend_queue.in_flight:
+                    await asyncio.sleep(0.01)
+                return {
+                    "path": name,
+                    "errors": load["errors"],
+                    "webhook_p50_ms": load["p50_ms"],
+                    "webhook_p99_ms": load["p99_ms"],
+                    "webhooks_per_s": load["rps"],
+                    "provider_calls": StubProvider.calls - calls_before,
+                    "drain_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
+
+    rows = [asyncio.run(run("/bench/inline-resend", "inline"))]
+    rows.append(asyncio.run(run("/api/webhooks/payments", "queued")))
+    server.shutdown()
+
+    print(f"{args.webhooks} stale webhooks over {args.payouts} payouts, concurrency {args.concurrency},"
+          f" provider answering in {args.provider_delay_ms} ms")
+    _support.print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Webhook signature verifications and signings per second, before and after raw-body signing.
+
+    python benchmarks/bench_webhook_signing.py [--seconds 1] [--secrets 3]
+
+"legacy" is what both services did before: re-serialize the parsed payload with sorted keys
+and build a fresh HMAC from the secret string on every call. "raw" is shared.signing: one
+HMAC over the received bytes, from a precomputed keyed state. With --secrets N the matching
+secret is the last one tried, the worst case while rotating.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import _support
+
+from shared import signing
+
+SECRET = "benchmark-secret"
+
+
+def legacy_verify(payload: dict, signature: str) -> bool:
+    payload_bytes = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    expected_sig = hmac.new(SECRET.encode(), payload_bytes, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected_sig)
+
+
+def legacy_sign(payload: dict):
+    payload_with_ts = payload.copy()
+    payload_with_ts["timestamp"] = int(time.time())
+    payload_bytes = json.dumps(payload_with_ts, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hmac.new(SECRET.encode('utf-8'), payload_bytes, hashlib.sha256).hexdigest(), payload_with_ts
+
+
+def per_second(fn, seconds: float) -> float:
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            fn()
+        calls += 1000
+    return calls / (time.perf_counter() - started)
+
+
+def event(i: int) -> dict:
+    return {"payout_id": i, "new_status": "PAID", "request_id": str(uuid.uuid4()), "timestamp": int(time.time())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--secrets", type=int, default=3)
+    args = parser.parse_args()
+
+    single = signing.WebhookSigner([SECRET])
+    rotating = signing.WebhookSigner([f"old-secret-{i}" for i in range(args.secrets - 1)] + [SECRET])
+
+    rows = []
+    for name, payload in (("single", event(1)), ("batch of 100", {"events": [{"payload": event(i)} for i in range(100)]})):
+        body = signing.dumps(payload)
+        signature = single.sign(body)
+        legacy_signature = hmac.new(
+            SECRET.encode(), json.dumps(payload, sort_keys=True, separators=(',', ':')).encode(), hashlib.sha256
+        ).hexdigest()
+        assert legacy_verify(payload, legacy_signature) and single.verify(body, signature)
+        assert rotating.verify(body, signature)
+
+        legacy = per_second(lambda: legacy_verify(payload, legacy_signature), args.seconds)
+        raw = per_second(lambda: single.verify(body, signature), args.seconds)
+        rotated = per_second(lambda: rotating.verify(body, signature), args.seconds)
+        rows.append({
+            "payload": name,
+            "bytes": len(body),
+            "legacy_verify/s": round(legacy),
+            "raw_verify/s": round(raw),
+            f"raw_{args.secrets}_secrets/s": round(rotated),
+            "speedup": f"{raw / legacy:.1f}x",
+        })
+    _support.print_table(rows, list(rows[0]))
+    print()
+
+    payload = {"events": [{"payload": event(i)} for i in range(100)]}
+    sign_rows = [{"signer": "legacy", "batch_of_100_signs/s": round(per_second(lambda: legacy_sign(payload), args.seconds))}]
+    fast = signing.orjson
+    for encoder, module in (("json", None), ("orjson", fast)):
+        if encoder == "orjson" and fast is None:
+            sign_rows.append({"signer": "raw, orjson", "batch_of_100_signs/s": "not installed"})
+            continue
+        signing.orjson = module
+        sign_rows.append({
+            "signer": f"raw, {encoder}",
+            "batch_of_100_signs/s": round(per_second(lambda: single.sign_payload(payload), args.seconds)),
+        })
+    signing.orjson = fast
+    _support.print_table(sign_rows, list(sign_rows[0]))
+
+
+if __name__ == "__main__":
+    main()
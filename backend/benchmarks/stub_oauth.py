@@ -0,0 +1,39 @@
+"""Stand-in for Google's userinfo endpoint, so benchmarks can authenticate without real tokens.
+
+    uvicorn stub_oauth:app --port 8601
+
+Any bearer token starting with "bench-" is accepted and maps to a stable profile; point the
+backend's GOOGLE_USERINFO_URL at /userinfo. STUB_USERINFO_LATENCY_MS adds a fixed delay.
+"""
+import asyncio
+import os
+
+from fastapi import FastAPI, Header, HTTPException
+
+LATENCY = float(os.getenv("STUB_USERINFO_LATENCY_MS", 0)) / 1000
+
+app = FastAPI(title="Benchmark OAuth stub")
+calls = 0
+
+
+@app.get("/userinfo")
+async def userinfo(authorization: str = Header(None)):
+    global calls
+    calls += 1
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+    token = (authorization or "").removeprefix("Bearer ")
+    if not token.startswith("bench-"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {
+        "sub": token,
+        "email": f"{token}@bench.example.com",
+        "name": token,
+        "picture": None,
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {"userinfo_calls": calls}
@@ -0,0 +1,56 @@
+from logging.config import fileConfig
+
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+
+load_dotenv()
+
+from app.db import database
+from app.models import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = database.Base.metadata
+
+
+def _url() -> str:
+    url = config.get_main_option("sqlalchemy.url") or database.DATABASE_URL
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set")
+    return url
+
+
+def _configure(**kwargs) -> None:
+    # Batch mode lets ALTERs run on SQLite, which rebuilds the table instead.
+    context.configure(target_metadata=target_metadata, compare_type=True, render_as_batch=True, **kwargs)
+
+
+def run_migrations_offline() -> None:
+    _configure(url=_url(), literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    engine = create_engine(_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,72 @@
+"""initial schema
+
+The tables as Base.metadata.create_all built them before migrations existed, so databases
+created that way are stamped at this revision instead of upgraded (see app.db.migrations).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 14:16:00.756062
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Later revisions reuse payoutstatus, so the Postgres type is created and dropped explicitly.
+payout_status = postgresql.ENUM(
+    'INITIATED', 'PENDING', 'IN_TRANSIT', 'AUTHORIZED', 'EXECUTED', 'PAID', 'BOUNCED', 'BLOCKED', 'CANCELLED',
+    name='payoutstatus', create_type=False,
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    payout_status.create(bind, checkfirst=True)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('oauth_provider', sa.String(), nullable=False),
+    sa.Column('oauth_id', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('profile_pic_url', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_oauth_id', 'users', ['oauth_id'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    op.create_index('ix_users_oauth_id', 'users', ['oauth_id'], unique=True)
+
+    op.create_table('payouts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('status', payout_status, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('payouts')
+    op.drop_index('ix_users_oauth_id', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_oauth_id', table_name='users')
+    op.drop_table('users')
+
+    bind = op.get_bind()
+    payout_status.drop(bind, checkfirst=True)
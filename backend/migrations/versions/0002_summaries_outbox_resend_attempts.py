@@ -0,0 +1,86 @@
+"""payout summaries, outbox and resend attempts
+
+Adds what came after the create_all schema: the payout_summaries aggregate (filled from
+the payouts already there), the payout outbox, the shared webhook resend attempt store
+and the (user_id, id) index the payouts list pages on.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 14:16:00.756062
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# payoutstatus belongs to 0001; outboxstatus is created and dropped here.
+payout_status = postgresql.ENUM(
+    'INITIATED', 'PENDING', 'IN_TRANSIT', 'AUTHORIZED', 'EXECUTED', 'PAID', 'BOUNCED', 'BLOCKED', 'CANCELLED',
+    name='payoutstatus', create_type=False,
+)
+outbox_status = postgresql.ENUM('PENDING', 'FAILED', name='outboxstatus', create_type=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    outbox_status.create(bind, checkfirst=True)
+
+    op.create_index('ix_payouts_user_id_id', 'payouts', ['user_id', 'id'], unique=False)
+
+    op.create_table('payout_summaries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('status', payout_status, nullable=False),
+    sa.Column('payout_count', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=18, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'currency', 'status')
+    )
+    # Existing payouts are counted here; from now on crud keeps the summaries in step.
+    op.execute(
+        "INSERT INTO payout_summaries (user_id, currency, status, payout_count, total_amount) "
+        "SELECT user_id, currency, status, COUNT(id), SUM(amount) FROM payouts "
+        "GROUP BY user_id, currency, status"
+    )
+
+    op.create_table('payout_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('payout_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', outbox_status, nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['payout_id'], ['payouts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('payout_id')
+    )
+    op.create_index('ix_payout_outbox_status_next_attempt_at', 'payout_outbox', ['status', 'next_attempt_at'], unique=False)
+
+    op.create_table('webhook_resend_attempts',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_webhook_resend_attempts_expires_at', 'webhook_resend_attempts', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_resend_attempts_expires_at', table_name='webhook_resend_attempts')
+    op.drop_table('webhook_resend_attempts')
+    op.drop_index('ix_payout_outbox_status_next_attempt_at', table_name='payout_outbox')
+    op.drop_table('payout_outbox')
+    op.drop_table('payout_summaries')
+    op.drop_index('ix_payouts_user_id_id', table_name='payouts')
+
+    bind = op.get_bind()
+    outbox_status.drop(bind, checkfirst=True)
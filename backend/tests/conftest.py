@@ -0,0 +1,127 @@
+"""Fixtures shared by the backend tests.
+
+Tests run against a throwaway SQLite database built by the real migrations, with the app's
+background work (outbox dispatcher, rate limiting) switched off. The app reads its settings
+at import time, so they are set here before anything under app.* is imported.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REPO_DIR = BACKEND_DIR.parent
+for path in (REPO_DIR, BACKEND_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+WEBHOOK_SECRET = "test-webhook-secret"
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{tempfile.mkdtemp(prefix='fintech-tests-')}/test.db",
+    SESSION_SECRET_KEY="test-starlette-session-secret",
+    SESSION_TOKEN_SECRET="test-session-token-secret",
+    SHARED_CALLBACK_SECRET=WEBHOOK_SECRET,
+    MOCK_PAYMENTS_URL="http://127.0.0.1:9",
+    OUTBOX_DISPATCHER_ENABLED="false",
+    RATE_LIMIT_ENABLED="false",
+    LOG_LEVEL="WARNING",
+    LOG_FORMAT="text",
+)
+
+from shared.signing import SIGNATURE_HEADER, WebhookSigner, canonical_dumps  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    from app.db import migrations
+
+    migrations.upgrade()
+
+
+@pytest.fixture
+def db():
+    from app.db import database
+
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    return create_user(db)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app, base_url="https://testserver") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def create_user(db):
+    """A new user, detached from db."""
+    from app.models import models
+
+    user = models.User(oauth_provider="google", oauth_id=str(uuid.uuid4()), email=f"{uuid.uuid4()}@example.com")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.expunge(user)
+    return user
+
+
+def log_in(client, user) -> None:
+    """Send requests from client as user, with a session token cookie."""
+    from app.services.session_tokens import COOKIE_NAME, session_tokens
+
+    client.cookies.clear()
+    client.cookies.set(COOKIE_NAME, session_tokens.issue(user.id))
+
+
+def create_payout(db, user_id: int, status=None, amount: str = "10.00", currency: str = "USD") -> int:
+    """Insert a payout in status (PENDING by default) with its summary; returns its id."""
+    from app.models import models
+    from app.schemas import schemas
+    from app.services import crud
+
+    payout = schemas.PayoutCreate(amount=Decimal(amount), currency=currency, idempotency_key=str(uuid.uuid4()))
+    row, _ = crud.create_payout_for_user(db, payout, user_id)
+    if status is not None and status != models.PayoutStatus.PENDING:
+        db.execute(models.Payout.__table__.update().where(models.Payout.id == row.id).values(status=status))
+        db.commit()
+        crud.rebuild_payout_summaries(db)
+    return row.id
+
+
+def _webhook_payload(payout_id: int, new_status: str, request_id: str = None, timestamp: int = None) -> dict:
+    return {
+        "payout_id": payout_id,
+        "new_status": new_status,
+        "request_id": request_id or str(uuid.uuid4()),
+        "timestamp": int(time.time()) if timestamp is None else timestamp,
+    }
+
+
+def signed_webhook(payout_id: int, new_status: str, **fields):
+    """(body, headers) of a provider callback signed like the mock payments service signs them."""
+    body, signature = WebhookSigner([WEBHOOK_SECRET]).sign_payload(_webhook_payload(payout_id, new_status, **fields))
+    return body, {SIGNATURE_HEADER: signature, "Content-Type": "application/json"}
+
+
+def signed_batch_event(payout_id: int, new_status: str, **fields) -> dict:
+    """One event of a webhook batch, signed on its own over its canonical JSON."""
+    payload = _webhook_payload(payout_id, new_status, **fields)
+    return {"payload": payload, "signature": WebhookSigner([WEBHOOK_SECRET]).sign(canonical_dumps(payload))}
@@ -0,0 +1,69 @@
+from datetime import datetime
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.db import database, migrations
+from app.models import models
+from app.services import crud
+
+
+def _baseline_schema(engine) -> None:
+    """users and payouts as Base.metadata.create_all built them before there were migrations."""
+    metadata = sa.MetaData()
+    sa.Table("users", metadata,
+             sa.Column("id", sa.Integer, primary_key=True, index=True),
+             sa.Column("oauth_provider", sa.String, nullable=False),
+             sa.Column("oauth_id", sa.String, nullable=False, unique=True, index=True),
+             sa.Column("email", sa.String, nullable=True, unique=True, index=True),
+             sa.Column("full_name", sa.String),
+             sa.Column("profile_pic_url", sa.String),
+             sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+             sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()))
+    sa.Table("payouts", metadata,
+             sa.Column("id", sa.Integer, primary_key=True),
+             sa.Column("amount", sa.Numeric(18, 2), nullable=False),
+             sa.Column("date", sa.DateTime, nullable=False),
+             sa.Column("currency", sa.String, nullable=False),
+             sa.Column("status", sa.String, nullable=False),
+             sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+             sa.Column("idempotency_key", sa.String, nullable=False, unique=True))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(metadata.tables["users"].insert(), [
+            {"id": 1, "oauth_provider": "google", "oauth_id": "a"},
+            {"id": 2, "oauth_provider": "google", "oauth_id": "b"},
+        ])
+        connection.execute(metadata.tables["payouts"].insert(), [
+            {"amount": amount, "date": datetime(2026, 1, 1), "currency": currency, "status": status, "user_id": user_id,
+             "idempotency_key": f"key-{i}"}
+            for i, (user_id, amount, currency, status) in enumerate([
+                (1, Decimal("10.00"), "USD", "PAID"),
+                (1, Decimal("2.50"), "USD", "PAID"),
+                (1, Decimal("7.00"), "EUR", "PENDING"),
+                (2, Decimal("1.00"), "USD", "PAID"),
+            ])
+        ])
+
+
+def test_create_all_database_is_adopted_and_upgraded_with_its_payouts_summarised(tmp_path, monkeypatch):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    _baseline_schema(engine)
+    monkeypatch.setattr(database, "get_engine", lambda: engine)
+
+    assert migrations.upgrade() == migrations.head_revision()
+
+    tables = set(inspect(engine).get_table_names())
+    assert {"payout_summaries", "payout_outbox", "webhook_resend_attempts"} <= tables
+    assert "ix_payouts_user_id_id" in {index["name"] for index in inspect(engine).get_indexes("payouts")}
+    with Session(engine) as db:
+        buckets = {(bucket.status, bucket.currency): (bucket.payout_count, bucket.total_amount)
+                   for bucket in crud.get_payout_summary(db, 1)}
+        assert buckets == {
+            (models.PayoutStatus.PAID, "USD"): (2, Decimal("12.50")),
+            (models.PayoutStatus.PENDING, "EUR"): (1, Decimal("7.00")),
+        }
+        assert crud.check_payout_summaries(db) == []
+    engine.dispose()
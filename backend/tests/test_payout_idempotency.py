@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db import database
+from app.models import models
+from app.schemas import schemas
+from app.services import idempotency
+
+from conftest import create_user, log_in
+
+
+@pytest.fixture(params=["cached", "from database"])
+def lookup(request):
+    """Replays are answered from the idempotency cache, or read back once it has forgotten the key."""
+    def forget():
+        if request.param == "from database":
+            idempotency.payouts_by_key.clear()
+    return forget
+
+
+def _payout(key, amount="25.00", currency="USD"):
+    return {"amount": amount, "currency": currency, "idempotency_key": key}
+
+
+def _count(db, model, **filters):
+    db.expire_all()
+    return db.execute(select(func.count()).select_from(model).filter_by(**filters)).scalar()
+
+
+def test_first_create_stores_the_payout_and_its_outbox_row(client, db, user):
+    log_in(client, user)
+    key = str(uuid.uuid4())
+
+    response = client.post("/api/payouts/", json=_payout(key))
+
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+    assert response.json()["status"] == "PENDING"
+    assert Decimal(str(response.json()["amount"])) == Decimal("25.00")
+    assert _count(db, models.Payout, idempotency_key=key) == 1
+    assert _count(db, models.PayoutOutbox, payout_id=response.json()["id"]) == 1
+
+
+def test_retry_replays_the_same_payout(client, db, user, lookup):
+    log_in(client, user)
+    key = str(uuid.uuid4())
+    first = client.post("/api/payouts/", json=_payout(key))
+    lookup()
+
+    retry = client.post("/api/payouts/", json=_payout(key))
+
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+    assert _count(db, models.Payout, idempotency_key=key) == 1
+    assert _count(db, models.PayoutOutbox, payout_id=first.json()["id"]) == 1
+
+
+def test_amount_differing_only_below_a_cent_is_a_replay(client, user):
+    log_in(client, user)
+    key = str(uuid.uuid4())
+    first = client.post("/api/payouts/", json=_payout(key, amount="25.00"))
+
+    retry = client.post("/api/payouts/", json=_payout(key, amount="25.001"))
+
+    assert retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+
+
+@pytest.mark.parametrize("changed", [{"amount": "26.00"}, {"currency": "EUR"}])
+def test_key_reused_for_a_different_payout_is_rejected(client, db, user, lookup, changed):
+    log_in(client, user)
+    key = str(uuid.uuid4())
+    client.post("/api/payouts/", json=_payout(key))
+    lookup()
+
+    response = client.post("/api/payouts/", json={**_payout(key), **changed})
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "idempotency_key was already used for a different payout"
+    assert _count(db, models.Payout, idempotency_key=key) == 1
+
+
+def test_another_users_key_is_rejected(client, db, user, lookup):
+    key = str(uuid.uuid4())
+    log_in(client, user)
+    first = client.post("/api/payouts/", json=_payout(key))
+    lookup()
+
+    log_in(client, create_user(db))
+    response = client.post("/api/payouts/", json=_payout(key))
+
+    assert response.status_code == 400
+    assert "Idempotent-Replayed" not in response.headers
+    assert _count(db, models.Payout, idempotency_key=key) == 1
+    assert _count(db, models.Payout, id=first.json()["id"], user_id=user.id) == 1
+
+
+def test_concurrent_retries_share_one_insert(db, user):
+    payout = schemas.PayoutCreate(**_payout(str(uuid.uuid4())))
+    shared_before = idempotency.create_flight.shared
+
+    async def create_twice():
+        sessions = [database.SessionLocal(), database.SessionLocal()]
+        try:
+            return await asyncio.gather(*(idempotency.create_payout(s, payout, user.id) for s in sessions))
+        finally:
+            for session in sessions:
+                session.close()
+
+    (first, first_created), (second, second_created) = asyncio.run(create_twice())
+
+    assert first.id == second.id
+    assert sorted([first_created, second_created]) == [False, True]
+    assert idempotency.create_flight.shared == shared_before + 1
+    assert _count(db, models.Payout, idempotency_key=payout.idempotency_key) == 1
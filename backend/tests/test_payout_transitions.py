@@ -0,0 +1,158 @@
+import itertools
+import time
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from shared.signing import SIGNATURE_HEADER, WebhookSigner, dumps
+
+from app.models import models
+from app.services import crud
+
+from conftest import WEBHOOK_SECRET, create_payout, signed_batch_event, signed_webhook
+
+S = models.PayoutStatus
+
+
+def _status(db, payout_id):
+    db.expire_all()
+    return db.get(models.Payout, payout_id).status
+
+
+def _expected(old_status, new_status):
+    if old_status == new_status:
+        return "unchanged"
+    return "updated" if models.can_transition(old_status, new_status) else "stale"
+
+
+@pytest.mark.parametrize("old_status, new_status", list(itertools.product(S, S)))
+def test_single_and_bulk_updates_agree(db, user, old_status, new_status):
+    single = create_payout(db, user.id, old_status)
+    bulk = create_payout(db, user.id, old_status)
+
+    result = crud.update_payout_status(db, single, new_status)
+    applied = crud.update_payout_statuses_bulk(db, {bulk: [new_status]})
+
+    assert result["status"] == _expected(old_status, new_status)
+    assert applied[bulk]["outcomes"] == [result["status"]]
+    final = new_status if result["status"] == "updated" else old_status
+    assert _status(db, single) == _status(db, bulk) == final
+    assert result["payout"]["status"] == applied[bulk]["payout"]["status"] == final
+    assert crud.check_payout_summaries(db) == []
+
+
+def test_allowed_transition_moves_the_summary(db, user):
+    payout_id = create_payout(db, user.id, amount="12.50")
+
+    result = crud.update_payout_status(db, payout_id, S.PAID)
+
+    assert result["status"] == "updated"
+    assert result["payout"]["old_status"] == S.PENDING
+    buckets = {bucket.status: (bucket.payout_count, bucket.total_amount) for bucket in crud.get_payout_summary(db, user.id)}
+    assert buckets == {S.PAID: (1, Decimal("12.50"))}
+
+
+def test_final_statuses_do_not_move(db, user):
+    payout_id = create_payout(db, user.id, S.PAID)
+
+    for new_status in (S.PENDING, S.IN_TRANSIT, S.BOUNCED, S.CANCELLED):
+        assert crud.update_payout_status(db, payout_id, new_status)["status"] == "stale"
+    assert _status(db, payout_id) == S.PAID
+
+
+def test_repeated_status_is_unchanged(db, user):
+    payout_id = create_payout(db, user.id)
+
+    assert crud.update_payout_status(db, payout_id, S.IN_TRANSIT)["status"] == "updated"
+    assert crud.update_payout_status(db, payout_id, S.IN_TRANSIT)["status"] == "unchanged"
+    assert crud.check_payout_summaries(db) == []
+
+
+def test_unknown_payout_is_not_found(db):
+    with pytest.raises(HTTPException) as e:
+        crud.update_payout_status(db, 10 ** 9, S.PAID)
+    assert e.value.status_code == 404
+    assert crud.update_payout_statuses_bulk(db, {10 ** 9: [S.PAID]}) == {}
+
+
+def test_bulk_applies_each_payouts_events_in_arrival_order(db, user):
+    forward = create_payout(db, user.id)
+    late_pending = create_payout(db, user.id)
+    repeated = create_payout(db, user.id)
+
+    applied = crud.update_payout_statuses_bulk(db, {
+        forward: [S.AUTHORIZED, S.IN_TRANSIT, S.PAID],
+        late_pending: [S.PAID, S.PENDING],
+        repeated: [S.PENDING, S.BOUNCED, S.BOUNCED, S.PAID],
+    })
+
+    assert applied[forward]["outcomes"] == ["updated", "updated", "updated"]
+    assert applied[late_pending]["outcomes"] == ["updated", "stale"]
+    assert applied[repeated]["outcomes"] == ["unchanged", "updated", "unchanged", "stale"]
+    assert [_status(db, payout_id) for payout_id in (forward, late_pending, repeated)] == [S.PAID, S.PAID, S.BOUNCED]
+    assert crud.check_payout_summaries(db) == []
+
+
+def test_bulk_reports_missing_payouts_by_omission(db, user):
+    payout_id = create_payout(db, user.id)
+
+    applied = crud.update_payout_statuses_bulk(db, {payout_id: [S.PAID], 10 ** 9: [S.PAID]})
+
+    assert list(applied) == [payout_id]
+
+
+def test_repeated_webhook_is_answered_without_applying_again(client, db, user):
+    payout_id = create_payout(db, user.id)
+    body, headers = signed_webhook(payout_id, "PAID", request_id="retry-1")
+
+    first = client.post("/api/webhooks/payments", content=body, headers=headers)
+    again = client.post("/api/webhooks/payments", content=body, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    assert first.json()["message"] == "Payout status updated successfully"
+    assert again.json()["message"] == "Webhook already processed"
+    assert _status(db, payout_id) == S.PAID
+
+
+def test_webhook_batch_outcomes_per_event(client, db, user):
+    pending = create_payout(db, user.id)
+    paid = create_payout(db, user.id, S.PAID)
+    seen_body, seen_headers = signed_webhook(pending, "AUTHORIZED", request_id="seen")
+    assert client.post("/api/webhooks/payments", content=seen_body, headers=seen_headers).status_code == 200
+
+    events = [
+        signed_batch_event(pending, "AUTHORIZED", request_id="seen"),
+        signed_batch_event(pending, "IN_TRANSIT"),
+        signed_batch_event(pending, "IN_TRANSIT"),
+        signed_batch_event(pending, "PENDING"),
+        signed_batch_event(paid, "BOUNCED"),
+        signed_batch_event(10 ** 9, "PAID"),
+        {**signed_batch_event(pending, "PAID"), "signature": "0" * 64},
+    ]
+    response = client.post("/api/webhooks/payments/batch", json={"events": events})
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == [
+        "duplicate", "updated", "unchanged", "stale", "stale", "not_found", "invalid_signature",
+    ]
+    assert response.json()["updated"] == 1
+    assert _status(db, pending) == S.IN_TRANSIT
+
+
+def test_old_batch_requests_resends_except_for_duplicates(client, db, user):
+    payout_id = create_payout(db, user.id)
+    seen_body, seen_headers = signed_webhook(payout_id, "AUTHORIZED", request_id="seen-old")
+    assert client.post("/api/webhooks/payments", content=seen_body, headers=seen_headers).status_code == 200
+
+    old = int(time.time()) - 3600
+    events = [
+        {"payload": signed_batch_event(payout_id, "AUTHORIZED", request_id="seen-old")["payload"]},
+        {"payload": signed_batch_event(payout_id, "PAID", timestamp=old)["payload"]},
+    ]
+    body = dumps({"events": events, "timestamp": old})
+    headers = {SIGNATURE_HEADER: WebhookSigner([WEBHOOK_SECRET]).sign(body), "Content-Type": "application/json"}
+    response = client.post("/api/webhooks/payments/batch", content=body, headers=headers)
+
+    assert [result["status"] for result in response.json()["results"]] == ["duplicate", "resend_requested"]
+    assert _status(db, payout_id) == S.AUTHORIZED
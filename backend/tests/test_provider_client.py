@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import http_client, provider_client
+from app.services.provider_client import AdaptiveLimit, CircuitBreaker, ProviderClient, ProviderUnavailable
+
+
+def _client(monkeypatch, handler, open_seconds=60.0):
+    monkeypatch.setattr(http_client, "get_client",
+                        lambda upstream: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return ProviderClient(CircuitBreaker(failure_threshold=1, open_seconds=open_seconds, max_open_seconds=60.0),
+                          AdaptiveLimit(initial=1, min_limit=1, max_limit=1, tolerance=3.0, backoff=0.5),
+                          attempt_timeout=1.0, call_deadline=0.2, max_attempts=3)
+
+
+async def _ok(request):
+    return httpx.Response(200, json={})
+
+
+def test_no_slot_before_the_deadline_is_a_rejection_not_a_failure(monkeypatch):
+    provider = _client(monkeypatch, _ok)
+
+    async def run():
+        started = await provider.limit.acquire()
+        with pytest.raises(ProviderUnavailable, match="no slot"):
+            await asyncio.wait_for(provider.post("/payouts", {}), 1)
+        provider.limit.release("/payouts x1", started, 0.0, None)
+        assert (await provider.post("/payouts", {})).status_code == 200
+
+    asyncio.run(run())
+
+    assert provider.breaker.state == provider_client.CLOSED
+    assert provider.breaker.consecutive_failures == 0
+    assert (provider.calls["rejected"], provider.calls["failed"], provider.calls["succeeded"]) == (1, 0, 1)
+    assert provider.limit.in_flight == 0
+    assert provider.limit.decreases == 0
+
+
+def test_half_open_probe_is_not_held_while_waiting_for_a_slot(monkeypatch):
+    provider = _client(monkeypatch, _ok, open_seconds=0.0)
+
+    async def run():
+        started = await provider.limit.acquire()
+        provider.breaker._open()
+        waiting = asyncio.create_task(provider.post("/payouts", {}))
+        await asyncio.sleep(0.05)
+        assert provider.breaker.state == provider_client.OPEN
+        assert not provider.breaker._probing
+        provider.limit.release("/payouts x1", started, 0.0, None)
+        assert (await waiting).status_code == 200
+
+    asyncio.run(run())
+
+    assert provider.breaker.state == provider_client.CLOSED
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.config.config import config
+from app.services import payment_service, retry_store
+from app.services.provider_client import ProviderUnavailable
+from app.services.resend_queue import ResendQueue
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    store = retry_store.MemoryRetryStore(max_size=100, ttl=60)
+    monkeypatch.setattr(retry_store, "resend_attempts", store)
+    monkeypatch.setattr(config, "RESEND_RETRY_BASE_DELAY", 0.01)
+    return store
+
+
+def _provider(monkeypatch, outcomes):
+    """Answer resend requests with outcomes in turn: None for success, else the exception to raise."""
+    calls = []
+
+    async def request_webhook_resend(payout_id, request_id):
+        calls.append(payout_id)
+        outcome = outcomes[len(calls) - 1]
+        if outcome is not None:
+            raise outcome
+
+    monkeypatch.setattr(payment_service, "request_webhook_resend", request_webhook_resend)
+    return calls
+
+
+def _unavailable():
+    return httpx.HTTPStatusError("unavailable", request=httpx.Request("POST", "http://provider"),
+                                 response=httpx.Response(503))
+
+
+async def _drain(queue: ResendQueue, timeout: float = 2) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while queue.depth and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+
+def test_open_circuit_does_not_use_up_attempts(monkeypatch, counts):
+    monkeypatch.setattr(config, "RESEND_MAX_ATTEMPTS", 2)
+    calls = _provider(monkeypatch, [ProviderUnavailable(0.01)] * 3 + [_unavailable(), None])
+
+    async def run():
+        queue = ResendQueue()
+        queue.enqueue(7, "webhook-1")
+        await _drain(queue)
+        return queue.stats()
+
+    stats = asyncio.run(run())
+
+    assert len(calls) == 5
+    assert (stats["deferred"], stats["retried"], stats["sent"], stats["failed"]) == (3, 1, 1, 0)
+    assert asyncio.run(counts.increment("webhook-1:7")) == 2
+
+
+def test_retries_give_up_after_max_attempts(monkeypatch, counts):
+    monkeypatch.setattr(config, "RESEND_MAX_ATTEMPTS", 2)
+    calls = _provider(monkeypatch, [_unavailable(), _unavailable()])
+
+    async def run():
+        queue = ResendQueue()
+        queue.enqueue(8, "webhook-2")
+        await _drain(queue)
+        return queue.stats()
+
+    stats = asyncio.run(run())
+
+    assert len(calls) == 2
+    assert (stats["retried"], stats["failed"], stats["sent"]) == (1, 1, 0)
+
+
+def test_resends_per_webhook_are_capped(monkeypatch, counts):
+    calls = _provider(monkeypatch, [None] * 10)
+
+    async def run():
+        queue = ResendQueue()
+        for _ in range(config.MAX_TIMESTAMP_RETRIES + 1):
+            queue.enqueue(9, "webhook-3")
+            await asyncio.sleep(0.05)
+            queue._recent.clear()
+        await _drain(queue)
+        return queue.stats()
+
+    stats = asyncio.run(run())
+
+    assert len(calls) == config.MAX_TIMESTAMP_RETRIES
+    assert stats["limited"] == 1
@@ -0,0 +1,149 @@
+import time
+
+import httpx
+import jwt
+import pytest
+
+from app.config.config import config
+from app.services import http_client, session_tokens as session_tokens_module, user_service
+from app.services.session_tokens import COOKIE_NAME, SessionTokens, session_tokens
+
+
+def _tokens(secrets=("current",), ttl=3600, refresh_after=1800, max_age=43200):
+    return SessionTokens(list(secrets), ttl=ttl, refresh_after=refresh_after, max_age=max_age)
+
+
+def test_issued_token_verifies_to_its_claims():
+    tokens = _tokens()
+    before = int(time.time())
+
+    claims = tokens.verify(tokens.issue(42))
+
+    assert claims.user_id == 42
+    assert before <= claims.issued_at == claims.auth_time <= int(time.time())
+    assert claims.expires_at == claims.issued_at + 3600
+
+
+def test_expiry_is_capped_by_the_login_age():
+    tokens = _tokens(ttl=3600, max_age=7200)
+    auth_time = int(time.time()) - 6000
+
+    claims = tokens.verify(tokens.issue(1, auth_time=auth_time))
+
+    assert claims.auth_time == auth_time
+    assert claims.expires_at == auth_time + 7200
+
+
+def test_expired_token_is_rejected():
+    tokens = _tokens(ttl=3600, max_age=60)
+    token = tokens.issue(1, auth_time=int(time.time()) - 3600)
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        tokens.verify(token)
+
+
+def test_token_expiring_after_it_was_cached_is_rejected(monkeypatch):
+    tokens = _tokens(ttl=60)
+    token = tokens.issue(1)
+    tokens.verify(token)
+
+    monkeypatch.setattr(session_tokens_module.time, "time", lambda: 10 ** 10)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        tokens.verify(token)
+
+
+def test_tampered_and_foreign_tokens_are_rejected():
+    tokens = _tokens()
+    header, payload, signature = tokens.issue(1).split(".")
+    missing_claims = jwt.encode({"sub": "2"}, "current", algorithm="HS256",
+                                headers={"kid": session_tokens_module.key_id("current")})
+
+    with pytest.raises(jwt.InvalidTokenError):
+        tokens.verify(f"{header}.{payload}.{signature[:-2]}xx")
+    with pytest.raises(jwt.InvalidTokenError):
+        tokens.verify(_tokens(secrets=("someone-else",)).issue(1))
+    with pytest.raises(jwt.InvalidTokenError):
+        tokens.verify(missing_claims)
+
+
+def test_anything_but_a_jwt_is_not_a_session_token():
+    assert _tokens().verify("ya29.a-google-access-token") is None
+
+
+def test_previous_secrets_still_verify_during_rotation():
+    old_token = _tokens(secrets=("old",)).issue(7)
+
+    rotated = _tokens(secrets=("new", "old"))
+
+    assert rotated.verify(old_token).user_id == 7
+    assert jwt.get_unverified_header(rotated.issue(7))["kid"] == session_tokens_module.key_id("new")
+
+
+def test_refresh_only_old_tokens_and_never_past_the_login_age():
+    tokens = _tokens(ttl=3600, refresh_after=1800, max_age=5000)
+    now = int(time.time())
+
+    assert tokens.refreshed(tokens.verify(tokens.issue(1))) is None
+    stale = session_tokens_module.SessionClaims(1, now - 2000, now - 2000, now + 1600)
+    refreshed = tokens.verify(tokens.refreshed(stale))
+    assert refreshed.auth_time == now - 2000
+    assert refreshed.expires_at == now - 2000 + 5000
+    capped = session_tokens_module.SessionClaims(1, now - 2000, now - 2000, now - 2000 + 5000)
+    assert tokens.refreshed(capped) is None
+
+
+def test_startup_requires_a_separate_secret(monkeypatch):
+    monkeypatch.setattr(config, "SESSION_TOKEN_SECRET", None)
+    with pytest.raises(RuntimeError, match="SESSION_TOKEN_SECRET is not set"):
+        session_tokens_module.check_config()
+
+    monkeypatch.setattr(config, "SESSION_TOKEN_SECRET", config.SESSION_SECRET_KEY)
+    with pytest.raises(RuntimeError, match="must not be the same"):
+        session_tokens_module.check_config()
+
+
+def test_session_cookie_authenticates(client, user):
+    client.cookies.set(COOKIE_NAME, session_tokens.issue(user.id))
+
+    response = client.get("/api/user/me")
+
+    assert response.status_code == 200
+    assert response.json()["id"] == user.id
+    assert "set-cookie" not in response.headers
+
+
+def test_invalid_or_missing_cookie_is_refused(client):
+    assert client.get("/api/user/me").status_code == 403
+    client.cookies.set(COOKIE_NAME, _tokens(secrets=("someone-else",)).issue(1))
+    assert client.get("/api/user/me").status_code == 401
+
+
+def test_google_access_token_is_checked_once_and_swapped(client, user, monkeypatch):
+    userinfo_calls = []
+
+    def google(request):
+        userinfo_calls.append(request.headers["Authorization"])
+        if request.headers["Authorization"] != "Bearer google-token":
+            return httpx.Response(401)
+        return httpx.Response(200, json={"sub": user.oauth_id, "email": user.email})
+
+    google_client = httpx.AsyncClient(transport=httpx.MockTransport(google))
+    monkeypatch.setattr(http_client, "get_client", lambda upstream: google_client)
+    user_service.token_cache.clear()
+
+    client.cookies.set(COOKIE_NAME, "google-token")
+    response = client.get("/api/user/me")
+
+    assert response.status_code == 200
+    assert response.json()["id"] == user.id
+    swapped = response.cookies[COOKIE_NAME]
+    assert session_tokens.verify(swapped).user_id == user.id
+
+    client.cookies.clear()
+    client.cookies.set(COOKIE_NAME, swapped)
+    assert client.get("/api/user/me").status_code == 200
+    assert userinfo_calls == ["Bearer google-token"]
+
+    client.cookies.clear()
+    client.cookies.set(COOKIE_NAME, "revoked-google-token")
+    assert client.get("/api/user/me").status_code == 401
@@ -18,6 +18,7 @@ const PayoutTable: React.FC<Props> = ({ refreshTable }) => {
   const [total, setTotal] = useState(0);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [resyncCount, setResyncCount] = useState(0);
 
   const fetchPayouts = async () => {
     setLoading(true);
@@ -40,7 +41,22 @@ const PayoutTable: React.FC<Props> = ({ refreshTable }) => {
 
   useEffect(() => {
     fetchPayouts();
-  }, [offset, limit, refreshTable]);
+  }, [offset, limit, refreshTable, resyncCount]);
+
+  // Status changes are pushed by the backend; only refetch when the stream asks us to resync.
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/payouts/stream`, { withCredentials: true });
+
+    source.addEventListener("payout.status", (event) => {
+      const updated: ExistingPayout = JSON.parse((event as MessageEvent).data);
+      setPayouts((current) =>
+        current.map((payout) => (payout.id === updated.id ? { ...payout, ...updated } : payout))
+      );
+    });
+    source.addEventListener("resync", () => setResyncCount((count) => count + 1));
+
+    return () => source.close();
+  }, []);
 
   const handlePrev = () => {
     if (offset > 0) setOffset(Math.max(offset - limit, 0));
@@ -11,6 +11,7 @@ export enum PayoutStatus {
 }
 
 export interface ExistingPayout {
+    id: number;
     amount: number;
     currency: string;
     status: PayoutStatus;
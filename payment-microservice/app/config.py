@@ -1,11 +1,25 @@
 import os
 
+from shared import currencies
+
 class Config:
     WEBHOOK_CALLBACK_SECRET: str = os.getenv("SHARED_CALLBACK_SECRET")
     MOCK_CALLBACK_URL: str = os.getenv("MOCK_CALLBACK_URL")
     WEBHOOK_DELAY_MIN: float = float(os.getenv("WEBHOOK_DELAY_MIN", 1))
     WEBHOOK_DELAY_MAX: float = float(os.getenv("WEBHOOK_DELAY_MAX", 3))
     WEBHOOK_RETRY_ATTEMPTS = 3
+    # Set to make webhook delays and statuses reproducible across runs.
+    MOCK_RANDOM_SEED = int(os.getenv("MOCK_RANDOM_SEED")) if os.getenv("MOCK_RANDOM_SEED") else None
+    # "memory" (lost on restart) or "sqlite" (durable, at MOCK_STORE_PATH).
+    MOCK_STORE_BACKEND: str = os.getenv("MOCK_STORE_BACKEND", "memory")
+    MOCK_STORE_PATH: str = os.getenv("MOCK_STORE_PATH", "mock_payments.db")
+    WEBHOOK_MAX_CONCURRENCY: int = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", 100))
+    WEBHOOK_HTTP_TIMEOUT: float = float(os.getenv("WEBHOOK_HTTP_TIMEOUT", 5))
+    # Coalesce callbacks into signed batches for POST <MOCK_CALLBACK_URL>/batch instead of one request each.
+    WEBHOOK_BATCH_ENABLED: bool = os.getenv("WEBHOOK_BATCH_ENABLED", "false").lower() == "true"
+    WEBHOOK_BATCH_MAX_SIZE: int = int(os.getenv("WEBHOOK_BATCH_MAX_SIZE", 100))
+    WEBHOOK_BATCH_MAX_DELAY: float = float(os.getenv("WEBHOOK_BATCH_MAX_DELAY", 0.5))
+    MOCK_BATCH_CALLBACK_URL: str = os.getenv("MOCK_BATCH_CALLBACK_URL") or f"{os.getenv('MOCK_CALLBACK_URL')}/batch"
     MAX_WEBHOOK_AGE = 300
     MOCK_PAYOUT_STATUSES = [
         "AUTHORIZED",
@@ -16,27 +30,12 @@ class Config:
         "CANCELLED",
         "PENDING"
     ]
-    VALID_CURRENCIES = [
-        "AED", "AFN", "ALL", "AMD", "ANG", "AOA", "ARS", "AUD", "AWG", "AZN",
-        "BAM", "BBD", "BDT", "BGN", "BHD", "BIF", "BMD", "BND", "BOB", "BOV",
-        "BRL", "BSD", "BTN", "BWP", "BYN", "BZD", "CAD", "CDF", "CHE", "CHF",
-        "CHW", "CLF", "CLP", "CNY", "COP", "COU", "CRC", "CUC", "CUP", "CVE",
-        "CZK", "DJF", "DKK", "DOP", "DZD", "EGP", "ERN", "ETB", "EUR", "FJD",
-        "FKP", "GBP", "GEL", "GHS", "GIP", "GMD", "GNF", "GTQ", "GYD", "HKD",
-        "HNL", "HRK", "HTG", "HUF", "IDR", "ILS", "INR", "IQD", "IRR", "ISK",
-        "JMD", "JOD", "JPY", "KES", "KGS", "KHR", "KMF", "KPW", "KRW", "KWD",
-        "KYD", "KZT", "LAK", "LBP", "LKR", "LRD", "LSL", "LYD", "MAD", "MDL",
-        "MGA", "MKD", "MMK", "MNT", "MOP", "MRU", "MUR", "MVR", "MWK", "MXN",
-        "MXV", "MYR", "MZN", "NAD", "NGN", "NIO", "NOK", "NPR", "NZD", "OMR",
-        "PAB", "PEN", "PGK", "PHP", "PKR", "PLN", "PYG", "QAR", "RON", "RSD",
-        "CNY", "RUB", "RWF", "SAR", "SBD", "SCR", "SDG", "SEK", "SGD", "SHP",
-        "SLL", "SOS", "SRD", "SSP", "STN", "SVC", "SYP", "SZL", "THB", "TJS",
-        "TMT", "TND", "TOP", "TRY", "TTD", "TWD", "TZS", "UAH", "UGX", "USD",
-        "USN", "UYI", "UYU", "UYW", "UZS", "VED", "VES", "VND", "VUV", "WST",
-        "XAF", "XAG", "XAU", "XBA", "XBB", "XBC", "XBD", "XCD", "XDR", "XOF",
-        "XPD", "XPF", "XPT", "XSU", "XTS", "XUA", "XXX", "YER", "ZAR", "ZMW",
-        "ZWL"
-    ]
+    VALID_CURRENCIES = currencies.CODES
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # "json" (one object per line) or "text"
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    # Fraction of INFO lines kept per logger, e.g. "app.webhooks=0.1"; warnings are always kept.
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
 
 
 
@@ -0,0 +1,19 @@
+from shared.metrics import Counter, Gauge, Histogram
+
+http_requests = Counter("http_requests", "HTTP requests by route and status.", ["method", "route", "status"])
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route"]
+)
+webhook_delivery_duration = Histogram(
+    "webhook_delivery_duration_seconds", "Callback POST latency to the backend by mode and outcome.",
+    ["mode", "outcome"],
+)
+
+
+def register_scheduler(scheduler) -> None:
+    Gauge("webhooks_pending", "Webhooks scheduled but not yet sent.", scheduler.pending)
+    Gauge("webhooks_in_flight", "Webhook deliveries in progress.", lambda: scheduler.stats()["in_flight"])
+    Gauge("webhooks_delivered_total", "Webhooks accepted by the backend.", lambda: scheduler.delivered, kind="counter")
+    Gauge("webhooks_retried_total", "Webhook deliveries rescheduled after a failure.", lambda: scheduler.retried,
+          kind="counter")
+    Gauge("webhooks_failed_total", "Webhooks given up on.", lambda: scheduler.failed, kind="counter")
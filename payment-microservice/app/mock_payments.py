@@ -1,41 +1,44 @@
 
-import hashlib
-import hmac
 import json
 import logging
 import random
-import threading
-import time
 import uuid
-import httpx
 
+from contextlib import asynccontextmanager
 from decimal import Decimal
-from typing import Dict
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
+
+from shared import logs
+from shared.metrics import CONTENT_TYPE, MetricsMiddleware, registry
 
 from .config import Config
-from .schemas import PayoutCreate, WebhookPayloadModel, CreatePayoutResponse
 
-app = FastAPI(title="Mock Payments Microservice")
+logs.configure("mock-payments", Config.LOG_LEVEL, Config.LOG_FORMAT, logs.parse_sample_rates(Config.LOG_SAMPLE_RATES))
+
+from . import metrics
+from .schemas import PayoutCreate, CreatePayoutResponse, PayoutBatchCreate, PayoutBatchResponse, ResendRequest
+from .store import create_store
+from .webhooks import WebhookJob, WebhookScheduler
 
-class SafeFormatter(logging.Formatter):
-    def format(self, record):
-        if not hasattr(record, "correlation_id"):
-            record.correlation_id = "N/A"
-        return super().format(record)
+logger = logging.getLogger(__name__)
 
-class CorrelationFilter(logging.Filter):
-    def filter(self, record):
-        if not hasattr(record, "correlation_id") or record.correlation_id is None:
-            record.correlation_id = "N/A"
-        return True
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await webhook_scheduler.start()
+    # Payouts created before a restart still get their webhook.
+    recovered = payout_store.undelivered()
+    for payout_data in recovered:
+        simulate_webhook(payout_data, str(uuid.uuid4()))
+    if recovered:
+        logger.info("Rescheduled webhooks for %d payouts from %s store", len(recovered), Config.MOCK_STORE_BACKEND)
+    yield
+    await webhook_scheduler.stop()
+    payout_store.close()
 
-logging.basicConfig(level=logging.INFO)
-logging.getLogger().addFilter(CorrelationFilter())
 
-formatter = SafeFormatter('[%(asctime)s] [%(levelname)s] [%(correlation_id)s] %(message)s')
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(formatter)
+app = FastAPI(title="Mock Payments Microservice", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, requests=metrics.http_requests, duration=metrics.http_request_duration)
+app.add_middleware(logs.CorrelationIdMiddleware)
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -44,96 +47,71 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super().default(obj)
 
-payout_store: Dict[str, dict] = {}
-store_lock = threading.Lock()
-
-
-def sign_payload(payload: dict, secret: str) -> (str, dict):
-    payload_with_ts = payload.copy()
-    payload_with_ts["timestamp"] = int(time.time())
-    payload_bytes = json.dumps(payload_with_ts, sort_keys=True, separators=(',', ':')).encode('utf-8')
-    signature = hmac.new(secret.encode('utf-8'), payload_bytes, hashlib.sha256).hexdigest()
-    return signature, payload_with_ts
+payout_store = create_store()
+rng = random.Random(Config.MOCK_RANDOM_SEED)
+webhook_scheduler = WebhookScheduler(on_delivered=payout_store.mark_delivered)
+metrics.register_scheduler(webhook_scheduler)
 
 
 def simulate_webhook(payout_data: dict, correlation_id: str):
-    delay = random.uniform(Config.WEBHOOK_DELAY_MIN, Config.WEBHOOK_DELAY_MAX)
-    logging.info(f"Simulating webhook in {delay:.2f}s for payout {payout_data['payout_id']}",
-                 extra={"correlation_id": correlation_id})
-    time.sleep(delay)
-
-    new_status = random.choice(Config.MOCK_PAYOUT_STATUSES)
-    payload = {
-        "payout_id": payout_data["payout_id"],
-        "new_status": new_status,
-        "request_id": correlation_id
-    }
-
-    send_webhook(payload, Config.WEBHOOK_CALLBACK_SECRET, correlation_id)
-
-
-def send_webhook(payload: dict, secret: str, correlation_id: str = "N/A", attempt: int = 1):
-    try:
-        validated_payload = WebhookPayloadModel(**payload).model_dump()
-    except Exception as e:
-        logging.error(f"Invalid webhook payload for payout {payload.get('payout_id')}: {e}",
-                      extra={"correlation_id": correlation_id})
-        return
-
-    signature, payload_with_ts = sign_payload(validated_payload, secret)
-    headers = {"X-Mock-Signature": signature}
-
-    try:
-        logging.info(
-            f"[Attempt {attempt}] Webhook sent for payout {payload['payout_id']} -> {payload_with_ts['new_status']}",
-            extra={"correlation_id": correlation_id}
-        )
-
-        response = httpx.post(
-            Config.MOCK_CALLBACK_URL,
-            json=payload_with_ts,
-            headers=headers,
-            timeout=5
-        )
-        response.raise_for_status()
-        logging.info(f"Webhook sent for payout {payload['payout_id']} -> {payload_with_ts['new_status']}",
-                     extra={"correlation_id": correlation_id})
-
-        with store_lock:
-            if payload["payout_id"] in payout_store:
-                payout_store[payload["payout_id"]]["status"] = payload_with_ts["new_status"]
-
-    except (httpx.RequestError, httpx.HTTPStatusError) as e:
-        if attempt <= Config.WEBHOOK_RETRY_ATTEMPTS:
-            delay = (2 ** attempt) + random.uniform(0, 0.5)
-            logging.warning(f"[Attempt {attempt}] Webhook failed, retrying in {delay:.2f}s: {e}",
-                            extra={"correlation_id": correlation_id})
-            time.sleep(delay)
-            send_webhook(payload, secret, correlation_id, attempt + 1)
-        else:
-            logging.error(f"Webhook permanently failed after {attempt - 1} retries: {e}",
-                          extra={"correlation_id": correlation_id})
+    delay = rng.uniform(Config.WEBHOOK_DELAY_MIN, Config.WEBHOOK_DELAY_MAX)
+    new_status = rng.choice(Config.MOCK_PAYOUT_STATUSES)
+    webhook_scheduler.schedule(WebhookJob(payout_data["payout_id"], new_status, correlation_id), delay)
+    logger.debug("Simulating webhook %s in %.2fs for payout %s", correlation_id, delay, payout_data["payout_id"])
 
 
-@app.post("/mock/payouts", response_model=CreatePayoutResponse)
-def create_payout(payout: PayoutCreate):
+def register_payout(payout: PayoutCreate) -> dict:
     correlation_id = str(uuid.uuid4())
 
-    with store_lock:
-        if payout.idempotency_key in payout_store:
-            return payout_store[payout.idempotency_key]
-
-        payout_data = {
-            "payout_id": len(payout_store) + 1,
+    def build(payout_id: int) -> dict:
+        return {
+            "payout_id": payout_id,
             "user_id": getattr(payout, "user_id", 1),
             "amount": payout.amount,
             "currency": payout.currency,
             "status": "PENDING",
             "idempotency_key": payout.idempotency_key,
         }
-        payout_store[payout.idempotency_key] = payout_data
 
-    threading.Thread(target=simulate_webhook, args=(payout_data, correlation_id), daemon=True).start()
-    logging.info(f"Created payout {payout_data['payout_id']} for user {payout_data['user_id']}",
-                 extra={"correlation_id": correlation_id})
+    payout_data, created = payout_store.get_or_create(str(payout.idempotency_key), build)
+    if not created:
+        return payout_data
+
+    simulate_webhook(payout_data, correlation_id)
+    logger.info("Created payout %s for user %s, webhook %s", payout_data["payout_id"], payout_data["user_id"],
+                correlation_id)
     return payout_data
+
+
+@app.post("/mock/payouts", response_model=CreatePayoutResponse)
+async def create_payout(payout: PayoutCreate):
+    return register_payout(payout)
+
+
+@app.post("/mock/payouts/batch", response_model=PayoutBatchResponse)
+async def create_payout_batch(batch: PayoutBatchCreate):
+    results = []
+    for payout in batch.payouts:
+        try:
+            results.append({"payout": register_payout(payout)})
+        except Exception as e:
+            logger.exception("Failed to create payout %s in batch: %s", payout.idempotency_key, e)
+            results.append({"error": "Failed to create payout"})
+    return {"results": results}
+
+
+@app.post("/mock/resend")
+async def resend_webhook(request: ResendRequest):
+    payout_data = payout_store.get(request.payout_id)
+    if payout_data is None:
+        raise HTTPException(status_code=404, detail=f"Payout with id {request.payout_id} not found")
+
+    correlation_id = request.request_id or str(uuid.uuid4())
+    webhook_scheduler.schedule(WebhookJob(request.payout_id, payout_data["status"], correlation_id), 0)
+    logger.info("Resending webhook %s for payout %d -> %s", correlation_id, request.payout_id, payout_data["status"])
+    return {"message": "Webhook resend scheduled"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
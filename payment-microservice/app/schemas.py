@@ -1,5 +1,8 @@
+from shared import currencies
+
 from .config import Config
 from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 from datetime import datetime
 import uuid
 from decimal import Decimal
@@ -24,9 +27,7 @@ class PayoutCreate(BaseModel):
 
     @field_validator("currency")
     def validate_currency(cls, v):
-        if v not in Config.VALID_CURRENCIES:
-            raise ValueError(f"Invalid currency: {v}. Must be one of {Config.VALID_CURRENCIES}")
-        return v
+        return currencies.validate(v)
 
 
 class WebhookPayloadModel(BaseModel):
@@ -72,9 +73,7 @@ class CreatePayoutResponse(BaseModel):
 
     @field_validator("currency")
     def validate_currency(cls, v):
-        if v not in Config.VALID_CURRENCIES:
-            raise ValueError(f"Invalid currency: {v}. Must be one of {Config.VALID_CURRENCIES}")
-        return v
+        return currencies.validate(v)
 
     @field_validator("status")
     def validate_status(cls, v):
@@ -85,3 +84,21 @@ class CreatePayoutResponse(BaseModel):
             raise ValueError(f"Invalid payout status '{v_upper}'. Must be one of {Config.MOCK_PAYOUT_STATUSES}")
         return v_upper
 
+
+
+class PayoutBatchCreate(BaseModel):
+    payouts: List[PayoutCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class PayoutBatchItemResponse(BaseModel):
+    payout: Optional[CreatePayoutResponse] = None
+    error: Optional[str] = None
+
+
+class PayoutBatchResponse(BaseModel):
+    results: List[PayoutBatchItemResponse]
+
+
+class ResendRequest(BaseModel):
+    payout_id: int
+    request_id: Optional[str] = None
@@ -0,0 +1,163 @@
+import json
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Config
+
+
+class PayoutStore(ABC):
+    """Payouts known to the simulator, looked up by idempotency key or by payout_id.
+
+    `get_or_create` allocates monotonically increasing payout ids; `build(payout_id)` returns the
+    new record and is only called when the key is new.
+    """
+
+    @abstractmethod
+    def get_or_create(self, idempotency_key: str, build: Callable[[int], dict]) -> Tuple[dict, bool]:
+        ...
+
+    @abstractmethod
+    def get(self, payout_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def mark_delivered(self, payout_id: int, status: str) -> None:
+        ...
+
+    @abstractmethod
+    def undelivered(self) -> List[dict]:
+        """Payouts whose first webhook was never delivered, to reschedule after a restart."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryPayoutStore(PayoutStore):
+    """Two dict indexes; creations lock only the shard owning the idempotency key. Lost on restart."""
+
+    def __init__(self, shards: int = 64):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._by_id: Dict[int, dict] = {}
+        self._ids = count(1)
+
+    def get_or_create(self, idempotency_key: str, build: Callable[[int], dict]) -> Tuple[dict, bool]:
+        by_key, lock = self._shards[hash(idempotency_key) % len(self._shards)]
+        with lock:
+            existing = by_key.get(idempotency_key)
+            if existing is not None:
+                return existing, False
+            payout = build(next(self._ids))
+            by_key[idempotency_key] = payout
+            self._by_id[payout["payout_id"]] = payout
+            return payout, True
+
+    def get(self, payout_id: int) -> Optional[dict]:
+        return self._by_id.get(payout_id)
+
+    def mark_delivered(self, payout_id: int, status: str) -> None:
+        payout = self._by_id.get(payout_id)
+        if payout is not None:
+            payout["status"] = status
+
+    def undelivered(self) -> List[dict]:
+        return []
+
+    def count(self) -> int:
+        return len(self._by_id)
+
+
+class SqlitePayoutStore(PayoutStore):
+    """Durable store for soak tests that span restarts.
+
+    payout_id is an AUTOINCREMENT key, so ids are never reused, and both lookups are indexed.
+    There is nothing to replay on start: recovery is opening the file.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS payouts (
+                payout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                delivered INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            )
+            """
+        )
+
+    def _row_to_payout(self, row: sqlite3.Row) -> dict:
+        payout = json.loads(row["data"])
+        payout["payout_id"] = row["payout_id"]
+        payout["status"] = row["status"]
+        return payout
+
+    def get_or_create(self, idempotency_key: str, build: Callable[[int], dict]) -> Tuple[dict, bool]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM payouts WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+            if row is not None:
+                return self._row_to_payout(row), False
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Reserve the id first so build() sees the id the row is stored under.
+                cursor = self._conn.execute(
+                    "INSERT INTO payouts (idempotency_key, status, data) VALUES (?, '', '{}')", (idempotency_key,)
+                )
+                payout = build(cursor.lastrowid)
+                self._conn.execute(
+                    "UPDATE payouts SET status = ?, data = ? WHERE payout_id = ?",
+                    (payout["status"], json.dumps(payout, default=str), cursor.lastrowid),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return payout, True
+
+    def get(self, payout_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM payouts WHERE payout_id = ?", (payout_id,)).fetchone()
+        return None if row is None else self._row_to_payout(row)
+
+    def mark_delivered(self, payout_id: int, status: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE payouts SET status = ?, delivered = 1 WHERE payout_id = ?", (status, payout_id)
+            )
+
+    def undelivered(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM payouts WHERE delivered = 0").fetchall()
+        return [self._row_to_payout(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM payouts").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_store() -> PayoutStore:
+    if Config.MOCK_STORE_BACKEND == "sqlite":
+        return SqlitePayoutStore(Config.MOCK_STORE_PATH)
+    if Config.MOCK_STORE_BACKEND == "memory":
+        return MemoryPayoutStore()
+    raise ValueError(f"Unknown MOCK_STORE_BACKEND: {Config.MOCK_STORE_BACKEND}")
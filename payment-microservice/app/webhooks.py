@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+import httpx
+
+from itertools import count
+from typing import Callable, List, Optional, Tuple
+
+from shared import logs
+from shared.signing import SIGNATURE_HEADER, WebhookSigner
+
+from . import metrics
+from .config import Config
+from .schemas import WebhookPayloadModel
+
+logger = logging.getLogger(__name__)
+
+signer = WebhookSigner([Config.WEBHOOK_CALLBACK_SECRET])
+
+
+def sign_payload(payload: dict) -> Tuple[bytes, dict]:
+    """Stamp the payload and return the exact body to send with its signature headers."""
+    body, signature = signer.sign_payload({**payload, "timestamp": int(time.time())})
+    return body, {SIGNATURE_HEADER: signature, "Content-Type": "application/json"}
+
+
+class WebhookJob:
+    """One pending callback. Kept small: at load there are 100k+ of these waiting in the heap."""
+    __slots__ = ("payout_id", "new_status", "request_id", "attempt")
+
+    def __init__(self, payout_id: int, new_status: str, request_id: str, attempt: int = 1):
+        self.payout_id = payout_id
+        self.new_status = new_status
+        self.request_id = request_id
+        self.attempt = attempt
+
+    def payload(self) -> dict:
+        return {"payout_id": self.payout_id, "new_status": self.new_status, "request_id": self.request_id}
+
+
+class WebhookScheduler:
+    """Delivers webhooks when they fall due, from a single timer heap on the event loop.
+
+    Pending jobs cost one heap entry each; only deliveries in progress have tasks, and at most
+    WEBHOOK_MAX_CONCURRENCY of them run at once over a shared HTTP client. Failed deliveries go
+    back into the heap with exponential backoff. With WEBHOOK_BATCH_ENABLED, due jobs are
+    coalesced into signed batches for the backend's batch endpoint.
+    """
+
+    def __init__(self, on_delivered: Callable[[int, str], None]):
+        self.on_delivered = on_delivered
+        self._heap: List[Tuple[float, int, WebhookJob]] = []
+        self._sequence = count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._deliveries = set()
+        self._batch: List[WebhookJob] = []
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Future] = None
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(Config.WEBHOOK_MAX_CONCURRENCY)
+        self._client = httpx.AsyncClient(
+            timeout=Config.WEBHOOK_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=Config.WEBHOOK_MAX_CONCURRENCY),
+        )
+        self._runner = asyncio.create_task(self._run(), name="webhook-scheduler")
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(self._runner, *self._deliveries, return_exceptions=True)
+        await self._client.aclose()
+        self._runner = None
+
+    def schedule(self, job: WebhookJob, delay: float):
+        """Must be called from the event loop thread."""
+        due = time.monotonic() + delay
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, next(self._sequence), job))
+        if self._wakeup is not None and (earliest is None or due < earliest):
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._heap) + len(self._batch)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "in_flight": len(self._deliveries),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._heap)
+            if Config.WEBHOOK_BATCH_ENABLED:
+                await self._add_to_batch(job)
+            else:
+                await self._spawn(self._deliver_one(job))
+
+    async def _spawn(self, delivery):
+        # Waiting here, rather than inside the task, is what bounds the number of delivery tasks.
+        await self._semaphore.acquire()
+        task = asyncio.create_task(delivery)
+        self._deliveries.add(task)
+        task.add_done_callback(self._delivery_done)
+
+    def _delivery_done(self, task: asyncio.Task):
+        self._deliveries.discard(task)
+        self._semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Webhook delivery crashed: %s", task.exception())
+
+    async def _add_to_batch(self, job: WebhookJob):
+        self._batch.append(job)
+        if len(self._batch) >= Config.WEBHOOK_BATCH_MAX_SIZE:
+            await self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(
+                Config.WEBHOOK_BATCH_MAX_DELAY, self._on_batch_timer
+            )
+
+    def _on_batch_timer(self):
+        self._batch_timer = None
+        self._flush_task = asyncio.ensure_future(self._flush_batch())
+
+    async def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        jobs, self._batch = self._batch, []
+        if jobs:
+            await self._spawn(self._deliver_batch(jobs))
+
+    def _retry(self, jobs: List[WebhookJob], error: Exception):
+        for job in jobs:
+            if job.attempt > Config.WEBHOOK_RETRY_ATTEMPTS:
+                self.failed += 1
+                with logs.correlation(job.request_id):
+                    logger.error("Webhook permanently failed after %d retries: %s", job.attempt - 1, error)
+                continue
+            delay = (2 ** job.attempt) + random.uniform(0, 0.5)
+            with logs.correlation(job.request_id):
+                logger.warning("[Attempt %d] Webhook failed for payout %d, retrying in %.2fs: %s",
+                               job.attempt, job.payout_id, delay, error)
+            job.attempt += 1
+            self.retried += 1
+            self.schedule(job, delay)
+
+    async def _deliver_one(self, job: WebhookJob):
+        # Runs in its own task; the backend logs this callback under the same id.
+        logs.set_correlation_id(job.request_id)
+        validated_payload = WebhookPayloadModel(**job.payload()).model_dump()
+        body, headers = sign_payload(validated_payload)
+        started = time.perf_counter()
+        try:
+            response = await self._client.post(
+                Config.MOCK_CALLBACK_URL, content=body, headers={**headers, logs.CORRELATION_HEADER: job.request_id}
+            )
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            metrics.webhook_delivery_duration.observe(time.perf_counter() - started, "single", "error")
+            self._retry([job], e)
+            return
+        metrics.webhook_delivery_duration.observe(time.perf_counter() - started, "single", "ok")
+
+        self.delivered += 1
+        logger.info("[Attempt %d] Webhook sent for payout %d -> %s", job.attempt, job.payout_id, job.new_status)
+        self.on_delivered(job.payout_id, job.new_status)
+
+    async def _deliver_batch(self, jobs: List[WebhookJob]):
+        logs.set_correlation_id(logs.new_correlation_id())
+        events = [{"payload": WebhookPayloadModel(**job.payload()).model_dump()} for job in jobs]
+        body, headers = sign_payload({"events": events})
+        started = time.perf_counter()
+        try:
+            response = await self._client.post(
+                Config.MOCK_BATCH_CALLBACK_URL, content=body,
+                headers={**headers, logs.CORRELATION_HEADER: logs.get_correlation_id()},
+            )
+            response.raise_for_status()
+            applied = sum(result["status"] == "updated" for result in response.json()["results"])
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            metrics.webhook_delivery_duration.observe(time.perf_counter() - started, "batch", "error")
+            self._retry(jobs, e)
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            # A 2xx whose body is not the batch answer: nothing says the events were seen, so send them again.
+            metrics.webhook_delivery_duration.observe(time.perf_counter() - started, "batch", "error")
+            self._retry(jobs, e)
+            return
+        metrics.webhook_delivery_duration.observe(time.perf_counter() - started, "batch", "ok")
+
+        # Every event got an answer, whatever the backend made of it; transport failures and
+        # unreadable answers are retried above.
+        for job in jobs:
+            self.on_delivered(job.payout_id, job.new_status)
+        self.delivered += len(jobs)
+        logger.info("Webhook batch of %d sent, %d applied", len(jobs), applied)
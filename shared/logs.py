@@ -0,0 +1,249 @@
+"""Logging for both services: one line per record, written by a background thread.
+
+configure() puts a single QueueHandler on the root logger. In the thread that logs, a record
+is only filtered, stamped with the current correlation id and has its message rendered;
+formatting (JSON or text) and the write to stderr happen in a QueueListener thread, so a slow
+or blocked stderr never holds up a request or the event loop.
+
+The correlation id lives in a contextvar. CorrelationIdMiddleware sets it per request from
+X-Request-ID (or a new id) and echoes it back; background work sets it with correlation().
+It follows tasks and threadpool calls, so nothing needs to pass extra={"correlation_id": ...}.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder writes the same lines, slower
+    orjson = None
+
+CORRELATION_HEADER = "X-Request-ID"
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] [%(correlation_id)s] %(message)s"
+MAX_CORRELATION_ID_LENGTH = 128
+
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+# Everything a LogRecord carries by itself; any other attribute came from extra= and is logged as a field.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "correlation_id", "taskName",
+}
+_listener: Optional[QueueListener] = None
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_correlation_id() -> Optional[str]:
+    return correlation_id.get()
+
+
+def set_correlation_id(value: Optional[str]) -> None:
+    """Set the id for the rest of the current request or task."""
+    correlation_id.set(value)
+
+
+@contextmanager
+def correlation(value: Optional[str]):
+    """Log the enclosed block under value, e.g. one webhook job inside a batch."""
+    token = correlation_id.set(value)
+    try:
+        yield
+    finally:
+        correlation_id.reset(token)
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """"httpx=0.01,app.services.crud=0.1" -> {"httpx": 0.01, "app.services.crud": 0.1}."""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, rate = part.strip().partition("=")
+        if name:
+            rates[name] = float(rate)
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Stamps each record with the correlation id of the code that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "correlation_id", None) is None:
+            record.correlation_id = correlation_id.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO and DEBUG records from chosen loggers; warnings and errors always pass.
+
+    Rates apply to a logger and its children, the longest matching name winning ("" for all).
+    The decision hashes the correlation id, so a sampled request keeps every one of its lines.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._by_logger: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._by_logger.get(name)
+        if rate is None:
+            matches = [prefix for prefix in self.rates if not prefix or name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._by_logger[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        cid = getattr(record, "correlation_id", "-")
+        if cid != "-":
+            return zlib.crc32(cid.encode("utf-8")) < rate * 0x100000000
+        return random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode("utf-8")
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Renders only what must be captured in the logging thread; the listener does the rest."""
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Arguments may be mutated after the call returns, and tracebacks hold frames alive.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure(service: str, level: str = "INFO", fmt: str = "json", sample_rates: Optional[Dict[str, float]] = None,
+              stream=None) -> QueueListener:
+    """Route every log record, including uvicorn's, through one queue to stream (stderr)."""
+    global _listener
+    shutdown()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter(service) if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    # uvicorn installs its own synchronous handlers; send its records through the queue too.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    return _listener
+
+
+def shutdown() -> None:
+    """Write out everything queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def _valid_correlation_id(value: str) -> bool:
+    return 0 < len(value) <= MAX_CORRELATION_ID_LENGTH and value.isprintable()
+
+
+class CorrelationIdMiddleware:
+    """Sets the correlation id for each request and returns it in the same header.
+
+    A caller's X-Request-ID is kept so one id follows a payout across both services; anything
+    missing, over-long or unprintable is replaced with a new id.
+    """
+
+    def __init__(self, app, header: str = CORRELATION_HEADER):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = None
+        for name, raw in scope["headers"]:
+            if name == self.header:
+                value = raw.decode("latin-1")
+                break
+        if value is None or not _valid_correlation_id(value):
+            value = new_correlation_id()
+        header = (self.header, value.encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        token = correlation_id.set(value)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
+
+
+async def propagate_correlation_id(request) -> None:
+    """httpx request hook: pass the current correlation id on to the service being called."""
+    value = correlation_id.get()
+    if value is not None and CORRELATION_HEADER not in request.headers:
+        request.headers[CORRELATION_HEADER] = value
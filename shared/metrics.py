@@ -0,0 +1,231 @@
+"""Minimal Prometheus metrics with a lock-free hot path.
+
+Every metric keeps one value table per thread, so recording is a thread-local dict update:
+no locks, and no lost increments between the event loop and threadpool workers. The tables
+are only merged when /metrics is scraped. A lock is taken once per metric and thread, when
+that thread records its first value.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _ThreadSharded:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional[Registry] = registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _table(self) -> dict:
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = self._local.table = {}
+            with self._shards_lock:
+                self._shards.append(table)
+        return table
+
+    def _snapshots(self) -> List[List[tuple]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # list(dict.items()) runs without releasing the GIL, so it is safe against concurrent writers.
+        return [list(shard.items()) for shard in shards]
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_ThreadSharded):
+    kind = "counter"
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name}_total {self.documentation}", f"# TYPE {self.name}_total {self.kind}"]
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        table = self._local.__dict__.get("table") or self._table()
+        table[labels] = table.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        merged: Dict[Labels, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard:
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_ThreadSharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = registry):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._size = len(self.buckets) + 1
+
+    def observe(self, value: float, *labels: str) -> None:
+        table = self._local.__dict__.get("table") or self._table()
+        entry = table.get(labels)
+        if entry is None:
+            # Per-bucket counts (the last one is +Inf), then the sum.
+            entry = table[labels] = [0] * self._size + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def values(self) -> Dict[Labels, list]:
+        merged: Dict[Labels, list] = {}
+        for shard in self._snapshots():
+            for labels, entry in shard:
+                total = merged.setdefault(labels, [0] * self._size + [0.0])
+                for i, value in enumerate(list(entry)):
+                    total[i] += value
+        return merged
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        bounds = [*self.buckets, float("inf")]
+        for labels, entry in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """Read at scrape time from a callback returning a number or {label values: number}.
+
+    kind="counter" exposes a total that some component already keeps, without double counting;
+    give those a name ending in _total.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], object], labelnames: Iterable[str] = (),
+                 registry: Optional[Registry] = registry, kind: str = "gauge"):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.read = read
+        self.labelnames = tuple(labelnames)
+        if registry is not None:
+            registry.register(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in sorted(samples):
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(sample)}")
+        return lines
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count and latency per route template and status.
+
+    The route label is the matched path template (/api/payouts/{id}, not /api/payouts/42), so
+    the number of series stays bounded.
+    """
+
+    def __init__(self, app, requests: Counter, duration: Histogram):
+        self.app = app
+        self.requests = requests
+        self.duration = duration
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            self.duration.observe(time.perf_counter() - started, method, path)
+            self.requests.inc(method, path, str(status[0]))